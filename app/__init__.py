@@ -5,11 +5,13 @@ from flask import Flask, jsonify
 from app.extensions import db, migrate, login_manager
 from app.security.key_management import validate_secret_key, KeyValidationError
 from app.error_handlers import register_error_handlers
+from app.utils.json_provider import init_json
 
 def register_models():
     """Import models after db is initialized"""
     from app.models.user import User  # pylint: disable=import-outside-toplevel
     from app.models.tea import Tea    # pylint: disable=import-outside-toplevel
+    from app.models.tea_tombstone import TeaTombstone  # pylint: disable=import-outside-toplevel unused-import
     return User, Tea
 
 def register_blueprints(app):
@@ -61,6 +63,9 @@ def create_app(config=None):
         app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///instance/dev.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Encode responses and parse request bodies with the fast JSON encoder and decoder
+    init_json(app)
+
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
@@ -78,10 +83,45 @@ def create_app(config=None):
     # Import and register models
     User, _ = register_models()
 
-    # User loader callback
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    # Password hashing with the configured cost, in a process pool when sized
+    from app.auth.password_hasher import PasswordHasher  # pylint: disable=import-outside-toplevel
+    PasswordHasher(app)
+
+    # User loader callback, served from a cache of user identities when enabled
+    if app.config.get('USER_CACHE_ENABLED', True):
+        from app.auth.user_cache import UserCache  # pylint: disable=import-outside-toplevel
+        user_cache = UserCache(app)
+
+        @login_manager.user_loader
+        def load_user(user_id):
+            return user_cache.get_or_load(int(user_id))
+    else:
+        @login_manager.user_loader
+        def load_user(user_id):
+            return User.query.get(int(user_id))
+
+    # Cache each user's tea collection between writes
+    tea_cache = None
+    if app.config.get('TEA_CACHE_BACKEND'):
+        from app.services.tea_cache import TeaCollectionCache  # pylint: disable=import-outside-toplevel
+        tea_cache = TeaCollectionCache(app)
+
+    # Buffer steep increments in memory and write them back in batches, SQL storage only
+    if app.config.get('STEEP_WRITE_BEHIND', False) and app.config.get('TEA_BACKEND', 'sql') == 'sql':
+        from app.services.steep_buffer import SteepCountBuffer  # pylint: disable=import-outside-toplevel
+        steep_buffer = SteepCountBuffer(app)
+        if tea_cache is not None:
+            steep_buffer.add_flush_listener(tea_cache.invalidate_many)
+
+    # Per-route latency, status and database time, and cache hits and misses, exposed at /metrics
+    if app.config.get('METRICS_ENABLED', False):
+        from app.metrics import RequestMetrics  # pylint: disable=import-outside-toplevel
+        RequestMetrics(app)
+
+    # Count each request's SQL statements into Server-Timing and warn past the budget
+    if app.config.get('SQL_QUERY_TRACKING', True):
+        from app.metrics import QueryBudget  # pylint: disable=import-outside-toplevel
+        QueryBudget(app)
 
     # Register all blueprints
     register_blueprints(app)
@@ -0,0 +1,117 @@
+"""Password hashing, optionally offloaded to a bounded process pool"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256'
+DEFAULT_SALT_LENGTH = 16
+DEFAULT_RETRY_AFTER_SECONDS = 1
+
+
+class HasherSaturatedError(Exception):
+    """Raised when the hashing pool already has as many jobs as it will queue"""
+    def __init__(self, retry_after=DEFAULT_RETRY_AFTER_SECONDS):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with werkzeug using the configured cost parameters.
+
+    With a pool size, the work runs in a process pool so that hashing storms do not
+    pin the request workers. At most max_pending jobs run or wait at once; beyond that
+    HasherSaturatedError is raised instead of queueing more work.
+    """
+    def __init__(self, app=None, method=DEFAULT_METHOD, salt_length=DEFAULT_SALT_LENGTH,
+                 pool_size=0, max_pending=None, retry_after=DEFAULT_RETRY_AFTER_SECONDS):
+        self.method = method
+        self.salt_length = salt_length
+        self.pool_size = pool_size
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+        else:
+            self._configure_slots()
+
+    def init_app(self, app):
+        """Bind the hasher to an app, reading the PASSWORD_HASH_* settings"""
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = app.config.get('PASSWORD_HASH_SALT_LENGTH', self.salt_length)
+        self.pool_size = app.config.get('PASSWORD_HASH_POOL_SIZE', self.pool_size)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.retry_after = app.config.get('PASSWORD_HASH_RETRY_AFTER', self.retry_after)
+        self._configure_slots()
+        app.extensions['password_hasher'] = self
+        atexit.register(self.shutdown)
+
+    def hash(self, password):
+        """Hash a password with the current cost parameters"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Check whether a stored hash was made with different cost parameters"""
+        method, _, rest = pwhash.partition('$')
+        salt = rest.partition('$')[0]
+        return method != stored_method(self.method) or len(salt) != self.salt_length
+
+    def shutdown(self):
+        """Stop the process pool, if one was started"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _configure_slots(self):
+        self._slots = None
+        if self.pool_size:
+            max_pending = self.max_pending if self.max_pending is not None else self.pool_size * 4
+            self._slots = threading.BoundedSemaphore(max_pending)
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn rather than fork, request workers may be multi-threaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.pool_size, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _run(self, func, *args):
+        if self._slots is None:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherSaturatedError(self.retry_after)
+        try:
+            return self._get_executor().submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+
+@lru_cache(maxsize=None)
+def stored_method(method):
+    """Get the method string werkzeug records in hashes, with its defaults (e.g. iterations) filled in"""
+    return generate_password_hash('', method, 1).partition('$')[0]
+
+
+_default_hasher = PasswordHasher()
+
+
+def get_password_hasher():
+    """Get the current app's password hasher, or an inline one with default parameters"""
+    if has_app_context():
+        hasher = current_app.extensions.get('password_hasher')
+        if hasher is not None:
+            return hasher
+    return _default_hasher
@@ -0,0 +1,81 @@
+"""Cache of authenticated user identities for the Flask-Login user loader"""
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from app.extensions import db
+from app.models.user import User
+from app.utils.cache import LRUCache
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 60
+
+
+class UserIdentity(UserMixin):
+    """Detached, read-only copy of the User fields requests read from current_user"""
+    def __init__(self, user_id, username, email, created_at, is_active=True, is_admin=False):
+        self.id = user_id
+        self.username = username
+        self.email = email
+        self.created_at = created_at
+        self._is_active = is_active
+        self.is_admin = is_admin
+
+    @classmethod
+    def from_user(cls, user):
+        """Copy the identity fields from a User row"""
+        return cls(user.id, user.username, user.email, user.created_at, user.is_active, user.is_admin)
+
+    @property
+    def is_active(self):
+        return self._is_active
+
+    def __repr__(self):
+        return f'<UserIdentity {self.username}>'
+
+
+class UserCache:
+    """
+    Bounded TTL cache of UserIdentity objects keyed by user id, safe to share between threads.
+
+    Updates and deletes of a User invalidate its entry in the current process; other
+    workers pick the change up once the entry's TTL runs out.
+    """
+    def __init__(self, app=None, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the cache to an app, sizing it from the USER_CACHE_* settings"""
+        self.cache.max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        self.cache.ttl = app.config.get('USER_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+        app.extensions['user_cache'] = self
+
+    def get_or_load(self, user_id):
+        """Get the identity for a user id, loading the user from the database on a miss"""
+        identity = self.cache.get(user_id)
+        if identity is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            identity = UserIdentity.from_user(user)
+            self.cache.set(user_id, identity)
+        return identity
+
+    def invalidate(self, user_id):
+        """Drop the cached identity for a user"""
+        self.cache.delete(user_id)
+
+    def stats(self):
+        """Get the cache counters"""
+        return self.cache.stats()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, user):  # pylint: disable=unused-argument
+    """Drop a user's cached identity whenever the row is updated or deleted"""
+    if has_app_context():
+        user_cache = current_app.extensions.get('user_cache')
+        if user_cache is not None:
+            user_cache.invalidate(user.id)
@@ -1,5 +1,6 @@
 """CLI commands for the application"""
 import click
+from flask import current_app
 from flask.cli import with_appcontext
 import sqlalchemy.exc
 from app.extensions import db
@@ -13,6 +14,7 @@ def register_commands(app):
     app.cli.add_command(reset_db_command)
     app.cli.add_command(create_admin_command)
     app.cli.add_command(rotate_key_command)
+    app.cli.add_command(compact_tombstones_command)
 
 @click.command('reset-db')
 @with_appcontext
@@ -25,6 +27,7 @@ def reset_db_command():
     # Import all models to ensure they're registered with SQLAlchemy
     from app.models.user import User  # pylint: disable=import-outside-toplevel unused-import
     from app.models.tea import Tea    # pylint: disable=import-outside-toplevel unused-import
+    from app.models.tea_tombstone import TeaTombstone  # pylint: disable=import-outside-toplevel unused-import
 
     click.echo('Dropping all tables...')
     db.drop_all()
@@ -92,3 +95,20 @@ def rotate_key_command(force):
     except KeyRotationError as e:
         click.echo(f"Error rotating key: {e}")
         raise click.Abort()
+
+@click.command('compact-tombstones')
+@click.option('--days', type=int, default=None,
+              help='Retention in days (defaults to TEA_TOMBSTONE_RETENTION_DAYS)')
+@with_appcontext
+def compact_tombstones_command(days):
+    """Delete tea tombstones older than the sync retention period."""
+    from app.models.tea_tombstone import TeaTombstone  # pylint: disable=import-outside-toplevel
+
+    if days is None:
+        days = current_app.config.get('TEA_TOMBSTONE_RETENTION_DAYS', 30)
+    try:
+        removed = TeaTombstone.compact(days)
+        click.echo(f'Removed {removed} tombstones older than {days} days.')
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        click.echo(f'Database error compacting tombstones: {e}')
+        db.session.rollback()  # pylint: disable=no-member
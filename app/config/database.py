@@ -4,9 +4,16 @@ import os
 class Config:
     """Database configuration settings"""
     # DynamoDB settings (for legacy support)
-    DYNAMODB_ENDPOINT = 'https://dynamodb.us-east-1.amazonaws.com'
+    AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+    DYNAMODB_ENDPOINT = os.getenv('DYNAMODB_ENDPOINT', f'https://dynamodb.{AWS_REGION}.amazonaws.com')
+    # The table created from app/templates/dynamodb/tables/tea_table.json
+    DYNAMODB_TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME', 'Teas')
+    # Retries (adaptive mode) and read timeout in seconds for DynamoDB calls
     DATABASE_MAX_RETRIES = 3
     DATABASE_TIMEOUT = 30
+    DYNAMODB_CONNECT_TIMEOUT = 5
+    # Size the HTTP pool to the number of threads sharing one TeaDao
+    DYNAMODB_MAX_POOL_CONNECTIONS = 50
 
     # SQLAlchemy settings
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///dev.db')
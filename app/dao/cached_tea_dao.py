@@ -0,0 +1,145 @@
+"""Read-through cache in front of TeaDao"""
+import threading
+from app.dao.tea_dao import TeaDao
+from app.utils.cache import KeyVersions, LRUCache
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 30
+
+
+class CachedTeaDao:
+    """
+    Wraps a TeaDao with in-process LRU caches for single items and per-user tea lists.
+
+    Reads are served from the cache when possible. Writes go through to the wrapped DAO
+    and then update or drop the entries they affect in this process; other processes
+    see the change once their entries expire. Reads that ask for a page size,
+    projection or consistent read, and methods not defined here, go straight to the
+    wrapped DAO.
+    """
+    def __init__(self, tea_dao, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.tea_dao = tea_dao
+        self.items = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.queries = LRUCache(max_entries=max_entries, ttl=ttl)
+        # Bumped per user by writes, so that a read racing a write of the same user's teas
+        # does not cache what it read
+        self._versions = KeyVersions()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == 'tea_dao':
+            raise AttributeError(name)
+        return getattr(self.tea_dao, name)
+
+    def get_tea_item(self, user_id, tea_id):
+        """Get a tea item, from the cache when present"""
+        key = (user_id, tea_id)
+        item = self.items.get(key)
+        if item is None:
+            version = self._versions.get(user_id)
+            item = self.tea_dao.get_tea_item(user_id, tea_id)
+            if item is None:
+                return None
+            self._fill(self.items, user_id, key, item, version)
+        return dict(item)
+
+    def get_all_tea_items(self, user_id, page_size=None, attributes=None, consistent_read=False):
+        """Get all of a user's tea items, from the cache when present and no read options are given"""
+        if page_size is not None or attributes or consistent_read:
+            return self.tea_dao.get_all_tea_items(user_id, page_size, attributes, consistent_read)
+        items = self.queries.get(user_id)
+        if items is None:
+            version = self._versions.get(user_id)
+            items = self.tea_dao.get_all_tea_items(user_id)
+            self._fill(self.queries, user_id, user_id, items, version)
+        return [dict(item) for item in items]
+
+    def collection_version(self, user_id):
+        """Get the number of a user's tea items and their latest UpdatedAt, from the cached list when present"""
+        items = self.queries.get(user_id)
+        if items is None:
+            return self.tea_dao.collection_version(user_id)
+        return len(items), max((item['UpdatedAt'] for item in items if 'UpdatedAt' in item), default=None)
+
+    def create_tea_item(self, user_id, tea_item):
+        """Create a tea item and cache it"""
+        item = self.tea_dao.create_tea_item(user_id, tea_item)
+        self._invalidate(user_id)
+        self.items.set((user_id, item['tea_id']), dict(item))
+        return item
+
+    def update_tea_item(self, user_id, tea_id, tea_item):
+        """Update a tea item"""
+        self.tea_dao.update_tea_item(user_id, tea_id, tea_item)
+        self._invalidate(user_id, [tea_id])
+
+    def increment_steep_count(self, user_id, tea_id, updated_at=None):
+        """Increment the steep count for a tea item, returning the item as the update left it"""
+        item = self.tea_dao.increment_steep_count(user_id, tea_id, updated_at)
+        self._invalidate(user_id, [tea_id])
+        return item
+
+    def increment_steep_counts(self, user_id, tea_ids, updated_at=None):
+        """Increment the steep counts of several tea items"""
+        try:
+            return self.tea_dao.increment_steep_counts(user_id, tea_ids, updated_at)
+        finally:
+            # Large sessions span transactions, some of which may have been applied
+            self._invalidate(user_id, tea_ids)
+
+    def clear_steep_count(self, user_id, tea_id, updated_at=None):
+        """Reset the steep count for a tea item to 0, returning the item as the update left it"""
+        item = self.tea_dao.clear_steep_count(user_id, tea_id, updated_at)
+        self._invalidate(user_id, [tea_id])
+        return item
+
+    def delete_tea_item(self, user_id, tea_id):
+        """Delete a tea item"""
+        self.tea_dao.delete_tea_item(user_id, tea_id)
+        self._invalidate(user_id, [tea_id])
+
+    def batch_create_tea_items(self, user_id, tea_items):
+        """Create many tea items"""
+        outcomes = self.tea_dao.batch_create_tea_items(user_id, tea_items)
+        self._invalidate(user_id)
+        return outcomes
+
+    def batch_delete_tea_items(self, user_id, tea_ids):
+        """Delete many tea items"""
+        outcomes = self.tea_dao.batch_delete_tea_items(user_id, tea_ids)
+        self._invalidate(user_id, tea_ids)
+        return outcomes
+
+    def stats(self):
+        """Get the item and query cache counters"""
+        return {'items': self.items.stats(), 'queries': self.queries.stats()}
+
+    def _fill(self, cache, user_id, key, value, version):
+        with self._lock:
+            if version == self._versions.get(user_id):
+                cache.set(key, value)
+
+    def _invalidate(self, user_id, tea_ids=()):
+        with self._lock:
+            self._versions.bump(user_id)
+            self.queries.delete(user_id)
+            for tea_id in tea_ids:
+                self.items.delete((user_id, tea_id))
+
+
+def create_tea_dao(config):
+    """
+    Create the DynamoDB TeaDao for the application settings, behind a cache when
+    TEA_DAO_CACHE_ENABLED is set.
+
+    Args:
+        config (dict): Application settings, see TeaDao.from_config.
+
+    Returns:
+        TeaDao or CachedTeaDao: The DAO to give to TeaService
+    """
+    tea_dao = TeaDao.from_config(config)
+    if not config.get('TEA_DAO_CACHE_ENABLED', False):
+        return tea_dao
+    return CachedTeaDao(tea_dao, max_entries=config.get('TEA_DAO_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                        ttl=config.get('TEA_DAO_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS))
@@ -1,53 +1,546 @@
-"""In-memory implementation of TeaDao for development"""
+"""In-memory implementation of TeaDao for development and load tests"""
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from app.dao.tea_dao import TeaDao
+from app.dao.tea_journal import DEFAULT_FSYNC_INTERVAL_MS, DEFAULT_SNAPSHOT_EVERY, TeaJournal
 
-class MemoryTeaDao:
-    """In-memory storage for teas"""
+# Attributes update_tea_item may change, as in TeaDao
+UPDATABLE_ATTRIBUTES = ('Type', 'Name', 'SteepTimeMinutes', 'SteepTemperatureFahrenheit', 'Notes', 'UpdatedAt')
+
+
+def remove_sorted(values, value):
+    """Remove a value from a sorted list"""
+    index = bisect_left(values, value)
+    if index < len(values) and values[index] == value:
+        del values[index]
+
+
+def project(item, attributes):
+    """Copy an item, keeping only the given attributes when there are any"""
+    if not attributes:
+        return dict(item)
+    return {name: item[name] for name in attributes if name in item}
+
+
+class TeaPartition:
+    """
+    One user's tea items and their indexes.
+
+    Callers hold lock while reading or changing the partition. Tea IDs are kept in sort
+    key order, as DynamoDB returns them, in the table and in the per-type index.
+    """
     def __init__(self):
-        self.teas = {}
-
-    def get_all_tea_items(self):
-        """Get all teas"""
-        return list(self.teas.values())
-
-    def get_tea_item(self, name):
-        """Get a tea by name"""
-        if name not in self.teas:
-            raise KeyError(f"Tea '{name}' not found")
-        return self.teas[name]
-
-    def create_tea_item(self, tea_item):
-        """Create a new tea"""
-        name = tea_item["Name"]
-        if name in self.teas:
-            raise ValueError(f"Tea '{name}' already exists")
-        self.teas[name] = tea_item
-        return tea_item
-
-    def update_tea_item(self, name, tea_item):
-        """Update a tea"""
-        if name not in self.teas:
-            raise KeyError(f"Tea '{name}' not found")
-        self.teas[name] = tea_item
-        return tea_item
-
-    def increment_steep_count(self, name):
-        """Increment steep count"""
-        if name not in self.teas:
-            raise KeyError(f"Tea '{name}' not found")
-        tea = self.teas[name]
-        tea["SteepCount"] = tea.get("SteepCount", 0) + 1
-        return tea
-
-    def clear_steep_count(self, name):
-        """Clear steep count"""
-        if name not in self.teas:
-            raise KeyError(f"Tea '{name}' not found")
-        tea = self.teas[name]
-        tea["SteepCount"] = 0
-        return tea
-
-    def delete_tea_item(self, name):
-        """Delete a tea"""
-        if name not in self.teas:
-            raise KeyError(f"Tea '{name}' not found")
-        del self.teas[name]
+        self.lock = threading.Lock()
+        self.items = {}
+        self.tea_ids = []
+        self.by_type = {}
+        self.by_steep_count = {}
+
+    def add(self, item):
+        """Add or replace an item"""
+        tea_id = item['tea_id']
+        if tea_id in self.items:
+            self.remove(tea_id)
+        self.items[tea_id] = item
+        insort(self.tea_ids, tea_id)
+        insort(self.by_type.setdefault(item['Type'], []), tea_id)
+        self.by_steep_count.setdefault(item['SteepCount'], set()).add(tea_id)
+
+    def remove(self, tea_id):
+        """Remove an item, returning False if there was none"""
+        item = self.items.pop(tea_id, None)
+        if item is None:
+            return False
+        remove_sorted(self.tea_ids, tea_id)
+        self._unindex(self.by_type, item['Type'], lambda ids: remove_sorted(ids, tea_id))
+        self._unindex(self.by_steep_count, item['SteepCount'], lambda ids: ids.discard(tea_id))
+        return True
+
+    def set_type(self, item, tea_type):
+        """Change an item's type and move it in the type index"""
+        tea_id = item['tea_id']
+        self._unindex(self.by_type, item['Type'], lambda ids: remove_sorted(ids, tea_id))
+        insort(self.by_type.setdefault(tea_type, []), tea_id)
+        item['Type'] = tea_type
+
+    def set_steep_count(self, item, steep_count):
+        """Change an item's steep count and move it in the steep count index"""
+        tea_id = item['tea_id']
+        self._unindex(self.by_steep_count, item['SteepCount'], lambda ids: ids.discard(tea_id))
+        self.by_steep_count.setdefault(steep_count, set()).add(tea_id)
+        item['SteepCount'] = steep_count
+
+    def get_existing(self, tea_id):
+        """Get an item, raising KeyError if there is none"""
+        item = self.items.get(tea_id)
+        if item is None:
+            raise KeyError(f"Tea '{tea_id}' not found")
+        return item
+
+    @staticmethod
+    def _unindex(index, key, remove):
+        ids = index[key]
+        remove(ids)
+        if not ids:
+            del index[key]
+
+
+class MemoryTeaDao:
+    """
+    Tea items held in process memory with the same interface as TeaDao.
+
+    Items are partitioned by user_id with a lock per partition, so threads working for
+    different users never contend; only creating a user's partition takes a global lock.
+    Each partition indexes its teas by type, like the (user_id, Type) index of the table,
+    and by steep count.
+
+    Given a TeaJournal, every change is journaled and the items are recovered from the
+    journal's directory on creation; see from_config.
+
+    Reads return copies, so callers cannot change stored items by mutating results.
+    Unlike DynamoDB, updating or incrementing a tea that does not exist raises KeyError
+    instead of creating a partial item. Deleting one that does not exist succeeds, as
+    with TeaDao.
+    """
+    build_tea_item = staticmethod(TeaDao.build_tea_item)
+
+    def __init__(self, journal=None):
+        self.partitions = {}
+        self._partitions_lock = threading.Lock()
+        self.journal = journal
+        self._snapshot_lock = threading.Lock()
+        if journal is not None:
+            journal.recover(self._apply_entry)
+            journal.on_snapshot_due = self.snapshot
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create a MemoryTeaDao from application settings, durable when TEA_MEMORY_DATA_DIR is set.
+
+        Only one process may use a data directory at a time; the journal locks it, so a
+        second process fails here with RuntimeError.
+
+        Args:
+            config (dict): Settings with optionally TEA_MEMORY_DATA_DIR, TEA_MEMORY_FSYNC_INTERVAL_MS
+                and TEA_MEMORY_SNAPSHOT_EVERY.
+
+        Returns:
+            MemoryTeaDao: The DAO, with its data recovered from the directory
+
+        Raises:
+            RuntimeError: If another process holds the data directory.
+        """
+        data_dir = config.get('TEA_MEMORY_DATA_DIR')
+        if not data_dir:
+            return cls()
+        return cls(journal=TeaJournal(
+            data_dir,
+            fsync_interval_ms=config.get('TEA_MEMORY_FSYNC_INTERVAL_MS', DEFAULT_FSYNC_INTERVAL_MS),
+            snapshot_every=config.get('TEA_MEMORY_SNAPSHOT_EVERY', DEFAULT_SNAPSHOT_EVERY)
+        ))
+
+    def get_partition(self, user_id, create=False):
+        """Get a user's partition, creating it when asked, or None"""
+        partition = self.partitions.get(user_id)
+        if partition is None and create:
+            with self._partitions_lock:
+                partition = self.partitions.setdefault(user_id, TeaPartition())
+        return partition
+
+    def iter_tea_items(self, user_id, page_size=None, attributes=None, consistent_read=False, start_after=None):
+        """
+        Iterate over all tea items for a user in tea ID order, one page at a time.
+
+        The partition is locked per page, so a long iteration does not block writers.
+
+        Args:
+            user_id (str): The ID of the user.
+            page_size (int): The maximum number of items read per page, or None for all at once.
+            attributes (list): The attributes to return, or None for whole items.
+            consistent_read (bool): Ignored, reads are always consistent.
+            start_after (str): Start after the item with this tea ID, or None to start at the first.
+
+        Yields:
+            dict: The tea item attributes.
+        """
+        partition = self.get_partition(user_id)
+        if partition is None:
+            return
+        last_tea_id = start_after
+        while True:
+            with partition.lock:
+                start = 0 if last_tea_id is None else bisect_right(partition.tea_ids, last_tea_id)
+                end = len(partition.tea_ids) if page_size is None else start + page_size
+                tea_ids = partition.tea_ids[start:end]
+                page = [project(partition.items[tea_id], attributes) for tea_id in tea_ids]
+            yield from page
+            if page_size is None or len(tea_ids) < page_size:
+                return
+            last_tea_id = tea_ids[-1]
+
+    def collection_version(self, user_id):
+        """
+        Get the number of tea items a user has and the latest UpdatedAt among them, without copying items.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            tuple: The number of items and the latest UpdatedAt, None if no item has one.
+        """
+        partition = self.get_partition(user_id)
+        if partition is None:
+            return 0, None
+        with partition.lock:
+            items = partition.items.values()
+            return len(items), max((item['UpdatedAt'] for item in items if 'UpdatedAt' in item), default=None)
+
+    def get_all_tea_items(self, user_id, page_size=None, attributes=None, consistent_read=False):
+        """
+        Retrieve all tea items for a user in tea ID order.
+
+        Args:
+            user_id (str): The ID of the user.
+            page_size (int): The maximum number of items read per page, or None for all at once.
+            attributes (list): The attributes to return, or None for whole items.
+            consistent_read (bool): Ignored, reads are always consistent.
+
+        Returns:
+            list: A list of dictionaries containing the tea item attributes.
+        """
+        return list(self.iter_tea_items(user_id, page_size, attributes, consistent_read))
+
+    def query_by_type(self, user_id, tea_type, page_size=None, start_key=None):
+        """
+        Retrieve one page of a user's tea items of a type, using the type index.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_type (str): The tea type.
+            page_size (int): The maximum number of items to return, or None for all.
+            start_key (dict): The next_key of the previous page, or None for the first page.
+
+        Returns:
+            tuple: The items of the page and the key to pass for the next page, None after the last page.
+        """
+        partition = self.get_partition(user_id)
+        if partition is None:
+            return [], None
+        with partition.lock:
+            tea_ids = partition.by_type.get(tea_type, [])
+            start = 0 if start_key is None else bisect_right(tea_ids, start_key['tea_id'])
+            end = len(tea_ids) if page_size is None else start + page_size
+            items = [dict(partition.items[tea_id]) for tea_id in tea_ids[start:end]]
+            more = end < len(tea_ids)
+        if not more:
+            return items, None
+        return items, {'user_id': user_id, 'tea_id': items[-1]['tea_id'], 'Type': tea_type}
+
+    def query_by_steep_count(self, user_id, min_steep_count=1, limit=None):
+        """
+        Retrieve a user's most steeped tea items, using the steep count index.
+
+        Args:
+            user_id (str): The ID of the user.
+            min_steep_count (int): The lowest steep count to include.
+            limit (int): The maximum number of items to return, or None for all.
+
+        Returns:
+            list: The tea items, by descending steep count and then tea ID.
+        """
+        partition = self.get_partition(user_id)
+        if partition is None:
+            return []
+        items = []
+        with partition.lock:
+            for steep_count in sorted(partition.by_steep_count, reverse=True):
+                if steep_count < min_steep_count:
+                    break
+                for tea_id in sorted(partition.by_steep_count[steep_count]):
+                    if limit is not None and len(items) >= limit:
+                        return items
+                    items.append(dict(partition.items[tea_id]))
+        return items
+
+    def get_tea_item(self, user_id, tea_id):
+        """
+        Retrieve a tea item.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_id (str): The ID of the tea item.
+
+        Returns:
+            dict: A dictionary containing the tea item attributes, or None if there is no such item.
+        """
+        partition = self.get_partition(user_id)
+        if partition is None:
+            return None
+        with partition.lock:
+            item = partition.items.get(tea_id)
+            return None if item is None else dict(item)
+
+    def create_tea_item(self, user_id, tea_item):
+        """
+        Create a tea item.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_item (dict): A dictionary containing the tea item attributes.
+
+        Returns:
+            dict: The created item
+        """
+        item = self.build_tea_item(user_id, tea_item)
+        partition = self.get_partition(user_id, create=True)
+        with partition.lock:
+            partition.add(dict(item))
+            self._record_put(user_id, item)
+        return item
+
+    def batch_create_tea_items(self, user_id, tea_items):
+        """
+        Create many tea items at once.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_items (list): Dictionaries containing the tea item attributes.
+
+        Returns:
+            list: One outcome per tea item, in order, with its index and either
+                status 'created' and the item or status 'failed' and an error.
+        """
+        outcomes = []
+        items = []
+        for index, tea_item in enumerate(tea_items):
+            try:
+                item = self.build_tea_item(user_id, tea_item)
+            except KeyError as e:
+                outcomes.append({'index': index, 'status': 'failed', 'error': f'Missing required field: {e}'})
+                continue
+            outcomes.append({'index': index, 'status': 'created', 'item': item})
+            items.append(dict(item))
+        if items:
+            partition = self.get_partition(user_id, create=True)
+            with partition.lock:
+                for item in items:
+                    partition.add(item)
+                    self._record_put(user_id, item)
+        return outcomes
+
+    def batch_delete_tea_items(self, user_id, tea_ids):
+        """
+        Delete many tea items at once.
+
+        Deleting a tea ID that does not exist succeeds, as with delete_tea_item.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_ids (list): The IDs of the tea items.
+
+        Returns:
+            list: One outcome per distinct tea ID, in order, with status 'deleted'.
+        """
+        unique_ids = list(dict.fromkeys(tea_ids))
+        partition = self.get_partition(user_id)
+        if partition is not None:
+            with partition.lock:
+                for tea_id in unique_ids:
+                    if partition.remove(tea_id):
+                        self._record_delete(user_id, tea_id)
+        return [{'tea_id': tea_id, 'status': 'deleted'} for tea_id in unique_ids]
+
+    def batch_get_tea_items(self, user_id, tea_ids, attributes=None, consistent_read=False):
+        """
+        Retrieve many tea items at once.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_ids (list): The IDs of the tea items.
+            attributes (list): The attributes to return, or None for whole items. tea_id is always included.
+            consistent_read (bool): Ignored, reads are always consistent.
+
+        Returns:
+            list: One outcome per distinct tea ID, in order, with status 'found' and
+                the item or status 'not_found'.
+        """
+        unique_ids = list(dict.fromkeys(tea_ids))
+        if attributes:
+            attributes = list(dict.fromkeys(['tea_id', *attributes]))
+        partition = self.get_partition(user_id)
+        found = {}
+        if partition is not None:
+            with partition.lock:
+                for tea_id in unique_ids:
+                    item = partition.items.get(tea_id)
+                    if item is not None:
+                        found[tea_id] = project(item, attributes)
+        return [
+            {'tea_id': tea_id, 'status': 'found', 'item': found[tea_id]} if tea_id in found
+            else {'tea_id': tea_id, 'status': 'not_found'}
+            for tea_id in unique_ids
+        ]
+
+    def update_tea_item(self, user_id, tea_id, tea_item):
+        """
+        Update a tea item's name, type, steep time, steep temperature, notes and update time.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_id (str): The ID of the tea item.
+            tea_item (dict): A dictionary containing the tea item attributes to update.
+
+        Raises:
+            KeyError: If the tea item does not exist.
+        """
+        partition = self._existing_partition(user_id, tea_id)
+        with partition.lock:
+            item = partition.get_existing(tea_id)
+            for name in UPDATABLE_ATTRIBUTES:
+                if name not in tea_item:
+                    continue
+                if name == 'Type':
+                    partition.set_type(item, tea_item['Type'])
+                else:
+                    item[name] = tea_item[name]
+            self._record_put(user_id, item)
+
+    def increment_steep_count(self, user_id, tea_id, updated_at=None):
+        """
+        Increment the steep count for a tea item.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_id (str): The ID of the tea item.
+            updated_at (str): The UpdatedAt to set along with the count, or None to leave it.
+
+        Returns:
+            dict: A copy of the item as the update left it.
+
+        Raises:
+            KeyError: If the tea item does not exist.
+        """
+        partition = self._existing_partition(user_id, tea_id)
+        with partition.lock:
+            item = partition.get_existing(tea_id)
+            partition.set_steep_count(item, item['SteepCount'] + 1)
+            if updated_at is not None:
+                item['UpdatedAt'] = updated_at
+            self._record_put(user_id, item)
+            return dict(item)
+
+    def increment_steep_counts(self, user_id, tea_ids, updated_at=None):
+        """
+        Increment the steep counts of several tea items atomically.
+
+        A tea listed more than once is incremented once per listing.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_ids (list): The IDs of the steeped tea items.
+            updated_at (str): The UpdatedAt to set along with the counts, or None to leave it.
+
+        Returns:
+            dict: The increment applied to each tea ID.
+
+        Raises:
+            KeyError: If a tea item does not exist. Nothing is applied.
+        """
+        increments = Counter(tea_ids)
+        partition = self.get_partition(user_id) or TeaPartition()
+        with partition.lock:
+            missing = [tea_id for tea_id in increments if tea_id not in partition.items]
+            if missing:
+                raise KeyError(f"Teas not found: {', '.join(missing)}")
+            for tea_id, count in increments.items():
+                item = partition.items[tea_id]
+                partition.set_steep_count(item, item['SteepCount'] + count)
+                if updated_at is not None:
+                    item['UpdatedAt'] = updated_at
+                self._record_put(user_id, item)
+        return dict(increments)
+
+    def clear_steep_count(self, user_id, tea_id, updated_at=None):
+        """
+        Reset the steep count for a tea item to 0.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_id (str): The ID of the tea item.
+            updated_at (str): The UpdatedAt to set along with the count, or None to leave it.
+
+        Returns:
+            dict: A copy of the item as the update left it.
+
+        Raises:
+            KeyError: If the tea item does not exist.
+        """
+        partition = self._existing_partition(user_id, tea_id)
+        with partition.lock:
+            item = partition.get_existing(tea_id)
+            partition.set_steep_count(item, 0)
+            if updated_at is not None:
+                item['UpdatedAt'] = updated_at
+            self._record_put(user_id, item)
+            return dict(item)
+
+    def delete_tea_item(self, user_id, tea_id):
+        """
+        Delete a tea item.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_id (str): The ID of the tea item.
+        """
+        partition = self.get_partition(user_id)
+        if partition is not None:
+            with partition.lock:
+                if partition.remove(tea_id):
+                    self._record_delete(user_id, tea_id)
+
+    def snapshot(self):
+        """
+        Write a snapshot of all partitions to the journal directory, replacing the journal written so far.
+
+        Writes carry on while the snapshot is taken; those it misses are replayed from the
+        new journal segment on recovery.
+        """
+        with self._snapshot_lock:
+            seq = self.journal.rotate()
+            partitions = {}
+            for user_id, partition in list(self.partitions.items()):
+                with partition.lock:
+                    if partition.items:
+                        partitions[user_id] = [dict(item) for item in partition.items.values()]
+            self.journal.write_snapshot(seq, partitions)
+
+    def close(self):
+        """Fsync the journal and stop its background thread"""
+        if self.journal is not None:
+            self.journal.close()
+
+    def _record_put(self, user_id, item):
+        # Called with the partition locked, so entries are journaled in the order they were applied
+        if self.journal is not None:
+            self.journal.append({'op': 'put', 'user_id': user_id, 'item': item})
+
+    def _record_delete(self, user_id, tea_id):
+        if self.journal is not None:
+            self.journal.append({'op': 'delete', 'user_id': user_id, 'tea_id': tea_id})
+
+    def _apply_entry(self, entry):
+        if entry['op'] == 'put':
+            self.get_partition(entry['user_id'], create=True).add(entry['item'])
+        else:
+            partition = self.get_partition(entry['user_id'])
+            if partition is not None:
+                partition.remove(entry['tea_id'])
+
+    def _existing_partition(self, user_id, tea_id):
+        """Get a user's partition, raising KeyError for the tea if the user has none"""
+        partition = self.get_partition(user_id)
+        if partition is None:
+            raise KeyError(f"Tea '{tea_id}' not found")
+        return partition
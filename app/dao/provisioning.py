@@ -0,0 +1,55 @@
+"""Create DynamoDB tables from the CloudFormation templates, for local development and tests"""
+import json
+import os
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', 'templates', 'dynamodb', 'tables')
+TEA_TABLE_TEMPLATE = os.path.join(TEMPLATES_DIR, 'tea_table.json')
+
+
+def load_table_properties(template_path=TEA_TABLE_TEMPLATE):
+    """
+    Read the properties of the DynamoDB table defined in a CloudFormation template.
+
+    Args:
+        template_path (str): Path to the template.
+
+    Returns:
+        dict: The AWS::DynamoDB::Table properties.
+    """
+    with open(template_path, encoding='utf-8') as template_file:
+        template = json.load(template_file)
+    for resource in template['Resources'].values():
+        if resource['Type'] == 'AWS::DynamoDB::Table':
+            return resource['Properties']
+    raise ValueError(f'No DynamoDB table defined in {template_path}')
+
+
+def create_tea_table(dynamodb, table_name, template_path=TEA_TABLE_TEMPLATE):
+    """
+    Create the tea table, with its indexes, as defined by the table template.
+
+    The table uses on-demand billing so that local stand-ins need no capacity settings.
+
+    Args:
+        dynamodb: A boto3 DynamoDB service resource.
+        table_name (str): The name of the table to create.
+        template_path (str): Path to the template.
+
+    Returns:
+        The boto3 Table, once it exists.
+    """
+    properties = load_table_properties(template_path)
+    table_args = {
+        'TableName': table_name,
+        'KeySchema': properties['KeySchema'],
+        'AttributeDefinitions': properties['AttributeDefinitions'],
+        'BillingMode': 'PAY_PER_REQUEST'
+    }
+    indexes = properties.get('GlobalSecondaryIndexes')
+    if indexes:
+        table_args['GlobalSecondaryIndexes'] = [
+            {key: value for key, value in index.items() if key != 'ProvisionedThroughput'} for index in indexes
+        ]
+    table = dynamodb.create_table(**table_args)
+    table.meta.client.get_waiter('table_exists').wait(TableName=table_name)
+    return table
@@ -2,34 +2,227 @@
 Class for interacting with the DynamoDB table.
 See https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/WorkingWithItems.html
 """
+import random
+import threading
+import time
 import uuid
+from collections import Counter
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Client defaults, overridden by the DYNAMODB_* and DATABASE_* settings
+DEFAULT_MAX_POOL_CONNECTIONS = 50
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 3
+
+# Attributes stored only when given to create_tea_item
+OPTIONAL_ATTRIBUTES = ('Notes', 'CreatedAt', 'UpdatedAt')
+
+# Global secondary indexes on (user_id, Type) and (user_id, UpdatedAt),
+# see app/templates/dynamodb/tables/tea_table.json
+TYPE_INDEX_NAME = 'user_id-Type-index'
+UPDATED_AT_INDEX_NAME = 'user_id-UpdatedAt-index'
+
+# Service limits per BatchWriteItem and BatchGetItem request
+BATCH_WRITE_LIMIT = 25
+BATCH_GET_LIMIT = 100
+# Service limit on the items in one TransactWriteItems request
+TRANSACT_WRITE_LIMIT = 100
+# Attempts per chunk before unprocessed items are reported as failed
+BATCH_MAX_ATTEMPTS = 5
+BATCH_BACKOFF_BASE_SECONDS = 0.05
+BATCH_BACKOFF_CAP_SECONDS = 2.0
+
+
+def build_client_config(config):
+    """Build the botocore client configuration from the DYNAMODB_* and DATABASE_* settings"""
+    return Config(
+        max_pool_connections=config.get('DYNAMODB_MAX_POOL_CONNECTIONS', DEFAULT_MAX_POOL_CONNECTIONS),
+        connect_timeout=config.get('DYNAMODB_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        read_timeout=config.get('DATABASE_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        retries={'max_attempts': config.get('DATABASE_MAX_RETRIES', DEFAULT_MAX_RETRIES), 'mode': 'adaptive'}
+    )
+
+
+def projection_args(attributes):
+    """Build a ProjectionExpression and its attribute name placeholders"""
+    # Placeholders keep reserved words such as Name and Type usable in the projection
+    placeholders = [f'#p{index}' for index in range(len(attributes))]
+    return ', '.join(placeholders), dict(zip(placeholders, attributes))
+
+
+def backoff_delay(attempt):
+    """Get a full-jitter exponential backoff delay in seconds for a retry attempt"""
+    return random.uniform(0, min(BATCH_BACKOFF_CAP_SECONDS, BATCH_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def request_tea_id(request):
+    """Get the tea ID a BatchWriteItem put or delete request refers to"""
+    if 'PutRequest' in request:
+        return request['PutRequest']['Item']['tea_id']
+    return request['DeleteRequest']['Key']['tea_id']
+
+
+def error_message(error):
+    """Get the service's message from a ClientError"""
+    return error.response.get('Error', {}).get('Message', str(error))
+
 
 class TeaDao:
-    def __init__(self, region_name, table_name):
+    """
+    Tea items stored in DynamoDB, partitioned by user_id and sorted by tea_id.
+
+    One instance is meant to be shared by all threads of a worker: the client and its
+    connection pool are thread-safe, and the cached Table handle is only used for
+    stateless item calls, never for load() or reload().
+    """
+    def __init__(self, region_name, table_name, config=None, endpoint_url=None):
         self.table_name = table_name
-        self.dynamodb = boto3.resource('dynamodb', region_name)
+        # A private session, the default session is not safe to build clients from concurrently
+        session = boto3.session.Session(region_name=region_name)
+        self.dynamodb = session.resource('dynamodb', config=config or build_client_config({}),
+                                         endpoint_url=endpoint_url)
+        self._table = None
+        self._table_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create a TeaDao from application settings.
+
+        Args:
+            config (dict): Settings with AWS_REGION, DYNAMODB_TABLE_NAME and optionally DYNAMODB_ENDPOINT,
+                DYNAMODB_MAX_POOL_CONNECTIONS, DYNAMODB_CONNECT_TIMEOUT, DATABASE_TIMEOUT and
+                DATABASE_MAX_RETRIES.
+
+        Returns:
+            TeaDao: The configured DAO
+        """
+        return cls(config.get('AWS_REGION', 'us-east-1'), config.get('DYNAMODB_TABLE_NAME', 'Teas'),
+                   config=build_client_config(config), endpoint_url=config.get('DYNAMODB_ENDPOINT'))
 
     def get_table(self):
-        """Get database table"""
-        return self.dynamodb.Table(self.table_name)
+        """Get database table, reusing one handle for the lifetime of the DAO"""
+        table = self._table
+        if table is None:
+            with self._table_lock:
+                if self._table is None:
+                    self._table = self.dynamodb.Table(self.table_name)
+                table = self._table
+        return table
+
+    def iter_tea_items(self, user_id, page_size=None, attributes=None, consistent_read=False, start_after=None):
+        """
+        Iterate over all tea items for a user in tea ID order, one query page at a time.
+
+        Follows LastEvaluatedKey, so collections larger than DynamoDB's 1 MB page are
+        returned in full while only one page is held in memory.
+
+        Args:
+            user_id (str): The ID of the user.
+            page_size (int): The maximum number of items read per query, or None for DynamoDB's limit.
+            attributes (list): The attributes to return, or None for whole items.
+            consistent_read (bool): Whether to use strongly consistent reads.
+            start_after (str): Start after the item with this tea ID, or None to start at the first.
+
+        Yields:
+            dict: The tea item attributes.
+        """
+        query_args = {
+            'KeyConditionExpression': '#user_id = :user_id',
+            'ExpressionAttributeNames': {'#user_id': 'user_id'},
+            'ExpressionAttributeValues': {':user_id': user_id},
+            'ConsistentRead': consistent_read
+        }
+        if page_size is not None:
+            query_args['Limit'] = page_size
+        if attributes:
+            query_args['ProjectionExpression'], names = projection_args(attributes)
+            query_args['ExpressionAttributeNames'].update(names)
+        if start_after is not None:
+            query_args['ExclusiveStartKey'] = {'user_id': user_id, 'tea_id': start_after}
+
+        table = self.get_table()
+        while True:
+            response = table.query(**query_args)
+            yield from response['Items']
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def query_by_type(self, user_id, tea_type, page_size=None, start_key=None):
+        """
+        Retrieve one page of a user's tea items of a type, using the (user_id, Type) index.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_type (str): The tea type.
+            page_size (int): The maximum number of items to return, or None for DynamoDB's limit.
+            start_key (dict): The next_key of the previous page, or None for the first page.
+
+        Returns:
+            tuple: The items of the page and the key to pass for the next page, None after the last page.
+        """
+        query_args = {
+            'IndexName': TYPE_INDEX_NAME,
+            'KeyConditionExpression': '#user_id = :user_id AND #type = :type',
+            'ExpressionAttributeNames': {'#user_id': 'user_id', '#type': 'Type'},
+            'ExpressionAttributeValues': {':user_id': user_id, ':type': tea_type}
+        }
+        if page_size is not None:
+            query_args['Limit'] = page_size
+        if start_key is not None:
+            query_args['ExclusiveStartKey'] = start_key
+        response = self.get_table().query(**query_args)
+        return response['Items'], response.get('LastEvaluatedKey')
+
+    def collection_version(self, user_id):
+        """
+        Get the number of tea items a user has and the latest UpdatedAt among them.
 
-    def get_all_tea_items(self, user_id):
+        The count comes from COUNT queries, which return no items, and the latest UpdatedAt
+        from the newest entry of the (user_id, UpdatedAt) index, so no items are transferred.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            tuple: The number of items and the latest UpdatedAt, None if no item has one.
+        """
+        table = self.get_table()
+        key_args = {
+            'KeyConditionExpression': '#user_id = :user_id',
+            'ExpressionAttributeNames': {'#user_id': 'user_id'},
+            'ExpressionAttributeValues': {':user_id': user_id}
+        }
+        query_args = dict(key_args, Select='COUNT')
+        count = 0
+        while True:
+            response = table.query(**query_args)
+            count += response['Count']
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        newest = table.query(IndexName=UPDATED_AT_INDEX_NAME, ScanIndexForward=False, Limit=1, **key_args)['Items']
+        return count, newest[0]['UpdatedAt'] if newest else None
+
+    def get_all_tea_items(self, user_id, page_size=None, attributes=None, consistent_read=False):
         """
         Retrieve all tea items for a user from the DynamoDB table.
 
         Args:
             user_id (str): The ID of the user.
+            page_size (int): The maximum number of items read per query, or None for DynamoDB's limit.
+            attributes (list): The attributes to return, or None for whole items.
+            consistent_read (bool): Whether to use strongly consistent reads.
 
         Returns:
             list: A list of dictionaries containing the tea item attributes.
         """
-        table = self.get_table()
-        response = table.query(
-            KeyConditionExpression='user_id = :user_id',
-            ExpressionAttributeValues={':user_id': user_id}
-        )
-        return response['Items']
+        return list(self.iter_tea_items(user_id, page_size, attributes, consistent_read))
 
     def get_tea_item(self, user_id, tea_id):
         """
@@ -58,19 +251,170 @@ class TeaDao:
             dict: The created item
         """
         table = self.get_table()
-        tea_id = str(uuid.uuid4())
+        item = self.build_tea_item(user_id, tea_item)
+        table.put_item(Item=item)
+        return item
+
+    @staticmethod
+    def build_tea_item(user_id, tea_item):
+        """
+        Build a new tea item with a generated tea ID and default attribute values.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_item (dict): A dictionary containing the tea item attributes.
+
+        Returns:
+            dict: The item to store
+        """
         item = {
             "user_id": user_id,
-            "tea_id": tea_id,
+            "tea_id": str(uuid.uuid4()),
             "Name": tea_item['Name'],
             "Type": tea_item['Type'],
             "SteepTimeMinutes": tea_item.get('SteepTimeMinutes', 0),
             "SteepTemperatureFahrenheit": tea_item.get('SteepTemperatureFahrenheit', 0),
             "SteepCount": tea_item.get('SteepCount', 0)
         }
-        table.put_item(Item=item)
+        for name in OPTIONAL_ATTRIBUTES:
+            if name in tea_item:
+                item[name] = tea_item[name]
         return item
 
+    def batch_create_tea_items(self, user_id, tea_items):
+        """
+        Create many tea items with BatchWriteItem, 25 items per request.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_items (list): Dictionaries containing the tea item attributes.
+
+        Returns:
+            list: One outcome per tea item, in order, with its index and either
+                status 'created' and the item or status 'failed' and an error.
+        """
+        outcomes = []
+        requests = []
+        for index, tea_item in enumerate(tea_items):
+            try:
+                item = self.build_tea_item(user_id, tea_item)
+            except KeyError as e:
+                outcomes.append({'index': index, 'status': 'failed', 'error': f'Missing required field: {e}'})
+                continue
+            outcomes.append({'index': index, 'status': 'created', 'item': item})
+            requests.append({'PutRequest': {'Item': item}})
+
+        errors = self._write_batches(requests)
+        for outcome in outcomes:
+            error = errors.get(outcome.get('item', {}).get('tea_id'))
+            if error is not None:
+                outcome['status'] = 'failed'
+                outcome['error'] = error
+                del outcome['item']
+        return outcomes
+
+    def batch_delete_tea_items(self, user_id, tea_ids):
+        """
+        Delete many tea items with BatchWriteItem, 25 items per request.
+
+        Deleting a tea ID that does not exist succeeds, as with delete_tea_item.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_ids (list): The IDs of the tea items.
+
+        Returns:
+            list: One outcome per distinct tea ID, in order, with status 'deleted'
+                or status 'failed' and an error.
+        """
+        unique_ids = list(dict.fromkeys(tea_ids))
+        errors = self._write_batches([
+            {'DeleteRequest': {'Key': {'user_id': user_id, 'tea_id': tea_id}}} for tea_id in unique_ids
+        ])
+        return [
+            {'tea_id': tea_id, 'status': 'failed', 'error': errors[tea_id]} if tea_id in errors
+            else {'tea_id': tea_id, 'status': 'deleted'}
+            for tea_id in unique_ids
+        ]
+
+    def batch_get_tea_items(self, user_id, tea_ids, attributes=None, consistent_read=False):
+        """
+        Retrieve many tea items with BatchGetItem, 100 keys per request.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_ids (list): The IDs of the tea items.
+            attributes (list): The attributes to return, or None for whole items. tea_id is always included.
+            consistent_read (bool): Whether to use strongly consistent reads.
+
+        Returns:
+            list: One outcome per distinct tea ID, in order, with status 'found' and
+                the item, status 'not_found', or status 'failed' and an error.
+        """
+        unique_ids = list(dict.fromkeys(tea_ids))
+        found = {}
+        errors = {}
+        for start in range(0, len(unique_ids), BATCH_GET_LIMIT):
+            chunk = unique_ids[start:start + BATCH_GET_LIMIT]
+            request = {
+                'Keys': [{'user_id': user_id, 'tea_id': tea_id} for tea_id in chunk],
+                'ConsistentRead': consistent_read
+            }
+            if attributes:
+                # tea_id is needed to match the unordered responses back to the requested keys
+                request['ProjectionExpression'], request['ExpressionAttributeNames'] = projection_args(
+                    list(dict.fromkeys(['tea_id', *attributes])))
+
+            attempt = 0
+            while True:
+                try:
+                    response = self.dynamodb.batch_get_item(RequestItems={self.table_name: request})
+                except ClientError as e:
+                    errors.update((key['tea_id'], error_message(e)) for key in request['Keys'])
+                    break
+                for item in response['Responses'].get(self.table_name, []):
+                    found[item['tea_id']] = item
+                request = response.get('UnprocessedKeys', {}).get(self.table_name)
+                if not request:
+                    break
+                attempt += 1
+                if attempt >= BATCH_MAX_ATTEMPTS:
+                    errors.update((key['tea_id'], 'Unprocessed after retries') for key in request['Keys'])
+                    break
+                time.sleep(backoff_delay(attempt))
+
+        outcomes = []
+        for tea_id in unique_ids:
+            if tea_id in found:
+                outcomes.append({'tea_id': tea_id, 'status': 'found', 'item': found[tea_id]})
+            elif tea_id in errors:
+                outcomes.append({'tea_id': tea_id, 'status': 'failed', 'error': errors[tea_id]})
+            else:
+                outcomes.append({'tea_id': tea_id, 'status': 'not_found'})
+        return outcomes
+
+    def _write_batches(self, requests):
+        """Send write requests in BatchWriteItem chunks, retrying unprocessed items; get errors by tea ID"""
+        errors = {}
+        for start in range(0, len(requests), BATCH_WRITE_LIMIT):
+            pending = requests[start:start + BATCH_WRITE_LIMIT]
+            attempt = 0
+            while pending:
+                try:
+                    response = self.dynamodb.batch_write_item(RequestItems={self.table_name: pending})
+                except ClientError as e:
+                    errors.update((request_tea_id(request), error_message(e)) for request in pending)
+                    break
+                pending = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                if not pending:
+                    break
+                attempt += 1
+                if attempt >= BATCH_MAX_ATTEMPTS:
+                    errors.update((request_tea_id(request), 'Unprocessed after retries') for request in pending)
+                    break
+                time.sleep(backoff_delay(attempt))
+        return errors
+
     def update_tea_item(self, user_id, tea_id, tea_item):
         """
         Update a tea item in the DynamoDB table.
@@ -80,6 +424,9 @@ class TeaDao:
             user_id (str): The ID of the user.
             tea_id (str): The ID of the tea item.
             tea_item (dict): A dictionary containing the tea item attributes to update.
+
+        Raises:
+            KeyError: If the tea item does not exist.
         """
         table = self.get_table()
         update_expr = []
@@ -106,42 +453,141 @@ class TeaDao:
             expr_names['#steep_temperature_fahrenheit'] = 'SteepTemperatureFahrenheit'
             expr_values[':steep_temperature_fahrenheit'] = tea_item['SteepTemperatureFahrenheit']
 
+        if 'Notes' in tea_item:
+            update_expr.append('#notes = :notes')
+            expr_names['#notes'] = 'Notes'
+            expr_values[':notes'] = tea_item['Notes']
+
+        if 'UpdatedAt' in tea_item:
+            update_expr.append('#updated_at = :updated_at')
+            expr_names['#updated_at'] = 'UpdatedAt'
+            expr_values[':updated_at'] = tea_item['UpdatedAt']
+
         if update_expr:
-            table.update_item(
+            self._update_existing(
+                table,
                 Key={"user_id": user_id, "tea_id": tea_id},
                 UpdateExpression="SET " + ", ".join(update_expr),
                 ExpressionAttributeNames=expr_names,
                 ExpressionAttributeValues=expr_values
             )
 
-    def increment_steep_count(self, user_id, tea_id):
+    @staticmethod
+    def _update_existing(table, **kwargs):
+        # Conditional, so a tea deleted in the meantime is not recreated as a partial item
+        try:
+            return table.update_item(ConditionExpression='attribute_exists(tea_id)', **kwargs).get('Attributes')
+        except table.meta.client.exceptions.ConditionalCheckFailedException as e:
+            raise KeyError(f"Tea not found: {kwargs['Key']['tea_id']}") from e
+
+    def increment_steep_count(self, user_id, tea_id, updated_at=None):
         """
         Increment the steep count for a tea item.
 
         Args:
             user_id (str): The ID of the user.
             tea_id (str): The ID of the tea item.
+            updated_at (str): The UpdatedAt to set in the same update, or None to leave it.
+
+        Returns:
+            dict: The item as the update left it.
+
+        Raises:
+            KeyError: If the tea item does not exist.
         """
-        table = self.get_table()
-        table.update_item(
+        update_expr = "SET SteepCount = SteepCount + :inc"
+        values = {":inc": 1}
+        if updated_at is not None:
+            update_expr += ", UpdatedAt = :updated_at"
+            values[":updated_at"] = updated_at
+        return self._update_existing(
+            self.get_table(),
             Key={"user_id": user_id, "tea_id": tea_id},
-            UpdateExpression="SET SteepCount = SteepCount + :inc",
-            ExpressionAttributeValues={":inc": 1}
+            UpdateExpression=update_expr,
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
         )
 
-    def clear_steep_count(self, user_id, tea_id):
+    def increment_steep_counts(self, user_id, tea_ids, updated_at=None):
+        """
+        Increment the steep counts of several tea items in one transaction.
+
+        A tea listed more than once is incremented once per listing. Up to 100 distinct
+        teas are applied atomically; larger sessions are split into transactions of 100,
+        each atomic on its own.
+
+        Args:
+            user_id (str): The ID of the user.
+            tea_ids (list): The IDs of the steeped tea items.
+            updated_at (str): The UpdatedAt to set in the same update, or None to leave it.
+
+        Returns:
+            dict: The increment applied to each tea ID.
+
+        Raises:
+            KeyError: If a tea item does not exist. Nothing in its transaction is applied.
+        """
+        increments = Counter(tea_ids)
+        update_expr = 'ADD SteepCount :inc'
+        values = {}
+        if updated_at is not None:
+            update_expr += ' SET UpdatedAt = :updated_at'
+            values[':updated_at'] = updated_at
+        # The resource's client serializes attribute values from native Python types
+        client = self.dynamodb.meta.client
+        pending = list(increments.items())
+        for start in range(0, len(pending), TRANSACT_WRITE_LIMIT):
+            chunk = pending[start:start + TRANSACT_WRITE_LIMIT]
+            try:
+                client.transact_write_items(TransactItems=[
+                    {
+                        'Update': {
+                            'TableName': self.table_name,
+                            'Key': {'user_id': user_id, 'tea_id': tea_id},
+                            'UpdateExpression': update_expr,
+                            'ConditionExpression': 'attribute_exists(tea_id)',
+                            'ExpressionAttributeValues': dict(values, **{':inc': count})
+                        }
+                    }
+                    for tea_id, count in chunk
+                ])
+            except client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get('CancellationReasons', [])
+                missing = [
+                    tea_id for (tea_id, _), reason in zip(chunk, reasons)
+                    if reason.get('Code') == 'ConditionalCheckFailed'
+                ]
+                if missing:
+                    raise KeyError(f"Teas not found: {', '.join(missing)}") from e
+                raise
+        return dict(increments)
+
+    def clear_steep_count(self, user_id, tea_id, updated_at=None):
         """
         Reset the steep count for a tea item to 0.
 
         Args:
             user_id (str): The ID of the user.
             tea_id (str): The ID of the tea item.
+            updated_at (str): The UpdatedAt to set in the same update, or None to leave it.
+
+        Returns:
+            dict: The item as the update left it.
+
+        Raises:
+            KeyError: If the tea item does not exist.
         """
-        table = self.get_table()
-        table.update_item(
+        update_expr = "SET SteepCount = :zero"
+        values = {":zero": 0}
+        if updated_at is not None:
+            update_expr += ", UpdatedAt = :updated_at"
+            values[":updated_at"] = updated_at
+        return self._update_existing(
+            self.get_table(),
             Key={"user_id": user_id, "tea_id": tea_id},
-            UpdateExpression="SET SteepCount = :zero",
-            ExpressionAttributeValues={":zero": 0}
+            UpdateExpression=update_expr,
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
         )
 
     def delete_tea_item(self, user_id, tea_id):
@@ -0,0 +1,273 @@
+"""Append-only journal and snapshots that make MemoryTeaDao durable"""
+import atexit
+import logging
+import os
+import threading
+import time
+from decimal import Decimal
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FSYNC_INTERVAL_MS = 50
+DEFAULT_SNAPSHOT_EVERY = 10000
+
+SNAPSHOT_FILE = 'snapshot.json'
+LOCK_FILE = 'lock'
+SEGMENT_PREFIX = 'journal-'
+SEGMENT_SUFFIX = '.jsonl'
+# Key of the object a non-integral Decimal is written as, holding its digits
+DECIMAL_TAG = '$decimal'
+_DECIMAL_MARKER = orjson.dumps(DECIMAL_TAG)
+
+
+def encode_number(value):
+    """
+    Encode the Decimal numbers DynamoDB-shaped items may hold, which orjson does not support.
+
+    Whole numbers are written as ints. Any other number is written as {DECIMAL_TAG: digits}
+    rather than as a float, which would round it; decode_numbers turns it back into a Decimal.
+    """
+    if isinstance(value, Decimal):
+        if value.is_finite() and value == value.to_integral_value():
+            return int(value)
+        return {DECIMAL_TAG: str(value)}
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+
+def decode_numbers(value):
+    """Turn the numbers encode_number wrote as {DECIMAL_TAG: digits}, anywhere in value, back into Decimals"""
+    if isinstance(value, dict):
+        if len(value) == 1 and DECIMAL_TAG in value:
+            return Decimal(value[DECIMAL_TAG])
+        return {key: decode_numbers(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_numbers(item) for item in value]
+    return value
+
+
+def load_json(raw):
+    """Parse a journal entry or snapshot, only walking it for Decimals when it holds any"""
+    value = orjson.loads(raw)
+    return decode_numbers(value) if _DECIMAL_MARKER in raw else value
+
+
+class TeaJournal:
+    """
+    Records every change to a MemoryTeaDao in a directory, so it can be rebuilt after a restart.
+
+    Entries hold the whole item after the change ('put') or the key of a removed item
+    ('delete'), numbered in the order they were applied. Replaying them is idempotent,
+    which lets snapshots be taken while writes continue: a snapshot stores the partitions
+    together with the last entry number written before it started, and recovery loads it
+    and replays only the later entries.
+
+    Entries are written to the current journal segment as they happen and fsynced by a
+    background thread every fsync interval, so a crash loses at most that interval of
+    changes; an interval of 0 fsyncs every entry before the write returns. Each snapshot
+    starts a new segment and deletes the ones it covers. The journal asks for a snapshot
+    once snapshot_every entries have been written since the last one.
+
+    The journal holds an exclusive lock on the directory until it is closed, so a second
+    process pointed at the same directory fails at startup instead of interleaving its
+    entries with ours.
+    """
+    def __init__(self, directory, fsync_interval_ms=DEFAULT_FSYNC_INTERVAL_MS,
+                 snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        self.directory = directory
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.snapshot_every = snapshot_every
+        # Called from the background thread when a snapshot is due
+        self.on_snapshot_due = None
+        self.seq = 0
+        self.since_snapshot = 0
+        self.recovery = None
+        self._file = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._lock_directory()
+        atexit.register(self.close)
+
+    def recover(self, apply):
+        """
+        Replay the latest snapshot and the journal entries after it, then open the journal for writing.
+
+        Args:
+            apply (callable): Called with each entry, oldest first.
+
+        Returns:
+            dict: The number of snapshot items and journal entries replayed and the seconds it took.
+        """
+        start = time.perf_counter()
+        snapshot_seq = 0
+        snapshot_items = 0
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(path):
+            with open(path, 'rb') as snapshot_file:
+                snapshot = load_json(snapshot_file.read())
+            snapshot_seq = snapshot['seq']
+            for user_id, items in snapshot['partitions'].items():
+                for item in items:
+                    apply({'op': 'put', 'user_id': user_id, 'item': item})
+                snapshot_items += len(items)
+
+        self.seq = snapshot_seq
+        replayed = 0
+        for _, segment in self._segments():
+            for entry in self._read_segment(segment):
+                if entry['seq'] <= snapshot_seq:
+                    continue
+                apply(entry)
+                self.seq = entry['seq']
+                replayed += 1
+
+        with self._lock:
+            self.since_snapshot = replayed
+            self._open_segment()
+        self.recovery = {
+            'snapshot_items': snapshot_items,
+            'journal_entries': replayed,
+            'seconds': time.perf_counter() - start
+        }
+        logger.info("Recovered %d teas from snapshot and %d journal entries in %.1f ms from %s",
+                    snapshot_items, replayed, self.recovery['seconds'] * 1000, self.directory)
+        return self.recovery
+
+    def append(self, entry):
+        """Write an entry, numbering it after the previous one"""
+        with self._lock:
+            self.seq += 1
+            entry['seq'] = self.seq
+            self._file.write(orjson.dumps(entry, default=encode_number) + b'\n')
+            self.since_snapshot += 1
+            self._dirty = True
+            if not self.fsync_interval:
+                self._sync()
+            self._start_sync_thread()
+
+    def sync(self):
+        """Flush and fsync the entries written since the last sync"""
+        with self._lock:
+            self._sync()
+
+    def rotate(self):
+        """Start a new journal segment for a snapshot, returning the number of the last entry before it"""
+        with self._lock:
+            self._sync()
+            self._file.close()
+            self._open_segment()
+            self.since_snapshot = 0
+            return self.seq
+
+    def write_snapshot(self, seq, partitions):
+        """
+        Atomically replace the snapshot and delete the journal segments it covers.
+
+        Args:
+            seq (int): The number returned by rotate() before the partitions were copied.
+            partitions (dict): Lists of items by user ID.
+        """
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as snapshot_file:
+            snapshot_file.write(orjson.dumps({'seq': seq, 'partitions': partitions}, default=encode_number))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_path, path)
+        self._sync_directory()
+        for first_seq, segment in self._segments():
+            if first_seq <= seq:
+                os.remove(segment)
+
+    def close(self):
+        """Stop the background thread and fsync anything still pending"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._sync()
+                self._file.close()
+        if not self._lock_file.closed:
+            # Closing the file releases the lock
+            self._lock_file.close()
+
+    def _lock_directory(self):
+        path = os.path.join(self.directory, LOCK_FILE)
+        lock_file = open(path, 'ab')  # pylint: disable=consider-using-with
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError as e:
+                lock_file.close()
+                raise RuntimeError(f'Tea journal directory {self.directory} is in use by another process') from e
+        return lock_file
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, f'{SEGMENT_PREFIX}{self.seq + 1:020d}{SEGMENT_SUFFIX}')
+        self._file = open(path, 'ab')  # pylint: disable=consider-using-with
+        self._sync_directory()
+
+    def _sync(self):
+        if self._dirty and not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _sync_directory(self):
+        # Makes renames and new files durable; not supported on Windows
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _segments(self):
+        """Get the journal segments as (first entry number, path), oldest first"""
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                first_seq = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+                segments.append((first_seq, os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    @staticmethod
+    def _read_segment(path):
+        with open(path, 'r+b') as segment:
+            offset = 0
+            for line in segment:
+                try:
+                    entry = load_json(line)
+                except orjson.JSONDecodeError:
+                    # A crash can leave the last entry half written; cut it off so the
+                    # segment can be appended to again
+                    logger.warning("Truncating journal segment %s at a partial entry", path)
+                    segment.truncate(offset)
+                    return
+                offset += len(line)
+                yield entry
+
+    def _start_sync_thread(self):
+        # Started lazily so that each forked gunicorn worker gets its own thread
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='tea-journal-sync', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # With an fsync interval of 0 the thread only checks whether a snapshot is due
+        while not self._stop.wait(self.fsync_interval or 1):
+            self.sync()
+            if self.on_snapshot_due is not None and self.since_snapshot >= self.snapshot_every:
+                try:
+                    self.on_snapshot_due()
+                except OSError:
+                    logger.exception("Failed to write a tea snapshot, retrying after the next sync")
@@ -1,5 +1,6 @@
 """Error handlers for the application."""
-from flask import jsonify
+from flask import jsonify, request
+from app.auth.password_hasher import HasherSaturatedError
 
 def register_error_handlers(app):
     """Register error handlers for the application."""
@@ -52,6 +53,17 @@ def register_error_handlers(app):
             'message': 'An unexpected error occurred'
         }), 500
 
+    @app.errorhandler(HasherSaturatedError)
+    def hasher_saturated_error(error):
+        """Handle a full password hashing queue."""
+        response = jsonify({
+            'error': 'Service Unavailable',
+            'message': 'Too many authentication requests, please retry shortly'
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
     @app.errorhandler(Exception)
     def handle_unexpected_error(error):
         """Handle any unexpected errors."""
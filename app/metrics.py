@@ -0,0 +1,208 @@
+"""Request metrics served to Prometheus at /metrics, and per-request SQL query budgets"""
+import logging
+import os
+import threading
+import time
+from flask import Response, current_app, g, has_app_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_PATH = '/metrics'
+UNMATCHED_ENDPOINT = 'unmatched'
+DEFAULT_QUERY_BUDGET = 10
+
+logger = logging.getLogger(__name__)
+
+
+def multiprocess_dir():
+    """Get the directory worker processes share their metrics through, or None in single process mode"""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument
+    elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+    # Only statements run while an instrumented request is in progress are attributed to it
+    if has_app_context() and 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(context):
+    # A failed statement never reaches after_cursor_execute
+    starts = context.connection.info.get('metrics_query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def cache_stats(app):
+    """
+    Get the hit and miss counts of the app's in-process caches.
+
+    Args:
+        app (Flask): The app whose extensions hold the caches.
+
+    Returns:
+        dict: {'hits': int, 'misses': int} by cache name, for the caches the app has enabled
+    """
+    stats = {}
+    user_cache = app.extensions.get('user_cache')
+    if user_cache is not None:
+        stats['users'] = user_cache.stats()
+    tea_cache = app.extensions.get('tea_cache')
+    if tea_cache is not None:
+        stats['tea_collections'] = tea_cache.stats()
+    # Only a CachedTeaDao has stats, the TeaService is created by the first tea request
+    backend = getattr(app.extensions.get('tea_service'), 'backend', None)
+    tea_dao = getattr(backend, 'tea_dao', None)
+    if hasattr(tea_dao, 'stats'):
+        for name, counts in tea_dao.stats().items():
+            stats[f'tea_dao_{name}'] = counts
+    return stats
+
+
+def track_queries():
+    """Start counting the SQL statements and database time of the current request from zero"""
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+
+
+class RequestMetrics:
+    """
+    Per-route request metrics recorded by before/after request hooks.
+
+    Each app gets its own registry, so several apps can live in one process. When
+    PROMETHEUS_MULTIPROC_DIR is set, every gunicorn worker writes its samples to files
+    in that directory and /metrics reports the sum over all workers.
+
+    Cache hits and misses are counted by the caches themselves, see cache_stats(). They
+    are copied into counters after every request and before every scrape, so that each
+    worker's counts reach the multiprocess files too.
+    """
+    def __init__(self, app=None):
+        self.registry = CollectorRegistry(auto_describe=True)
+        self.requests = Counter(
+            'http_requests_total', 'HTTP requests by route and status',
+            ['method', 'endpoint', 'status'], registry=self.registry)
+        self.latency = Histogram(
+            'http_request_duration_seconds', 'HTTP request latency by route',
+            ['method', 'endpoint'], registry=self.registry)
+        self.db_time = Histogram(
+            'http_request_db_seconds', 'Time a request spent running SQL statements, by route',
+            ['method', 'endpoint'], registry=self.registry)
+        self.in_progress = Gauge(
+            'http_requests_in_progress', 'HTTP requests being served, by route',
+            ['method', 'endpoint'], registry=self.registry, multiprocess_mode='livesum')
+        self.cache_hits = Counter(
+            'cache_hits_total', 'In-process cache hits, by cache', ['cache'], registry=self.registry)
+        self.cache_misses = Counter(
+            'cache_misses_total', 'In-process cache misses, by cache', ['cache'], registry=self.registry)
+        self._cache_counts = {}  # (cache, 'hits' or 'misses') -> count already added to the counters
+        self._cache_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Install the request hooks and the /metrics endpoint on an app"""
+        app.extensions['metrics'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config.get('METRICS_PATH', METRICS_PATH), 'metrics', self.export)
+
+    def export(self):
+        """Render every metric in the Prometheus text format"""
+        self._count_cache_stats()
+        registry = self.registry
+        if multiprocess_dir():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    @staticmethod
+    def _labels():
+        # Label by the route template rather than the path, so tea IDs do not multiply the series
+        endpoint = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ENDPOINT
+        return request.method, endpoint
+
+    def _count_cache_stats(self):
+        with self._cache_lock:
+            for cache, counts in cache_stats(current_app).items():
+                for kind, counter in (('hits', self.cache_hits), ('misses', self.cache_misses)):
+                    count, seen = counts[kind], self._cache_counts.get((cache, kind), 0)
+                    if count < seen:
+                        # The cache was replaced since the last look, its counts start from zero
+                        seen = 0
+                    if count > seen:
+                        counter.labels(cache).inc(count - seen)
+                    self._cache_counts[cache, kind] = count
+
+    def _before_request(self):
+        if request.endpoint == 'metrics':
+            return
+        g.metrics_labels = self._labels()
+        g.metrics_start = time.perf_counter()
+        track_queries()
+        self.in_progress.labels(*g.metrics_labels).inc()
+
+    def _after_request(self, response):
+        self._count_cache_stats()
+        if 'metrics_start' in g:
+            labels = g.metrics_labels
+            self.latency.labels(*labels).observe(time.perf_counter() - g.metrics_start)
+            self.db_time.labels(*labels).observe(g.sql_seconds)
+            self.requests.labels(*labels, response.status_code).inc()
+        return response
+
+    def _teardown_request(self, exc):  # pylint: disable=unused-argument
+        # Runs even when the response could not be built, so the gauge always comes back down
+        if g.pop('metrics_start', None) is not None:
+            self.in_progress.labels(*g.metrics_labels).dec()
+
+
+class QueryBudget:
+    """
+    Per-request SQL statement count and database time, to catch routes running hidden queries.
+
+    Every response carries them in a Server-Timing header, they are logged at debug level,
+    and a warning is logged when a route runs more statements than its budget:
+    SQL_QUERY_BUDGETS by endpoint name, else SQL_QUERY_BUDGET.
+    """
+    def __init__(self, app=None):
+        self.default_budget = DEFAULT_QUERY_BUDGET
+        self.budgets = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Install the request hooks on an app, reading the budgets from its config"""
+        self.default_budget = app.config.get('SQL_QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+        self.budgets = dict(app.config.get('SQL_QUERY_BUDGETS') or {})
+        app.extensions['query_budget'] = self
+        app.before_request(track_queries)
+        app.after_request(self._after_request)
+
+    def budget_for(self, endpoint):
+        """Get the most statements a request to the endpoint should run, or None for no limit"""
+        return self.budgets.get(endpoint, self.default_budget)
+
+    def _after_request(self, response):
+        if 'sql_queries' not in g:
+            return response
+        queries, milliseconds = g.sql_queries, g.sql_seconds * 1000
+        description = f"{queries} {'query' if queries == 1 else 'queries'}"
+        response.headers.add('Server-Timing', f'db;dur={milliseconds:.2f};desc="{description}"')
+        logger.debug("%s %s: %d queries in %.2f ms", request.method, request.path, queries, milliseconds)
+        budget = self.budget_for(request.endpoint)
+        if budget is not None and queries > budget:
+            logger.warning("%s %s ran %d queries, over the budget of %d for %s",
+                           request.method, request.path, queries, budget, request.endpoint)
+        return response
@@ -2,5 +2,6 @@
 # Import models here to make them available to SQLAlchemy
 from app.models.user import User
 from app.models.tea import Tea
+from app.models.tea_tombstone import TeaTombstone
 
-__all__ = ['User', 'Tea']
\ No newline at end of file
+__all__ = ['User', 'Tea', 'TeaTombstone']
\ No newline at end of file
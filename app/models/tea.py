@@ -6,9 +6,19 @@ from app.extensions import db
 class Tea(db.Model):
     """Tea model"""
     __tablename__ = 'teas'
+    __table_args__ = (
+        # Names are unique per user; the index also serves the per-user duplicate check
+        db.Index('ix_teas_user_id_name', 'user_id', 'name', unique=True),
+        # Serves per-user listing, collection versions and sync queries
+        db.Index('ix_teas_user_id_updated_at', 'user_id', 'updated_at'),
+    )
+
+    # Columns exposed by to_dict(), in order
+    SERIALIZABLE_FIELDS = ('id', 'name', 'type', 'steep_time', 'steep_temperature', 'steep_count', 'notes',
+                           'created_at', 'updated_at')
 
     id = db.Column(db.Integer, primary_key=True)  # pylint: disable=no-member
-    name = db.Column(db.String(100), unique=True, nullable=False)  # pylint: disable=no-member
+    name = db.Column(db.String(100), nullable=False)  # pylint: disable=no-member
     type = db.Column(db.String(50), nullable=False)  # pylint: disable=no-member
     steep_time = db.Column(db.Integer, nullable=False)  # in seconds  # pylint: disable=no-member
     steep_temperature = db.Column(db.Integer, nullable=False)  # in celsius  # pylint: disable=no-member
@@ -35,18 +45,29 @@ class Tea(db.Model):
         self.created_at = created_at if created_at is not None else now
         self.updated_at = updated_at if updated_at is not None else now
 
-    def to_dict(self):
-        """Convert tea to dictionary"""
+    def to_dict(self, fields=None):
+        """Convert tea to dictionary, limited to the given fields if any"""
+        return self.serialize(self, fields)
+
+    @staticmethod
+    def serialize(tea, fields=None):
+        """Convert a tea, or a result row over the teas columns, to a dictionary"""
+        if fields is not None:
+            data = {field: getattr(tea, field) for field in fields}
+            for field in ('created_at', 'updated_at'):
+                if field in data:
+                    data[field] = data[field].isoformat()
+            return data
         return {
-            'id': self.id,
-            'name': self.name,
-            'type': self.type,
-            'steep_time': self.steep_time,
-            'steep_temperature': self.steep_temperature,
-            'steep_count': self.steep_count,
-            'notes': self.notes,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'id': tea.id,
+            'name': tea.name,
+            'type': tea.type,
+            'steep_time': tea.steep_time,
+            'steep_temperature': tea.steep_temperature,
+            'steep_count': tea.steep_count,
+            'notes': tea.notes,
+            'created_at': tea.created_at.isoformat(),
+            'updated_at': tea.updated_at.isoformat()
         }
 
     def __repr__(self):
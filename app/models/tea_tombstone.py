@@ -0,0 +1,41 @@
+"""Tombstones recording tea deletions for delta sync"""
+from datetime import datetime, timedelta, timezone
+from app.extensions import db
+
+class TeaTombstone(db.Model):
+    """Marks a deleted tea so that syncing clients can drop their copy"""
+    __tablename__ = 'tea_tombstones'
+    __table_args__ = (
+        # Serves per-user change feeds and retention compaction
+        db.Index('ix_tea_tombstones_user_id_deleted_at', 'user_id', 'deleted_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)  # pylint: disable=no-member
+    tea_id = db.Column(db.Integer, nullable=False)  # pylint: disable=no-member
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # pylint: disable=no-member
+    deleted_at = db.Column(db.DateTime, nullable=False,
+                           default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))  # pylint: disable=no-member
+
+    def __init__(self, tea_id=None, user_id=None, deleted_at=None):
+        """Initialize tombstone"""
+        self.tea_id = tea_id
+        self.user_id = user_id
+        self.deleted_at = deleted_at if deleted_at is not None else datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def to_dict(self):
+        """Convert tombstone to dictionary"""
+        return {
+            'id': self.tea_id,
+            'deleted_at': self.deleted_at.isoformat()
+        }
+
+    @classmethod
+    def compact(cls, retention_days):
+        """Delete tombstones older than the retention period and return how many were removed"""
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=retention_days)
+        removed = cls.query.filter(cls.deleted_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
+
+    def __repr__(self):
+        return f'<TeaTombstone {self.tea_id}>'
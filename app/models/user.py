@@ -1,7 +1,7 @@
 """User model for authentication"""
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.auth.password_hasher import get_password_hasher
 from app.extensions import db
 
 class User(UserMixin, db.Model):
@@ -11,7 +11,8 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    # Room for scrypt hashes and longer salts, see PASSWORD_HASH_METHOD and PASSWORD_HASH_SALT_LENGTH
+    password_hash = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
     is_admin = db.Column(db.Boolean, nullable=False, default=False)
@@ -21,11 +22,15 @@ class User(UserMixin, db.Model):
 
     def set_password(self, password):
         """Hash and set the password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = get_password_hasher().hash(password)
 
     def check_password(self, password):
         """Check if the password matches"""
-        return check_password_hash(self.password_hash, password)
+        return get_password_hasher().verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Check if the password was hashed with outdated cost parameters"""
+        return get_password_hasher().needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
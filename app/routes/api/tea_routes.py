@@ -1,14 +1,28 @@
 """Routes for Teas"""
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from json import JSONDecodeError
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, json, jsonify, request, stream_with_context
 from flask_login import login_required, current_user
-from app.extensions import db
 from app.models.tea import Tea
+from app.services.tea_service import TeaService
+from app.utils.helpers import encode_cursor, decode_cursor, make_etag
+from app.utils.json_provider import AppJSONEncoder, AppJSONDecoder
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 500
+TOMBSTONE_RETENTION_DAYS = 30
+SYNC_SAFETY_WINDOW_SECONDS = 30
+REQUIRED_FIELDS = ['name', 'type', 'steep_time', 'steep_temperature']
 
 def create_tea_routes():
     """Factory function to create tea routes blueprint"""
     tea_routes = Blueprint('tea_routes', __name__)
+    # Encode with the app encoder even when the blueprint is served by a bare Flask app
+    tea_routes.json_encoder = AppJSONEncoder
+    tea_routes.json_decoder = AppJSONDecoder
 
     def handle_tea_errors(f):
         """Decorator to handle common tea-related errors"""
@@ -31,19 +45,258 @@ def create_tea_routes():
             raise JSONDecodeError('Invalid JSON data', '', 0)
         return data
 
-    def get_tea_or_404(tea_id):
-        """Helper function to get a tea or return 404 response"""
-        tea = Tea.query.filter_by(id=tea_id, user_id=current_user.id).first()
-        if not tea:
-            return None, (jsonify({'error': 'Tea not found'}), 404)
-        return tea, None
+    def validate_tea_fields(data):
+        """Helper function to check that a tea payload has all required fields"""
+        for field in REQUIRED_FIELDS:
+            if field not in data:
+                raise KeyError(field)
+
+    def get_fields():
+        """Helper function to read the requested sparse fieldset, or None for the full tea shape"""
+        fields = request.args.get('fields')
+        if fields is None:
+            return None
+        requested = {field.strip() for field in fields.split(',') if field.strip()}
+        if not requested:
+            raise ValueError('fields must name at least one field')
+        unknown = requested.difference(Tea.SERIALIZABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        return tuple(field for field in Tea.SERIALIZABLE_FIELDS if field in requested)
+
+    def get_tea_service():
+        """Helper function to get the app's TeaService, over the backend TEA_BACKEND selects"""
+        service = current_app.extensions.get('tea_service')
+        if service is None:
+            service = current_app.extensions['tea_service'] = TeaService.from_config(current_app.config)
+        return service
+
+    def parse_tea_id(tea_id):
+        """Helper function to turn a tea ID from the URL into the backend's, or None if it names no tea"""
+        return get_tea_service().parse_tea_id(tea_id)
+
+    def tea_not_found():
+        """Helper function to build the 404 response for a missing tea"""
+        return jsonify({'error': 'Tea not found'}), 404
+
+    def read_fields(fields, *extra):
+        """Helper function to get the fields to read for a fieldset, plus any the route itself needs"""
+        if fields is None:
+            return None
+        return tuple(dict.fromkeys((*fields, *extra)))
+
+    def get_steep_buffer():
+        """Helper function to get the write-behind steep buffer, or None when steeps are written through"""
+        return current_app.extensions.get('steep_buffer')
+
+    def get_pending_steeps():
+        """Helper function to get the current user's unflushed steep increments by tea id"""
+        steep_buffer = get_steep_buffer()
+        if steep_buffer is None:
+            return {}
+        return steep_buffer.pending_for_user(current_user.id)
+
+    def present_teas(teas, fields=None):
+        """Helper function to fold unflushed write-behind steep increments into teas and trim them to a fieldset"""
+        pending = get_pending_steeps()
+        if pending:
+            # Copy rather than update in place, the dicts may be shared with the collection cache
+            teas = [
+                dict(tea, steep_count=tea['steep_count'] + pending[tea['id']])
+                if tea['id'] in pending and 'steep_count' in tea else tea
+                for tea in teas
+            ]
+        if fields is None:
+            return teas
+        return [{field: tea[field] for field in fields} for tea in teas]
+
+    def get_tea_cache():
+        """Helper function to get the tea collection cache, or None when caching is off"""
+        return current_app.extensions.get('tea_cache')
+
+    def invalidate_tea_cache():
+        """Helper function to drop the current user's cached collection after a write"""
+        tea_cache = get_tea_cache()
+        if tea_cache is not None:
+            tea_cache.invalidate(current_user.id)
+
+    def collection_etag(count, last_updated_at):
+        """Helper function to build the ETag for the current user's tea collection"""
+        if isinstance(last_updated_at, datetime):
+            last_updated_at = last_updated_at.isoformat()
+        return make_etag('teas', current_user.id, count, last_updated_at,
+                         sorted(get_pending_steeps().items()), request.query_string)
+
+    def tea_etag(tea):
+        """Helper function to build the ETag for a single tea"""
+        return make_etag('tea', tea['id'], tea['updated_at'],
+                         get_pending_steeps().get(tea['id'], 0), request.query_string)
+
+    def not_modified(etag):
+        """Helper function to build a 304 response if the client already has this version"""
+        if not request.if_none_match.contains(etag):
+            return None
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    def with_etag(response, etag):
+        """Helper function to tag a response with its ETag"""
+        response.set_etag(etag)
+        return response
+
+    def get_page_args():
+        """Helper function to read keyset pagination arguments, or None for the unpaginated list"""
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit')
+        if cursor is None and limit is None and not current_app.config.get('TEA_LIST_PAGINATED', False):
+            return None
+
+        max_limit = current_app.config.get('TEA_PAGE_SIZE_MAX', MAX_PAGE_SIZE)
+        if limit is None:
+            limit = min(current_app.config.get('TEA_PAGE_SIZE_DEFAULT', DEFAULT_PAGE_SIZE), max_limit)
+        else:
+            if not limit.isdigit() or int(limit) < 1:
+                raise ValueError('limit must be a positive integer')
+            limit = min(int(limit), max_limit)
+
+        after_id = None
+        if cursor:
+            after_id = parse_tea_id(decode_cursor(cursor).get('id'))
+            if after_id is None:
+                raise ValueError('Invalid cursor')
+        return after_id, limit
 
     @tea_routes.route('/teas', methods=['GET'])
     @login_required
+    @handle_tea_errors
     def get_teas():
-        """Get all teas for the current user"""
-        teas = Tea.query.filter_by(user_id=current_user.id).all()
-        return jsonify([tea.to_dict() for tea in teas])
+        """Get all teas for the current user, one keyset page at a time when paginated"""
+        fields = get_fields()
+        page_args = get_page_args()
+        service = get_tea_service()
+
+        # Only the full shape is cached, sparse fieldsets are cheap to query directly
+        tea_cache = get_tea_cache()
+        if page_args is None and fields is None and tea_cache is not None:
+            entry = tea_cache.get(current_user.id)
+            if entry is None:
+                version = tea_cache.version(current_user.id)
+                teas = service.get_teas(current_user.id)
+                entry = {
+                    'count': len(teas),
+                    'last_updated_at': max((tea['updated_at'] for tea in teas), default=None),
+                    'teas': teas
+                }
+                tea_cache.set(current_user.id, entry, version)
+            etag = collection_etag(entry['count'], entry['last_updated_at'])
+            response = not_modified(etag)
+            if response is not None:
+                return response
+            return with_etag(jsonify(present_teas(entry['teas'])), etag)
+
+        etag = None
+        if request.if_none_match or page_args is not None or fields is not None:
+            # The collection version alone tells whether the collection has changed
+            etag = collection_etag(*service.get_collection_version(current_user.id))
+            response = not_modified(etag)
+            if response is not None:
+                return response
+
+        if page_args is None:
+            teas = service.get_teas(current_user.id, read_fields(fields, 'id'))
+            if etag is None:
+                etag = collection_etag(len(teas), max((tea['updated_at'] for tea in teas), default=None))
+            return with_etag(jsonify(present_teas(teas, fields)), etag)
+
+        after_id, limit = page_args
+        # Fetch one extra tea to learn whether another page follows
+        teas = service.get_teas(current_user.id, read_fields(fields, 'id'), after_id, limit + 1)
+        next_cursor = None
+        if len(teas) > limit:
+            teas = teas[:limit]
+            next_cursor = encode_cursor({'id': teas[-1]['id']})
+        return with_etag(jsonify({
+            'items': present_teas(teas, fields),
+            'next_cursor': next_cursor
+        }), etag)
+
+    @tea_routes.route('/teas/export', methods=['GET'])
+    @login_required
+    def export_teas():
+        """Stream all teas for the current user as newline-delimited JSON"""
+        batch_size = current_app.config.get('TEA_EXPORT_BATCH_SIZE', EXPORT_BATCH_SIZE)
+        teas = get_tea_service().iter_teas(current_user.id, batch_size)
+
+        def generate():
+            # The backend reads one batch at a time, so the whole collection is never held in memory
+            for tea in teas:
+                yield json.dumps(present_teas([tea])[0]) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    def get_sync_position():
+        """Helper function to read the sync token, or None when the client needs a full sync"""
+        since = request.args.get('since')
+        if not since:
+            return None
+        token = decode_cursor(since)
+        try:
+            issued_at = datetime.fromisoformat(token['at'])
+            teas_after = token['teas'] and (datetime.fromisoformat(token['teas'][0]), int(token['teas'][1]))
+            deleted_after = token['deleted'] and (datetime.fromisoformat(token['deleted'][0]),
+                                                  int(token['deleted'][1]))
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise ValueError('Invalid sync token') from e
+        # Tombstones the client has not seen may already have been compacted
+        retention_days = current_app.config.get('TEA_TOMBSTONE_RETENTION_DAYS', TOMBSTONE_RETENTION_DAYS)
+        if issued_at < datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=retention_days):
+            return None
+        return teas_after, deleted_after
+
+    def encode_sync_token(issued_at, teas_after, deleted_after):
+        """
+        Helper function to build the sync token for the given (timestamp, id) positions.
+
+        Timestamps are taken before the commit, so a row stamped just before the last one
+        returned may commit after this sync. The positions are held back to the safety
+        window before issued_at, so such rows are still picked up by the next sync.
+        """
+        window = current_app.config.get('TEA_SYNC_SAFETY_WINDOW_SECONDS', SYNC_SAFETY_WINDOW_SECONDS)
+        horizon = (issued_at - timedelta(seconds=window), 0)
+
+        def position(after):
+            after = after and min(tuple(after), horizon)
+            return after and [after[0].isoformat(), after[1]]
+        return encode_cursor({'at': issued_at.isoformat(), 'teas': position(teas_after),
+                              'deleted': position(deleted_after)})
+
+    @tea_routes.route('/teas/changes', methods=['GET'])
+    @login_required
+    @handle_tea_errors
+    def get_tea_changes():
+        """
+        Get the teas changed and deleted since a sync token, with a token for the next sync.
+
+        Without a token, or with one older than the tombstone retention, every tea is returned
+        and full_sync tells the client to replace its collection. Clients apply deletions
+        before changed teas. Teas and deletions from the last TEA_SYNC_SAFETY_WINDOW_SECONDS
+        are sent again by the next sync, so clients dedupe them by id.
+        """
+        issued_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        position = get_sync_position()
+        teas_after, deleted_after = position if position is not None else (None, None)
+        try:
+            changes = get_tea_service().get_changes(current_user.id, teas_after, deleted_after,
+                                                    full_sync=position is None)
+        except NotImplementedError as e:
+            return jsonify({'error': str(e)}), 501
+        return jsonify({
+            'teas': present_teas(changes['teas']),
+            'deleted': changes['deleted'],
+            'full_sync': position is None,
+            'sync_token': encode_sync_token(issued_at, changes['teas_after'], changes['deleted_after'])
+        })
 
     @tea_routes.route('/teas', methods=['POST'])
     @login_required
@@ -51,95 +304,159 @@ def create_tea_routes():
     def create_tea():
         """Create a new tea"""
         data = validate_json()
-        
-        # Validate required fields
-        required_fields = ['name', 'type', 'steep_time', 'steep_temperature']
-        for field in required_fields:
-            if field not in data:
-                raise KeyError(field)
+        validate_tea_fields(data)
 
-        # Check if tea with same name already exists for this user
-        existing_tea = Tea.query.filter_by(name=data['name'], user_id=current_user.id).first()
-        if existing_tea:
-            return jsonify({'error': 'Tea with this name already exists'}), 400
+        tea = get_tea_service().create_tea(current_user.id, data)
+        invalidate_tea_cache()
+        return jsonify(tea), 201
 
-        tea = Tea(
-            name=data['name'],
-            tea_type=data['type'],
-            steep_time=data['steep_time'],
-            steep_temperature=data['steep_temperature'],
-            notes=data.get('notes'),
-            user_id=current_user.id
-        )
+    @tea_routes.route('/teas/batch', methods=['POST'])
+    @login_required
+    @handle_tea_errors
+    def create_teas():
+        """Create a batch of teas, reporting a result for each item"""
+        data = validate_json()
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array of teas')
+        max_size = current_app.config.get('TEA_BATCH_MAX_SIZE', MAX_BATCH_SIZE)
+        if len(data) > max_size:
+            raise ValueError(f'Batch exceeds the maximum of {max_size} teas')
+
+        results = [None] * len(data)
+        candidates = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                results[index] = {'index': index, 'status': 'error', 'error': 'Expected a JSON object'}
+                continue
+            try:
+                validate_tea_fields(item)
+            except KeyError as e:
+                results[index] = {'index': index, 'status': 'error', 'error': f'Missing required field: {str(e)}'}
+                continue
+            candidates.append((index, item))
 
-        db.session.add(tea)
-        db.session.commit()
+        # One lookup covers the duplicate check for the whole batch
+        service = get_tea_service()
+        existing = service.get_existing_names(current_user.id, {str(item['name']) for _, item in candidates})
 
-        return jsonify(tea.to_dict()), 201
+        rows = []
+        for index, item in candidates:
+            name = str(item['name'])
+            if name in existing:
+                results[index] = {'index': index, 'status': 'error', 'error': 'Tea with this name already exists'}
+                continue
+            existing.add(name)
+            rows.append((index, dict(item, name=name)))
 
-    @tea_routes.route('/teas/<int:tea_id>', methods=['GET'])
+        created = 0
+        if rows:
+            teas = service.create_teas(current_user.id, [row for _, row in rows])
+            invalidate_tea_cache()
+            for (index, _), tea in zip(rows, teas):
+                if tea is None:
+                    results[index] = {'index': index, 'status': 'error', 'error': 'Tea could not be stored'}
+                elif isinstance(tea, Exception):
+                    results[index] = {'index': index, 'status': 'error', 'error': str(tea)}
+                else:
+                    results[index] = {'index': index, 'status': 'created', 'tea': tea}
+                    created += 1
+
+        if created == len(results):
+            status = 201
+        elif created:
+            status = 207
+        else:
+            status = 400
+        return jsonify({'results': results, 'created': created, 'failed': len(results) - created}), status
+
+    @tea_routes.route('/teas/<tea_id>', methods=['GET'])
     @login_required
+    @handle_tea_errors
     def get_tea(tea_id):
         """Get a specific tea"""
-        tea, error = get_tea_or_404(tea_id)
-        if error:
-            return error
-        return jsonify(tea.to_dict())
+        fields = get_fields()
+        tea_id = parse_tea_id(tea_id)
+        # The ETag is built from the id and updated_at, so they are read even when not requested
+        tea = None if tea_id is None else get_tea_service().get_tea(
+            current_user.id, tea_id, read_fields(fields, 'id', 'updated_at'))
+        if tea is None:
+            return tea_not_found()
+        etag = tea_etag(tea)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        return with_etag(jsonify(present_teas([tea], fields)[0]), etag)
 
-    @tea_routes.route('/teas/<int:tea_id>', methods=['PUT'])
+    @tea_routes.route('/teas/<tea_id>', methods=['PUT'])
     @login_required
     @handle_tea_errors
     def update_tea(tea_id):
         """Update a tea"""
-        tea, error = get_tea_or_404(tea_id)
-        if error:
-            return error
-
+        tea_id = parse_tea_id(tea_id)
+        if tea_id is None:
+            return tea_not_found()
         data = validate_json()
 
-        # Update fields if present in request
-        updatable_fields = ['name', 'type', 'steep_time', 'steep_temperature', 'notes']
-        for field in updatable_fields:
-            if field in data:
-                setattr(tea, field, data[field])
-
-        db.session.commit()
-        return jsonify(tea.to_dict())
+        tea = get_tea_service().update_tea(current_user.id, tea_id, data)
+        if tea is None:
+            return tea_not_found()
+        invalidate_tea_cache()
+        return jsonify(present_teas([tea])[0])
 
-    @tea_routes.route('/teas/<int:tea_id>', methods=['DELETE'])
+    @tea_routes.route('/teas/<tea_id>', methods=['DELETE'])
     @login_required
     def delete_tea(tea_id):
         """Delete a tea"""
-        tea, error = get_tea_or_404(tea_id)
-        if error:
-            return error
+        tea_id = parse_tea_id(tea_id)
+        if tea_id is None:
+            return tea_not_found()
 
-        db.session.delete(tea)
-        db.session.commit()
+        steep_buffer = get_steep_buffer()
+        if steep_buffer is not None:
+            steep_buffer.discard(current_user.id, tea_id)
+        if not get_tea_service().delete_tea(current_user.id, tea_id):
+            return tea_not_found()
+        invalidate_tea_cache()
         return '', 204
 
-    @tea_routes.route('/teas/<int:tea_id>/steep', methods=['POST'])
+    @tea_routes.route('/teas/<tea_id>/steep', methods=['POST'])
     @login_required
     def increment_steep_count(tea_id):
         """Increment the steep count for a tea"""
-        tea, error = get_tea_or_404(tea_id)
-        if error:
-            return error
+        tea_id = parse_tea_id(tea_id)
+        if tea_id is None:
+            return tea_not_found()
+
+        service = get_tea_service()
+        steep_buffer = get_steep_buffer()
+        if steep_buffer is not None:
+            tea = service.get_tea(current_user.id, tea_id)
+            if tea is None:
+                return tea_not_found()
+            steep_buffer.add(current_user.id, tea_id)
+            return jsonify(present_teas([tea])[0])
 
-        tea.steep_count += 1
-        db.session.commit()
-        return jsonify(tea.to_dict())
+        tea = service.increment_steep_count(current_user.id, tea_id)
+        if tea is None:
+            return tea_not_found()
+        invalidate_tea_cache()
+        return jsonify(tea)
 
-    @tea_routes.route('/teas/<int:tea_id>/steep', methods=['DELETE'])
+    @tea_routes.route('/teas/<tea_id>/steep', methods=['DELETE'])
     @login_required
     def clear_steep_count(tea_id):
         """Reset the steep count for a tea to 0"""
-        tea, error = get_tea_or_404(tea_id)
-        if error:
-            return error
+        tea_id = parse_tea_id(tea_id)
+        if tea_id is None:
+            return tea_not_found()
 
-        tea.steep_count = 0
-        db.session.commit()
-        return jsonify(tea.to_dict())
+        steep_buffer = get_steep_buffer()
+        if steep_buffer is not None:
+            steep_buffer.discard(current_user.id, tea_id)
+        tea = get_tea_service().clear_steep_count(current_user.id, tea_id)
+        if tea is None:
+            return tea_not_found()
+        invalidate_tea_cache()
+        return jsonify(tea)
 
     return tea_routes
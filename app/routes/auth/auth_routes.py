@@ -1,5 +1,5 @@
 """Authentication routes"""
-from flask import Blueprint, request, jsonify, url_for
+from flask import Blueprint, current_app, request, jsonify, url_for
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.urls import url_parse
 from app.extensions import db
@@ -49,7 +49,12 @@ def create_auth_routes():
         user = User.query.filter_by(username=data['username']).first()
         if user is None or not user.check_password(data['password']):
             return jsonify({'error': 'Invalid username or password'}), 401
-            
+
+        # Upgrade the stored hash while the plain password is at hand
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            db.session.commit()
+
         # Log in user
         login_user(user, remember=data.get('remember_me', False))
         
@@ -67,6 +72,9 @@ def create_auth_routes():
     @login_required
     def logout():
         """Log out the current user"""
+        user_cache = current_app.extensions.get('user_cache')
+        if user_cache is not None:
+            user_cache.invalidate(current_user.id)
         logout_user()
         return jsonify({'message': 'Logged out successfully'}), 200
 
@@ -0,0 +1,140 @@
+"""Write-behind buffer that coalesces steep count increments"""
+import atexit
+import logging
+import threading
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from app.extensions import db
+from app.models.tea import Tea
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL_MS = 500
+DEFAULT_MAX_PENDING = 100
+
+
+class SteepCountBuffer:
+    """
+    Accumulates steep increments per (user_id, tea_id) and writes them back in batches.
+
+    Increments are flushed as a single executemany UPDATE every flush interval, as soon
+    as max_pending increments are waiting, and when the process exits. Until then,
+    readers fold pending_for_user() into what they load from the database.
+
+    A flush commits and stops reporting its deltas as pending under the same lock, so a
+    reader never counts a flushed increment twice. Readers load from the database before
+    asking for pending increments, so one whose load began before the commit can miss the
+    flushed increments in that one response.
+    """
+    def __init__(self, app=None, flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS, max_pending=DEFAULT_MAX_PENDING):
+        self.app = None
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending
+        self._deltas = {}     # user_id -> {tea_id: delta} waiting for the next flush
+        self._flushing = {}   # deltas taken by an in-progress flush, still visible to readers
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._flush_listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the buffer to an app and make sure it is drained on shutdown"""
+        self.app = app
+        self.flush_interval = app.config.get('STEEP_FLUSH_INTERVAL_MS', DEFAULT_FLUSH_INTERVAL_MS) / 1000
+        self.max_pending = app.config.get('STEEP_FLUSH_MAX_PENDING', DEFAULT_MAX_PENDING)
+        app.extensions['steep_buffer'] = self
+        atexit.register(self.close)
+
+    def add_flush_listener(self, listener):
+        """Register a callable invoked with the set of user ids written by each flush"""
+        self._flush_listeners.append(listener)
+
+    def add(self, user_id, tea_id, delta=1):
+        """Record a steep increment for a tea"""
+        with self._lock:
+            user_deltas = self._deltas.setdefault(user_id, {})
+            user_deltas[tea_id] = user_deltas.get(tea_id, 0) + delta
+            self._pending += 1
+            should_flush = self._pending >= self.max_pending
+            self._start_flush_thread()
+        if should_flush:
+            self.flush()
+
+    def pending_for_user(self, user_id):
+        """Get the unflushed increments for a user's teas, keyed by tea id"""
+        with self._lock:
+            pending = dict(self._flushing.get(user_id, {}))
+            for tea_id, delta in self._deltas.get(user_id, {}).items():
+                pending[tea_id] = pending.get(tea_id, 0) + delta
+        return pending
+
+    def discard(self, user_id, tea_id):
+        """Drop unflushed increments for a tea that is being reset or deleted"""
+        # Wait out any in-progress flush so it cannot land after the caller's write
+        with self._flush_lock, self._lock:
+            user_deltas = self._deltas.get(user_id, {})
+            self._pending -= user_deltas.pop(tea_id, 0)
+            if not user_deltas:
+                self._deltas.pop(user_id, None)
+
+    def flush(self):
+        """Write all pending increments as one batched UPDATE, returning the number of teas updated"""
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._deltas = self._deltas, {}
+                self._pending = 0
+            if not self._flushing:
+                return 0
+
+            params = [
+                {'b_user_id': user_id, 'b_tea_id': tea_id, 'b_delta': delta}
+                for user_id, user_deltas in self._flushing.items()
+                for tea_id, delta in user_deltas.items()
+            ]
+            teas = Tea.__table__
+            stmt = teas.update().where(
+                teas.c.id == bindparam('b_tea_id'), teas.c.user_id == bindparam('b_user_id')
+            ).values(steep_count=teas.c.steep_count + bindparam('b_delta'))
+            try:
+                with db.get_engine(self.app).connect() as connection:
+                    transaction = connection.begin()
+                    connection.execute(stmt, params)
+                    # Commit and drop the flushed deltas in one step, so that no reader sees both
+                    with self._lock:
+                        transaction.commit()
+                        user_ids = set(self._flushing)
+                        self._flushing = {}
+            except SQLAlchemyError:
+                logger.exception("Failed to flush %d buffered steep counts, retrying on next flush", len(params))
+                with self._lock:
+                    for user_id, user_deltas in self._flushing.items():
+                        for tea_id, delta in user_deltas.items():
+                            merged = self._deltas.setdefault(user_id, {})
+                            merged[tea_id] = merged.get(tea_id, 0) + delta
+                            self._pending += delta
+                    self._flushing = {}
+                return 0
+        for listener in self._flush_listeners:
+            listener(user_ids)
+        return len(params)
+
+    def close(self):
+        """Stop the background flusher and write out anything still pending"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _start_flush_thread(self):
+        # Started lazily so that each forked gunicorn worker gets its own flusher
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='steep-buffer-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,511 @@
+"""Tea storage backends behind TeaService"""
+from collections import Counter
+from itertools import islice
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from operator import attrgetter
+from sqlalchemy import bindparam, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from app.dao.cached_tea_dao import create_tea_dao
+from app.dao.memory_tea_dao import MemoryTeaDao
+from app.extensions import db
+from app.models.tea import Tea
+from app.models.tea_tombstone import TeaTombstone
+
+_tea_attributes = attrgetter(*Tea.SERIALIZABLE_FIELDS)
+
+# Fields a tea update may change
+UPDATABLE_FIELDS = ('name', 'type', 'steep_time', 'steep_temperature', 'notes')
+
+# Unique index on (user_id, name), see Tea.__table_args__
+NAME_INDEX = 'ix_teas_user_id_name'
+
+SECONDS_PER_MINUTE = 60
+# Steep times are stored in minutes, rounded finely enough to read back whole seconds exactly
+MINUTES_PRECISION = Decimal('0.000001')
+
+
+class TeaExistsError(ValueError):
+    """Raised when a user already has a tea with the requested name"""
+    def __init__(self):
+        super().__init__('Tea with this name already exists')
+
+
+def utc_now():
+    """Get the current UTC time as a naive datetime, like the teas table stores"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TeaBackend:
+    """
+    The storage operations TeaService needs, scoped to one user's teas.
+
+    Teas go in and come out as dictionaries shaped like the API's tea objects: id, name,
+    type, steep_time in seconds, steep_temperature in celsius, steep_count, notes and
+    ISO 8601 created_at and updated_at. A fieldset limits the keys of returned teas.
+    Tea IDs are opaque to callers; parse_tea_id turns request values into this backend's IDs.
+    """
+    name = None
+
+    def parse_tea_id(self, value):
+        """Get the tea ID a URL segment or cursor value names, or None if it cannot be one"""
+        raise NotImplementedError
+
+    def list_teas(self, user_id, fields=None, after_id=None, limit=None):
+        """Get a user's teas, or a page of up to limit teas in ID order after after_id"""
+        raise NotImplementedError
+
+    def iter_teas(self, user_id, batch_size):
+        """Iterate over a user's teas in ID order, reading batch_size at a time"""
+        raise NotImplementedError
+
+    def collection_version(self, user_id):
+        """Get the number of teas a user has and the latest updated_at among them"""
+        raise NotImplementedError
+
+    def get_tea(self, user_id, tea_id, fields=None):
+        """Get a tea, or None"""
+        raise NotImplementedError
+
+    def existing_names(self, user_id, names):
+        """Get which of the names the user's teas already use"""
+        raise NotImplementedError
+
+    def create_tea(self, user_id, data):
+        """Create a tea, raising TeaExistsError for a duplicate name"""
+        raise NotImplementedError
+
+    def create_teas(self, user_id, teas):
+        """
+        Create several teas with distinct new names.
+
+        Returns:
+            list: Each created tea, a TeaExistsError where the name was taken in the meantime,
+                or None where the tea could not be stored.
+        """
+        raise NotImplementedError
+
+    def update_tea(self, user_id, tea_id, changes):
+        """Update a tea's updatable fields, returning it or None if it does not exist"""
+        raise NotImplementedError
+
+    def delete_tea(self, user_id, tea_id):
+        """Delete a tea, returning whether it existed"""
+        raise NotImplementedError
+
+    def increment_steep_count(self, user_id, tea_id):
+        """Add a steep to a tea, returning it or None if it does not exist"""
+        raise NotImplementedError
+
+    def increment_steep_counts(self, user_id, tea_ids):
+        """Add a steep per listing to several teas, raising KeyError if one does not exist"""
+        raise NotImplementedError
+
+    def clear_steep_count(self, user_id, tea_id):
+        """Reset a tea's steep count to 0, returning it or None if it does not exist"""
+        raise NotImplementedError
+
+    def get_changes(self, user_id, teas_after=None, deleted_after=None, full_sync=False):
+        """
+        Get the teas changed and deleted after (timestamp, id) positions, for delta sync.
+
+        Returns:
+            dict: 'teas', 'deleted' and the positions of the last of each, 'teas_after'
+                and 'deleted_after', unchanged when there were none.
+        """
+        raise NotImplementedError(f'Change feeds are not supported by the {self.name} backend')
+
+
+def is_name_conflict(error):
+    """
+    Check whether an IntegrityError is a violation of the unique tea name index.
+
+    Postgres and MySQL name the index in their message; SQLite names its columns.
+    """
+    message = str(error.orig)
+    return NAME_INDEX in message or 'teas.user_id, teas.name' in message
+
+
+def row_to_tea(row, fields=None):
+    """
+    Convert a result row selecting the given tea columns, in that order, to a tea dict.
+
+    Datetimes are left as they are: the JSON encoder formats them, natively with orjson,
+    so no isoformat() call is made per row.
+    """
+    return dict(zip(fields or Tea.SERIALIZABLE_FIELDS, row))
+
+
+class SqlTeaBackend(TeaBackend):
+    """Teas stored in the teas table through Flask-SQLAlchemy"""
+    name = 'sql'
+
+    def parse_tea_id(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        # isdigit() alone also accepts characters such as superscripts that int() rejects
+        if isinstance(value, str) and value.isascii() and value.isdigit():
+            return int(value)
+        return None
+
+    @staticmethod
+    def select_teas(user_id, fields=None):
+        """Build a SELECT of the given fields of a user's teas"""
+        teas = Tea.__table__
+        columns = Tea.SERIALIZABLE_FIELDS if fields is None else fields
+        return select(*(teas.c[field] for field in columns)).where(teas.c.user_id == user_id)
+
+    def list_teas(self, user_id, fields=None, after_id=None, limit=None):
+        teas = Tea.__table__
+        stmt = self.select_teas(user_id, fields)
+        if after_id is not None:
+            stmt = stmt.where(teas.c.id > after_id)
+        if limit is not None:
+            stmt = stmt.order_by(teas.c.id).limit(limit)
+        return [row_to_tea(row, fields) for row in db.session.execute(stmt)]
+
+    def iter_teas(self, user_id, batch_size):
+        stmt = self.select_teas(user_id).order_by(Tea.__table__.c.id)
+        # A server-side cursor only holds one batch of rows at a time
+        result = db.session.execute(stmt.execution_options(stream_results=True))
+        for rows in result.partitions(batch_size):
+            for row in rows:
+                yield row_to_tea(row)
+
+    def collection_version(self, user_id):
+        return db.session.query(func.count(Tea.id), func.max(Tea.updated_at)).filter(
+            Tea.user_id == user_id).one()
+
+    def get_tea(self, user_id, tea_id, fields=None):
+        row = db.session.execute(self.select_teas(user_id, fields).where(Tea.__table__.c.id == tea_id)).first()
+        return None if row is None else row_to_tea(row, fields)
+
+    def existing_names(self, user_id, names):
+        if not names:
+            return set()
+        return {name for (name,) in Tea.query.with_entities(Tea.name).filter(
+            Tea.user_id == user_id, Tea.name.in_(names))}
+
+    def create_tea(self, user_id, data):
+        if Tea.query.filter_by(name=data['name'], user_id=user_id).first():
+            raise TeaExistsError()
+        tea = Tea(
+            name=data['name'],
+            tea_type=data['type'],
+            steep_time=data['steep_time'],
+            steep_temperature=data['steep_temperature'],
+            notes=data.get('notes'),
+            user_id=user_id
+        )
+        db.session.add(tea)
+        db.session.commit()
+        return row_to_tea(_tea_attributes(tea))
+
+    def create_teas(self, user_id, teas):
+        rows = [
+            {
+                'name': tea['name'],
+                'type': tea['type'],
+                'steep_time': tea['steep_time'],
+                'steep_temperature': tea['steep_temperature'],
+                'notes': tea.get('notes'),
+                'user_id': user_id
+            }
+            for tea in teas
+        ]
+        errors = {}
+        try:
+            # A list of parameter sets makes this a single executemany INSERT
+            db.session.execute(Tea.__table__.insert(), rows)
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_name_conflict(e):
+                raise
+            # A concurrent request took one of the names after the duplicate check. Insert
+            # the rows one at a time, so only the conflicting ones fail
+            for index, row in enumerate(rows):
+                try:
+                    db.session.execute(Tea.__table__.insert(), row)
+                    db.session.commit()
+                except IntegrityError as row_error:
+                    db.session.rollback()
+                    if not is_name_conflict(row_error):
+                        raise
+                    errors[index] = TeaExistsError()
+
+        names = [row['name'] for index, row in enumerate(rows) if index not in errors]
+        created = {tea['name']: tea for tea in (
+            row_to_tea(row) for row in db.session.execute(
+                self.select_teas(user_id).where(Tea.__table__.c.name.in_(names))))}
+        return [errors[index] if index in errors else created[row['name']] for index, row in enumerate(rows)]
+
+    def update_tea(self, user_id, tea_id, changes):
+        tea = Tea.query.filter_by(id=tea_id, user_id=user_id).first()
+        if tea is None:
+            return None
+        for field in UPDATABLE_FIELDS:
+            if field in changes:
+                setattr(tea, field, changes[field])
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            raise TeaExistsError() from e
+        return row_to_tea(_tea_attributes(tea))
+
+    def delete_tea(self, user_id, tea_id):
+        tea = Tea.query.filter_by(id=tea_id, user_id=user_id).first()
+        if tea is None:
+            return False
+        # Leave a tombstone so that syncing clients learn about the deletion
+        db.session.add(TeaTombstone(tea_id=tea.id, user_id=user_id))
+        db.session.delete(tea)
+        db.session.commit()
+        return True
+
+    def increment_steep_count(self, user_id, tea_id):
+        return self._set_steep_count(user_id, tea_id, Tea.steep_count + 1)
+
+    def increment_steep_counts(self, user_id, tea_ids):
+        increments = Counter(tea_ids)
+        found = {tea_id for (tea_id,) in Tea.query.with_entities(Tea.id).filter(
+            Tea.user_id == user_id, Tea.id.in_(list(increments)))}
+        missing = [str(tea_id) for tea_id in increments if tea_id not in found]
+        if missing:
+            raise KeyError(f"Teas not found: {', '.join(missing)}")
+        teas = Tea.__table__
+        stmt = teas.update().where(
+            teas.c.id == bindparam('b_tea_id'), teas.c.user_id == user_id
+        ).values(steep_count=teas.c.steep_count + bindparam('b_delta'))
+        db.session.execute(stmt, [{'b_tea_id': tea_id, 'b_delta': delta} for tea_id, delta in increments.items()])
+        db.session.commit()
+        return dict(increments)
+
+    def clear_steep_count(self, user_id, tea_id):
+        return self._set_steep_count(user_id, tea_id, 0)
+
+    def get_changes(self, user_id, teas_after=None, deleted_after=None, full_sync=False):
+        teas = Tea.__table__
+        # Keyset on (updated_at, id), served by ix_teas_user_id_updated_at
+        stmt = self.select_teas(user_id)
+        if teas_after:
+            stmt = stmt.where(tuple_(teas.c.updated_at, teas.c.id) > teas_after)
+        rows = db.session.execute(stmt.order_by(teas.c.updated_at, teas.c.id)).all()
+
+        tombstones = TeaTombstone.query.filter(TeaTombstone.user_id == user_id)
+        if full_sync:
+            # A full sync has nothing to delete, it only needs to skip past existing tombstones
+            tombstones = tombstones.order_by(TeaTombstone.deleted_at.desc(), TeaTombstone.id.desc()).limit(1).all()
+            deleted = []
+        else:
+            if deleted_after:
+                tombstones = tombstones.filter(tuple_(TeaTombstone.deleted_at, TeaTombstone.id) > deleted_after)
+            tombstones = tombstones.order_by(TeaTombstone.deleted_at, TeaTombstone.id).all()
+            deleted = [tombstone.to_dict() for tombstone in tombstones]
+
+        if rows:
+            teas_after = (rows[-1].updated_at, rows[-1].id)
+        if tombstones:
+            deleted_after = (tombstones[-1].deleted_at, tombstones[-1].id)
+        return {
+            'teas': [row_to_tea(row) for row in rows],
+            'deleted': deleted,
+            'teas_after': teas_after,
+            'deleted_after': deleted_after
+        }
+
+    @staticmethod
+    def supports_update_returning():
+        """Check whether the database can return rows from an UPDATE"""
+        dialect = db.engine.dialect
+        # SQLAlchemy 2.x calls this update_returning; 1.4 only enables it as full_returning
+        return getattr(dialect, 'update_returning', getattr(dialect, 'full_returning', False))
+
+    def _set_steep_count(self, user_id, tea_id, steep_count):
+        """Apply a steep count change in a single UPDATE statement"""
+        teas = Tea.__table__
+        stmt = teas.update().where(
+            teas.c.id == tea_id, teas.c.user_id == user_id
+        ).values(steep_count=steep_count)
+
+        if self.supports_update_returning():
+            row = db.session.execute(stmt.returning(*(teas.c[field] for field in Tea.SERIALIZABLE_FIELDS))).first()
+        else:
+            # Without RETURNING, read the row back inside the same transaction
+            result = db.session.execute(stmt)
+            row = None
+            if result.rowcount:
+                row = db.session.execute(self.select_teas(user_id).where(teas.c.id == tea_id)).first()
+        db.session.commit()
+        return None if row is None else row_to_tea(row)
+
+
+def number(value, field):
+    """Read a numeric tea field as a Decimal"""
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError) as e:
+        raise ValueError(f'{field} must be a number') from e
+
+
+def tea_to_item(data):
+    """Convert API tea fields to TeaDao item attributes, in the item's units"""
+    item = {}
+    if 'name' in data:
+        item['Name'] = data['name']
+    if 'type' in data:
+        item['Type'] = data['type']
+    if 'steep_time' in data:
+        item['SteepTimeMinutes'] = (number(data['steep_time'], 'steep_time') / SECONDS_PER_MINUTE).quantize(
+            MINUTES_PRECISION)
+    if 'steep_temperature' in data:
+        item['SteepTemperatureFahrenheit'] = number(data['steep_temperature'], 'steep_temperature') * 9 / 5 + 32
+    if 'notes' in data:
+        item['Notes'] = data['notes']
+    return item
+
+
+def partition_key(user_id):
+    """Get the user_id key of a user's items, which the tea table types as a string"""
+    return str(user_id)
+
+
+def item_to_tea(item, fields=None):
+    """Convert a TeaDao item to an API tea, in the API's units"""
+    tea = {
+        'id': item['tea_id'],
+        'name': item['Name'],
+        'type': item['Type'],
+        'steep_time': int(round(Decimal(str(item.get('SteepTimeMinutes', 0))) * SECONDS_PER_MINUTE)),
+        'steep_temperature': int(round((Decimal(str(item.get('SteepTemperatureFahrenheit', 32))) - 32) * 5 / 9)),
+        'steep_count': int(item.get('SteepCount', 0)),
+        'notes': item.get('Notes'),
+        'created_at': item.get('CreatedAt'),
+        'updated_at': item.get('UpdatedAt')
+    }
+    if fields is None:
+        return tea
+    return {field: tea[field] for field in fields}
+
+
+class ItemTeaBackend(TeaBackend):
+    """
+    Teas stored as items through a TeaDao-shaped DAO: TeaDao, CachedTeaDao or MemoryTeaDao.
+
+    Items keep DynamoDB's attribute names and units (steep time in minutes, temperature in
+    fahrenheit) and are converted at this boundary, as are user IDs, which the table keys
+    as strings. Tea IDs are the items' UUID strings.
+    Pages are queried from their cursor and the collection version from the DAO's
+    indexes; full listings and name checks read the user's whole partition, which
+    suits collections of personal size. There are no tombstones, so no change feed.
+    """
+    def __init__(self, tea_dao, name='dynamodb'):
+        self.tea_dao = tea_dao
+        self.name = name
+
+    def parse_tea_id(self, value):
+        return value if isinstance(value, str) and value else None
+
+    def list_teas(self, user_id, fields=None, after_id=None, limit=None):
+        user_id = partition_key(user_id)
+        if after_id is None and limit is None:
+            items = self.tea_dao.get_all_tea_items(user_id)
+        else:
+            # Only the page is read: the query starts at the cursor and stops after limit items
+            items = islice(self.tea_dao.iter_tea_items(user_id, page_size=limit, start_after=after_id), limit)
+        return [item_to_tea(item, fields) for item in items]
+
+    def iter_teas(self, user_id, batch_size):
+        user_id = partition_key(user_id)
+        for item in self.tea_dao.iter_tea_items(user_id, page_size=batch_size):
+            yield item_to_tea(item)
+
+    def collection_version(self, user_id):
+        return self.tea_dao.collection_version(partition_key(user_id))
+
+    def get_tea(self, user_id, tea_id, fields=None):
+        user_id = partition_key(user_id)
+        item = self.tea_dao.get_tea_item(user_id, tea_id)
+        return None if item is None else item_to_tea(item, fields)
+
+    def existing_names(self, user_id, names):
+        user_id = partition_key(user_id)
+        stored = {item['Name'] for item in self.tea_dao.get_all_tea_items(user_id)}
+        return stored.intersection(names)
+
+    def create_tea(self, user_id, data):
+        user_id = partition_key(user_id)
+        if self.existing_names(user_id, [data['name']]):
+            raise TeaExistsError()
+        return item_to_tea(self.tea_dao.create_tea_item(user_id, self.new_item(data)))
+
+    def create_teas(self, user_id, teas):
+        user_id = partition_key(user_id)
+        outcomes = self.tea_dao.batch_create_tea_items(user_id, [self.new_item(tea) for tea in teas])
+        return [item_to_tea(outcome['item']) if outcome['status'] == 'created' else None for outcome in outcomes]
+
+    def update_tea(self, user_id, tea_id, changes):
+        user_id = partition_key(user_id)
+        item = self.tea_dao.get_tea_item(user_id, tea_id)
+        if item is None:
+            return None
+        changes = {field: changes[field] for field in UPDATABLE_FIELDS if field in changes}
+        if 'name' in changes and changes['name'] != item['Name'] and self.existing_names(user_id, [changes['name']]):
+            raise TeaExistsError()
+        attributes = dict(tea_to_item(changes), UpdatedAt=utc_now().isoformat())
+        try:
+            self.tea_dao.update_tea_item(user_id, tea_id, attributes)
+        except KeyError:
+            # Deleted since it was read
+            return None
+        return item_to_tea(dict(item, **attributes))
+
+    def delete_tea(self, user_id, tea_id):
+        user_id = partition_key(user_id)
+        if self.tea_dao.get_tea_item(user_id, tea_id) is None:
+            return False
+        self.tea_dao.delete_tea_item(user_id, tea_id)
+        return True
+
+    def increment_steep_count(self, user_id, tea_id):
+        user_id = partition_key(user_id)
+        # The update returns the item it wrote, so the response never shows a stale
+        # count from an eventually consistent or cached read
+        try:
+            item = self.tea_dao.increment_steep_count(user_id, tea_id, updated_at=utc_now().isoformat())
+        except KeyError:
+            return None
+        return item_to_tea(item)
+
+    def increment_steep_counts(self, user_id, tea_ids):
+        user_id = partition_key(user_id)
+        # Conditional on each tea existing, so a missing tea raises KeyError and nothing is applied.
+        # UpdatedAt moves on in the same update, so ETags and the collection version follow the count
+        return self.tea_dao.increment_steep_counts(user_id, tea_ids, updated_at=utc_now().isoformat())
+
+    def clear_steep_count(self, user_id, tea_id):
+        user_id = partition_key(user_id)
+        try:
+            item = self.tea_dao.clear_steep_count(user_id, tea_id, updated_at=utc_now().isoformat())
+        except KeyError:
+            return None
+        return item_to_tea(item)
+
+    @staticmethod
+    def new_item(data):
+        """Build the attributes of a new item from an API tea"""
+        now = utc_now().isoformat()
+        return dict(tea_to_item(data), CreatedAt=now, UpdatedAt=now)
+
+
+def create_tea_backend(config):
+    """Build the tea storage backend selected by TEA_BACKEND"""
+    backend = config.get('TEA_BACKEND', 'sql')
+    if backend == 'sql':
+        return SqlTeaBackend()
+    if backend == 'dynamodb':
+        return ItemTeaBackend(create_tea_dao(config), name='dynamodb')
+    if backend == 'memory':
+        return ItemTeaBackend(MemoryTeaDao.from_config(config), name='memory')
+    raise ValueError(f"Unknown tea backend: {backend}")
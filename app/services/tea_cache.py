@@ -0,0 +1,189 @@
+"""Per-user cache of serialized tea collections"""
+import json
+import logging
+import threading
+from datetime import date
+from app.utils.cache import KeyVersions, LRUCache
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def encode_date(value):
+    """Encode the datetimes of SQL-backed teas in ISO 8601, as the JSON responses render them"""
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+class MemoryCacheBackend:
+    """Cache backend local to one worker process"""
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.cache = LRUCache(max_entries=max_entries, ttl=ttl)
+        # Bumped per key by delete, so that a fill racing a delete of its key does not cache what it read
+        self._versions = KeyVersions()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get a cached value or None"""
+        return self.cache.get(key)
+
+    def version(self, key):
+        """Get a token that changes whenever the key is deleted"""
+        return self._versions.get(key)
+
+    def set(self, key, value, version):
+        """Store a value, unless the key was deleted since version was read"""
+        with self._lock:
+            if version == self._versions.get(key):
+                self.cache.set(key, value)
+
+    def delete(self, key):
+        """Remove a value"""
+        with self._lock:
+            self._versions.bump(key)
+            self.cache.delete(key)
+
+
+class RedisCacheBackend:
+    """
+    Cache backend shared by all worker processes through Redis.
+
+    Each key has a version counter next to it, bumped by delete, so that a fill racing a
+    delete in another worker is dropped. Redis errors are logged rather than raised: a
+    failed read is a miss, and a failed delete leaves the entry to expire.
+    """
+    def __init__(self, client, ttl=DEFAULT_TTL_SECONDS, prefix='teaminder:teas:'):
+        import redis  # pylint: disable=import-outside-toplevel
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.errors = redis.RedisError
+        self.watch_error = redis.WatchError
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """Create a backend connected to the Redis server at url"""
+        import redis  # pylint: disable=import-outside-toplevel
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        """Get a cached value or None"""
+        try:
+            raw = self.client.get(self.prefix + str(key))
+        except self.errors as e:
+            logger.warning("Tea cache read failed, treating it as a miss: %s", e)
+            return None
+        return None if raw is None else json.loads(raw)
+
+    def version(self, key):
+        """Get a token that changes whenever the key is deleted, or None if Redis cannot be reached"""
+        try:
+            return int(self.client.get(self.version_key(key)) or 0)
+        except self.errors as e:
+            logger.warning("Tea cache version read failed: %s", e)
+            return None
+
+    def set(self, key, value, version):
+        """Store a value, unless the key was deleted since version was read"""
+        if version is None:
+            return
+        version_key = self.version_key(key)
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.watch(version_key)
+                if int(pipe.get(version_key) or 0) != version:
+                    return
+                pipe.multi()
+                pipe.set(self.prefix + str(key), json.dumps(value, default=encode_date), ex=self.ttl)
+                pipe.execute()
+        except self.watch_error:
+            # Deleted while the value was being stored
+            pass
+        except self.errors as e:
+            logger.warning("Tea cache write failed: %s", e)
+
+    def delete(self, key):
+        """Remove a value"""
+        version_key = self.version_key(key)
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.incr(version_key)
+                # Outlives any entry filled at the previous version
+                pipe.expire(version_key, self.ttl * 2)
+                pipe.delete(self.prefix + str(key))
+                pipe.execute()
+        except self.errors as e:
+            logger.warning("Tea cache invalidation failed, the entry expires in %d s: %s", self.ttl, e)
+
+    def version_key(self, key):
+        """Get the Redis key of a key's version counter"""
+        return f'{self.prefix}version:{key}'
+
+
+def create_cache_backend(config):
+    """Build the cache backend selected by TEA_CACHE_BACKEND"""
+    backend = config.get('TEA_CACHE_BACKEND')
+    ttl = config.get('TEA_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)
+    if backend == 'memory':
+        return MemoryCacheBackend(max_entries=config.get('TEA_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES), ttl=ttl)
+    if backend == 'redis':
+        return RedisCacheBackend.from_url(config['TEA_CACHE_REDIS_URL'], ttl=ttl)
+    raise ValueError(f"Unknown tea cache backend: {backend}")
+
+
+class TeaCollectionCache:
+    """
+    Caches each user's full tea list along with the collection version it was read at.
+
+    Entries are dicts with 'count', 'last_updated_at' and 'teas' so that hits can answer
+    conditional requests without touching the database. Every write to a user's teas
+    must call invalidate(), and a miss is filled with the version read before loading
+    the collection, so that data read before a concurrent invalidation is not cached.
+    """
+    def __init__(self, app=None, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind the cache to an app, building the configured backend if none was given"""
+        if self.backend is None:
+            self.backend = create_cache_backend(app.config)
+        app.extensions['tea_cache'] = self
+
+    def get(self, user_id):
+        """Get the cached collection entry for a user, or None"""
+        entry = self.backend.get(user_id)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def version(self, user_id):
+        """Get the version of a user's entry, to read before loading the collection for set()"""
+        return self.backend.version(user_id)
+
+    def set(self, user_id, entry, version):
+        """Cache the collection entry for a user, unless it was invalidated since version"""
+        self.backend.set(user_id, entry, version)
+
+    def invalidate(self, user_id):
+        """Drop the cached collection for a user"""
+        self.backend.delete(user_id)
+
+    def invalidate_many(self, user_ids):
+        """Drop the cached collections for several users"""
+        for user_id in user_ids:
+            self.backend.delete(user_id)
+
+    def stats(self):
+        """Get the hit and miss counters for this process"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
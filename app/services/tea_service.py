@@ -1,34 +1,72 @@
-from app.dao.tea_dao import TeaDao
+from app.services.tea_backends import TeaBackend, create_tea_backend
 
 class TeaService:
-    """Services for teas"""
-    def __init__(self, tea_dao: TeaDao):
-        self.tea_table = tea_dao
+    """
+    Services for teas, over the storage backend selected by TEA_BACKEND.
 
-    def get_all_tea_items(self):
-        """Get all teas"""
-        return self.tea_table.get_all_tea_items()
+    Teas are API-shaped dictionaries whatever the backend, see TeaBackend. Layers that
+    apply to every backend, such as caching, batching or metrics, belong here.
+    """
+    def __init__(self, backend: TeaBackend):
+        self.backend = backend
 
-    def get_tea_item(self, name):
-        """Get a tea by name"""
-        return self.tea_table.get_tea_item(name)
+    @classmethod
+    def from_config(cls, config):
+        """Create the service over the backend named by TEA_BACKEND: 'sql' (default), 'dynamodb' or 'memory'"""
+        return cls(create_tea_backend(config))
 
-    def create_tea_item(self, tea_item):
+    def parse_tea_id(self, value):
+        """Get the tea ID a URL segment or cursor value names, or None if it cannot be one"""
+        return self.backend.parse_tea_id(value)
+
+    def get_teas(self, user_id, fields=None, after_id=None, limit=None):
+        """Get a user's teas, or a page of them in ID order"""
+        return self.backend.list_teas(user_id, fields, after_id, limit)
+
+    def iter_teas(self, user_id, batch_size):
+        """Iterate over a user's teas in ID order, batch_size at a time"""
+        return self.backend.iter_teas(user_id, batch_size)
+
+    def get_collection_version(self, user_id):
+        """Get the tea count and latest update time that identify a version of a user's collection"""
+        return self.backend.collection_version(user_id)
+
+    def get_tea(self, user_id, tea_id, fields=None):
+        """Get a tea, or None"""
+        return self.backend.get_tea(user_id, tea_id, fields)
+
+    def get_existing_names(self, user_id, names):
+        """Get which of the names a user's teas already use"""
+        return self.backend.existing_names(user_id, names)
+
+    def create_tea(self, user_id, data):
         """Create a new tea"""
-        return self.tea_table.create_tea_item(tea_item)
+        return self.backend.create_tea(user_id, data)
 
-    def update_tea_item(self, name, tea_item):
+    def create_teas(self, user_id, teas):
+        """Create several new teas, getting each tea or the reason it was not created"""
+        return self.backend.create_teas(user_id, teas)
+
+    def update_tea(self, user_id, tea_id, changes):
         """Update a tea"""
-        return self.tea_table.update_tea_item(name, tea_item)
+        return self.backend.update_tea(user_id, tea_id, changes)
+
+    def delete_tea(self, user_id, tea_id):
+        """Delete a tea"""
+        return self.backend.delete_tea(user_id, tea_id)
 
-    def increment_steep_count(self, name):
+    def increment_steep_count(self, user_id, tea_id):
         """Increment steep count"""
-        return self.tea_table.increment_steep_count(name)
+        return self.backend.increment_steep_count(user_id, tea_id)
 
-    def clear_steep_count(self, name):
+    def increment_steep_counts(self, user_id, tea_ids):
+        """Increment the steep counts of several teas steeped in one session"""
+        return self.backend.increment_steep_counts(user_id, tea_ids)
+
+    def clear_steep_count(self, user_id, tea_id):
         """Clear steep count"""
-        return self.tea_table.clear_steep_count(name)
+        return self.backend.clear_steep_count(user_id, tea_id)
 
-    def delete_tea_item(self, name):
-        """Delete a tea"""
-        return self.tea_table.delete_tea_item(name)
+    def get_changes(self, user_id, teas_after=None, deleted_after=None, full_sync=False):
+        """Get the teas changed and deleted since a sync position"""
+        return self.backend.get_changes(user_id, teas_after, deleted_after, full_sync)
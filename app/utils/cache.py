@@ -0,0 +1,98 @@
+"""In-process caching utilities"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with a size bound and a per-entry TTL.
+
+    Keeps hit, miss and eviction counters so callers can report cache effectiveness.
+    """
+    def __init__(self, max_entries=1024, ttl=60, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Get a live entry, or default if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store an entry, evicting the least recently used one when full"""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove an entry if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get the cache counters"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries)
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class KeyVersions:
+    """
+    Version counters for cache keys, bumped when a key is invalidated.
+
+    A fill reads the version of its key before reading the source and stores what it read
+    only if the version is unchanged, so a fill racing an invalidation of the same key is
+    dropped while fills of other keys go ahead. Keys share a fixed number of counters by a
+    stable hash, which bounds memory however many keys are seen; two keys sharing a
+    counter only cost each other the occasional dropped fill. Callers hold their own lock around bump
+    and the compare-and-set that follows get.
+    """
+    def __init__(self, slots=4096):
+        self._counters = [0] * slots
+
+    def get(self, key):
+        """Get the current version of a key"""
+        return self._counters[self._slot(key)]
+
+    def bump(self, key):
+        """Change the version of a key"""
+        self._counters[self._slot(key)] += 1
+
+    def _slot(self, key):
+        return zlib.crc32(str(key).encode()) % len(self._counters)
@@ -1,7 +1,14 @@
 """Helper functions"""
 
+import base64
+import binascii
+import hashlib
+import json
 import re
+from collections.abc import Mapping
 from datetime import datetime
+from decimal import Decimal
+from boto3.dynamodb.types import Binary
 
 def format_date(date):
     if date is None:
@@ -16,22 +23,140 @@ def validate_email(email):
         return True
     return False
 
+def _serialize_number(value):
+    return {'N': str(value)}
+
+def _serialize_float(value):
+    if value != value or value in (float('inf'), float('-inf')):
+        raise ValueError(f'DynamoDB numbers must be finite, got {value!r}')
+    # repr is the shortest string that reads back as the same float
+    return {'N': repr(value)}
+
+def _serialize_decimal(value):
+    if not value.is_finite():
+        raise ValueError(f'DynamoDB numbers must be finite, got {value!r}')
+    return {'N': str(value)}
+
+def _serialize_set(value):
+    if not value:
+        raise ValueError('DynamoDB does not store empty sets')
+    members = iter(value)
+    first = type(next(members))
+    if first is str and all(type(member) is str for member in members):  # pylint: disable=unidiomatic-typecheck
+        return {'SS': list(value)}
+    if issubclass(first, (bytes, bytearray, Binary)):
+        return {'BS': [_serialize_value(member)['B'] for member in value]}
+    serialized = [_serialize_value(member) for member in value]
+    if all('N' in member for member in serialized):
+        return {'NS': [member['N'] for member in serialized]}
+    raise TypeError('DynamoDB sets must hold only strings, only numbers or only binary values')
+
+_SERIALIZERS = {
+    str: lambda value: {'S': value},
+    bool: lambda value: {'BOOL': value},
+    int: _serialize_number,
+    float: _serialize_float,
+    Decimal: _serialize_decimal,
+    type(None): lambda value: {'NULL': True},
+    bytes: lambda value: {'B': value},
+    bytearray: lambda value: {'B': bytes(value)},
+    Binary: lambda value: {'B': value.value},
+    list: lambda value: {'L': [_serialize_value(member) for member in value]},
+    tuple: lambda value: {'L': [_serialize_value(member) for member in value]},
+    dict: lambda value: {'M': {key: _serialize_value(member) for key, member in value.items()}},
+    set: _serialize_set,
+    frozenset: _serialize_set
+}
+# Checked in order for subclasses of the types above, e.g. OrderedDict or IntEnum
+_SERIALIZER_BASES = (bool, int, float, Decimal, str, bytes, bytearray, Binary, Mapping, set, frozenset, list, tuple)
+
+def _serialize_value(value):
+    serializer = _SERIALIZERS.get(type(value))
+    if serializer is None:
+        for base in _SERIALIZER_BASES:
+            if isinstance(value, base):
+                serializer = _SERIALIZERS[dict if base is Mapping else base]
+                _SERIALIZERS[type(value)] = serializer
+                break
+        else:
+            raise TypeError(f'Unsupported type for DynamoDB: {type(value).__name__}')
+    return serializer(value)
+
+def _deserialize_number(value):
+    if value.__class__ is not str:
+        return value
+    if '.' in value or 'e' in value or 'E' in value:
+        return Decimal(value)
+    return int(value)
+
+_DESERIALIZERS = {
+    'S': lambda value: value,
+    'N': _deserialize_number,
+    'BOOL': lambda value: value,
+    'NULL': lambda value: None,
+    'B': bytes,
+    'SS': set,
+    'NS': lambda value: {_deserialize_number(member) for member in value},
+    'BS': lambda value: {bytes(member) for member in value},
+    'L': lambda value: [_deserialize_value(member) for member in value],
+    'M': lambda value: {key: _deserialize_value(member) for key, member in value.items()}
+}
+
+def _deserialize_value(value):
+    try:
+        (tag, inner), = value.items()
+    except ValueError as error:
+        raise ValueError(f'A DynamoDB attribute value has exactly one type, got {list(value)}') from error
+    return _DESERIALIZERS[tag](inner)
+
+def serialize_dynamodb_value(value):
+    """Converts a Python value into a DynamoDB attribute value, e.g. 3 into {'N': '3'}"""
+    return _serialize_value(value)
+
+def deserialize_dynamodb_value(value):
+    """
+    Converts a DynamoDB attribute value into a Python value.
+
+    Integral numbers become int and other numbers Decimal, so that no precision is lost.
+    """
+    return _deserialize_value(value)
+
 def transform_dict_to_dynamodb_item(item):
     """Transforms a simple dictionary into a DynamoDB item"""
-    transformed_item = {}
-    for key, value in item.items():
-        if isinstance(value, str):
-            transformed_item[key] = {"S": value}
-        elif isinstance(value, int):
-            transformed_item[key] = {"N": str(value)}
-    return transformed_item
+    serialize = _serialize_value
+    return {key: serialize(value) for key, value in item.items()}
 
 def transform_dynamodb_item_to_dict(item):
     """Transforms a DynamoDB item into a simple dictionary"""
-    transformed_item = {}
-    for key, value in item.items():
-        if "S" in value:
-            transformed_item[key] = value["S"]
-        elif "N" in value:
-            transformed_item[key] = int(value["N"])
-    return transformed_item
+    deserialize = _deserialize_value
+    return {key: deserialize(value) for key, value in item.items()}
+
+def transform_dicts_to_dynamodb_items(items):
+    """Transforms a batch of simple dictionaries into DynamoDB items"""
+    serialize = _serialize_value
+    return [{key: serialize(value) for key, value in item.items()} for item in items]
+
+def transform_dynamodb_items_to_dicts(items):
+    """Transforms a batch of DynamoDB items, e.g. a query page, into simple dictionaries"""
+    deserialize = _deserialize_value
+    return [{key: deserialize(value) for key, value in item.items()} for item in items]
+
+def encode_cursor(position):
+    """Encodes a keyset position (a dict of column values) as an opaque cursor token"""
+    raw = json.dumps(position, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decodes a cursor token produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(position, dict):
+        raise ValueError('Invalid cursor')
+    return position
+
+def make_etag(*parts):
+    """Builds a strong entity tag from the values that identify one version of a resource"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
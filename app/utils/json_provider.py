@@ -0,0 +1,70 @@
+"""JSON encoding and decoding for responses and request bodies, backed by orjson when installed"""
+from datetime import date
+from operator import itemgetter
+from flask import current_app, has_app_context
+from flask.json import JSONEncoder, JSONDecoder
+from app.models.tea import Tea
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+_tea_values = itemgetter(*Tea.SERIALIZABLE_FIELDS)
+
+
+def orjson_enabled():
+    """Check whether orjson is installed and selected by JSON_PROVIDER"""
+    if orjson is None:
+        return False
+    return not has_app_context() or current_app.config.get('JSON_PROVIDER', 'orjson') == 'orjson'
+
+
+class AppJSONEncoder(JSONEncoder):
+    """
+    Encoder used by jsonify and flask.json.dumps.
+
+    Compact output is produced by orjson; pretty-printed output and the 'stdlib' provider
+    use the standard library encoder. Both render dates as ISO 8601 and accept Tea rows
+    directly, in the same shape as Tea.to_dict().
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Resolved once per dumps() call rather than once per encoded row
+        self.use_orjson = orjson_enabled()
+
+    def encode(self, o):
+        if self.indent is not None or not self.use_orjson:
+            return super().encode(o)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(o, default=self.default, option=option).decode('utf-8')
+
+    def default(self, o):
+        if isinstance(o, Tea):
+            if self.use_orjson:
+                # Fast path: read the loaded column values straight from the instance state,
+                # skipping the attribute instrumentation, and let orjson format the datetimes
+                try:
+                    return dict(zip(Tea.SERIALIZABLE_FIELDS, _tea_values(o.__dict__)))
+                except KeyError:  # expired or deferred columns, load them through the attributes
+                    return {field: getattr(o, field) for field in Tea.SERIALIZABLE_FIELDS}
+            return o.to_dict()
+        if isinstance(o, date):
+            return o.isoformat()
+        return super().default(o)
+
+
+class AppJSONDecoder(JSONDecoder):
+    """Decoder used by request.get_json and flask.json.loads"""
+    def decode(self, s, *args, **kwargs):  # pylint: disable=arguments-differ
+        if not orjson_enabled():
+            return super().decode(s, *args, **kwargs)
+        return orjson.loads(s)
+
+
+def init_json(app):
+    """Make the app encode and decode JSON through the application encoder and decoder"""
+    app.json_encoder = AppJSONEncoder
+    app.json_decoder = AppJSONDecoder
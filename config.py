@@ -18,6 +18,92 @@ class Config:
     SQLALCHEMY_POOL_TIMEOUT = DBConfig.SQLALCHEMY_POOL_TIMEOUT
     SQLALCHEMY_ENGINE_OPTIONS = DBConfig.SQLALCHEMY_ENGINE_OPTIONS
 
+    # DynamoDB configuration, for TEA_BACKEND = 'dynamodb'
+    AWS_REGION = DBConfig.AWS_REGION
+    DYNAMODB_ENDPOINT = DBConfig.DYNAMODB_ENDPOINT
+    DYNAMODB_TABLE_NAME = DBConfig.DYNAMODB_TABLE_NAME
+    DYNAMODB_MAX_POOL_CONNECTIONS = DBConfig.DYNAMODB_MAX_POOL_CONNECTIONS
+    DYNAMODB_CONNECT_TIMEOUT = DBConfig.DYNAMODB_CONNECT_TIMEOUT
+    DATABASE_TIMEOUT = DBConfig.DATABASE_TIMEOUT
+    DATABASE_MAX_RETRIES = DBConfig.DATABASE_MAX_RETRIES
+
+    # Tea list pagination: GET /teas stays unpaginated unless a client sends
+    # cursor/limit, or TEA_LIST_PAGINATED switches the default over
+    TEA_LIST_PAGINATED = os.getenv('TEA_LIST_PAGINATED', 'False').lower() == 'true'
+    TEA_PAGE_SIZE_DEFAULT = 50
+    TEA_PAGE_SIZE_MAX = 200
+    # Rows fetched per server-side cursor batch by GET /teas/export
+    TEA_EXPORT_BATCH_SIZE = 500
+    # Maximum number of teas accepted by POST /teas/batch
+    TEA_BATCH_MAX_SIZE = 500
+    # Days deletion tombstones are kept for GET /teas/changes; older sync tokens
+    # get a full sync. Compacted by `flask compact-tombstones`
+    TEA_TOMBSTONE_RETENTION_DAYS = int(os.getenv('TEA_TOMBSTONE_RETENTION_DAYS', '30'))
+    # Seconds GET /teas/changes holds sync tokens back from the present, so teas
+    # that commit after a sync with an earlier updated_at are not skipped
+    TEA_SYNC_SAFETY_WINDOW_SECONDS = 30
+
+    # Where teas are stored: 'sql' (SQLALCHEMY_DATABASE_URI), 'dynamodb' (DYNAMODB_TABLE_NAME)
+    # or 'memory' (per process, durable with TEA_MEMORY_DATA_DIR)
+    TEA_BACKEND = os.getenv('TEA_BACKEND', 'sql')
+
+    # Write-behind steep counts: increments are coalesced per tea and flushed
+    # every STEEP_FLUSH_INTERVAL_MS or once STEEP_FLUSH_MAX_PENDING are waiting
+    STEEP_WRITE_BEHIND = os.getenv('STEEP_WRITE_BEHIND', 'False').lower() == 'true'
+    STEEP_FLUSH_INTERVAL_MS = 500
+    STEEP_FLUSH_MAX_PENDING = 100
+
+    # Per-user tea collection cache: None (off), 'memory' (per worker LRU)
+    # or 'redis' (shared by all workers, needs TEA_CACHE_REDIS_URL)
+    TEA_CACHE_BACKEND = os.getenv('TEA_CACHE_BACKEND')
+    TEA_CACHE_MAX_ENTRIES = 1024
+    TEA_CACHE_TTL_SECONDS = 60
+    TEA_CACHE_REDIS_URL = os.getenv('TEA_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    # Read-through cache in front of the DynamoDB TeaDao, per process
+    TEA_DAO_CACHE_ENABLED = os.getenv('TEA_DAO_CACHE_ENABLED', 'False').lower() == 'true'
+    TEA_DAO_CACHE_MAX_ENTRIES = 10000
+    TEA_DAO_CACHE_TTL_SECONDS = 30
+
+    # Durability for the in-memory tea store: journal and snapshots in this directory,
+    # unset to keep teas in memory only. One process per directory.
+    TEA_MEMORY_DATA_DIR = os.getenv('TEA_MEMORY_DATA_DIR')
+    TEA_MEMORY_FSYNC_INTERVAL_MS = 50
+    TEA_MEMORY_SNAPSHOT_EVERY = 10000
+
+    # Prometheus request and cache metrics at METRICS_PATH. The endpoint is not
+    # authenticated, only enable it where the path is not reachable from outside.
+    # Under gunicorn, set the PROMETHEUS_MULTIPROC_DIR environment variable so all
+    # workers are aggregated
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+    METRICS_PATH = '/metrics'
+
+    # SQL statements and database time per request, reported in the Server-Timing
+    # header. More statements than the budget (SQL_QUERY_BUDGETS by endpoint name,
+    # else SQL_QUERY_BUDGET) logs a warning
+    SQL_QUERY_TRACKING = os.getenv('SQL_QUERY_TRACKING', 'True').lower() == 'true'
+    SQL_QUERY_BUDGET = 10
+    SQL_QUERY_BUDGETS = {}
+
+    # Cache of user identities consulted by the Flask-Login user loader
+    USER_CACHE_ENABLED = True
+    USER_CACHE_MAX_ENTRIES = 10000
+    USER_CACHE_TTL_SECONDS = 60
+
+    # Password hashing: werkzeug method and salt length, stored hashes are
+    # upgraded on login when these change. A pool size > 0 moves hashing into a
+    # process pool that queues at most PASSWORD_HASH_MAX_PENDING jobs
+    # (default 4 per process) before answering 503 with Retry-After
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    PASSWORD_HASH_SALT_LENGTH = 16
+    PASSWORD_HASH_POOL_SIZE = int(os.getenv('PASSWORD_HASH_POOL_SIZE', '0'))
+    PASSWORD_HASH_MAX_PENDING = None
+    PASSWORD_HASH_RETRY_AFTER = 1
+
+    # JSON encoding for responses and request bodies: 'orjson' (falls back to
+    # the standard library when orjson is not installed) or 'stdlib'
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=31)
     SESSION_COOKIE_SECURE = True
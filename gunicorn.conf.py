@@ -0,0 +1,18 @@
+"""Gunicorn settings, read automatically from the working directory"""
+import os
+import shutil
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    """Clear metric files left by a previous run before the workers start writing theirs"""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    """Drop the live gauges of a worker that has exited"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess  # pylint: disable=import-outside-toplevel
+        multiprocess.mark_process_dead(worker.pid)
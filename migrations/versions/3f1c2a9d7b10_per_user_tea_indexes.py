@@ -0,0 +1,47 @@
+"""Replace the global unique tea name with per-user indexes
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Gives SQLite's unnamed UNIQUE(name) constraint a name batch mode can drop it by
+NAMING_CONVENTION = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def upgrade():
+    # Tables are created by db.create_all(), so they may already have the new schema
+    inspector = sa.inspect(op.get_bind())
+    index_names = {index['name'] for index in inspector.get_indexes('teas')}
+    name_constraints = [
+        constraint['name'] or 'uq_teas_name'
+        for constraint in inspector.get_unique_constraints('teas')
+        if constraint['column_names'] == ['name']
+    ]
+
+    if name_constraints:
+        with op.batch_alter_table('teas', naming_convention=NAMING_CONVENTION) as batch_op:
+            for constraint_name in name_constraints:
+                batch_op.drop_constraint(constraint_name, type_='unique')
+
+    if 'ix_teas_user_id_name' not in index_names:
+        op.create_index('ix_teas_user_id_name', 'teas', ['user_id', 'name'], unique=True)
+    if 'ix_teas_user_id_updated_at' not in index_names:
+        op.create_index('ix_teas_user_id_updated_at', 'teas', ['user_id', 'updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_teas_user_id_updated_at', table_name='teas')
+    op.drop_index('ix_teas_user_id_name', table_name='teas')
+    with op.batch_alter_table('teas', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.create_unique_constraint('uq_teas_name', ['name'])
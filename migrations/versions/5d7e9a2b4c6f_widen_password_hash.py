@@ -0,0 +1,40 @@
+"""Widen users.password_hash for configurable hash methods and salt lengths
+
+Revision ID: 5d7e9a2b4c6f
+Revises: 8b2e4f6a1c3d
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7e9a2b4c6f'
+down_revision = '8b2e4f6a1c3d'
+branch_labels = None
+depends_on = None
+
+
+def password_hash_length():
+    """Get the length of the users.password_hash column, or None if there is no such column"""
+    for column in sa.inspect(op.get_bind()).get_columns('users'):
+        if column['name'] == 'password_hash':
+            return column['type'].length
+    return None
+
+
+def upgrade():
+    # Tables are created by db.create_all(), so the column may already be wide enough
+    length = password_hash_length()
+    if length is None or length >= 255:
+        return
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', type_=sa.String(255), existing_type=sa.String(128))
+
+
+def downgrade():
+    if password_hash_length() is None:
+        return
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('password_hash', type_=sa.String(128), existing_type=sa.String(255))
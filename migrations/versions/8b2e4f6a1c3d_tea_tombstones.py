@@ -0,0 +1,37 @@
+"""Add tea tombstones for delta sync
+
+Revision ID: 8b2e4f6a1c3d
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f6a1c3d'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables are created by db.create_all(), so this one may already exist
+    if sa.inspect(op.get_bind()).has_table('tea_tombstones'):
+        return
+    op.create_table(
+        'tea_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tea_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tea_tombstones_user_id_deleted_at', 'tea_tombstones', ['user_id', 'deleted_at'])
+
+
+def downgrade():
+    op.drop_index('ix_tea_tombstones_user_id_deleted_at', table_name='tea_tombstones')
+    op.drop_table('tea_tombstones')
@@ -0,0 +1,89 @@
+"""
+Benchmark concurrent DynamoDB reads through a shared TeaDao.
+
+Threads issue get_item calls through one DAO, first the way TeaDao used to work (a new
+Table handle per call on a client with botocore's defaults: 10 pooled connections,
+legacy retries) and then with the cached handle and the tuned client.
+
+Runs against DynamoDB Local (or any endpoint) when an endpoint URL is given, otherwise
+against moto in-process, where there are no HTTP connections and only the client-side
+overhead is measured.
+
+Usage: python -m scripts.benchmarks.bench_dynamodb [threads] [requests_per_thread] [endpoint_url]
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from botocore.config import Config
+
+from app.dao.provisioning import create_tea_table
+from app.dao.tea_dao import TeaDao, build_client_config
+
+USER_ID = 'bench'
+
+
+def create_table(dao):
+    """Create a scratch table with a handful of teas and return their ids"""
+    create_tea_table(dao.dynamodb, dao.table_name)
+    outcomes = dao.batch_create_tea_items(USER_ID, [{'Name': f'Tea {i}', 'Type': 'Green'} for i in range(20)])
+    return [outcome['item']['tea_id'] for outcome in outcomes]
+
+
+def run(get_item, tea_ids, threads, requests_per_thread):
+    """Get the requests per second achieved by threads calling get_item concurrently"""
+    barrier = threading.Barrier(threads)
+
+    def worker(offset):
+        barrier.wait()
+        for i in range(requests_per_thread):
+            get_item(tea_ids[(offset + i) % len(tea_ids)])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return threads * requests_per_thread / (time.perf_counter() - start)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    requests_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    endpoint_url = sys.argv[3] if len(sys.argv) > 3 else None
+
+    if endpoint_url is None:
+        from moto import mock_dynamodb  # pylint: disable=import-outside-toplevel
+        for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+            os.environ.setdefault(name, 'testing')
+        context = mock_dynamodb()
+    else:
+        context = nullcontext()
+
+    with context:
+        table_name = f'bench-{uuid.uuid4().hex[:8]}'
+        previous = TeaDao('us-east-1', table_name, config=Config(), endpoint_url=endpoint_url)
+        tuned = TeaDao('us-east-1', table_name, config=build_client_config({}), endpoint_url=endpoint_url)
+        tea_ids = create_table(tuned)
+        try:
+            def previous_get_item(tea_id):
+                previous.dynamodb.Table(table_name).get_item(Key={'user_id': USER_ID, 'tea_id': tea_id})
+
+            results = {
+                'new Table per call, default client': run(previous_get_item, tea_ids, threads,
+                                                          requests_per_thread),
+                'cached Table, tuned client': run(lambda tea_id: tuned.get_tea_item(USER_ID, tea_id), tea_ids,
+                                                  threads, requests_per_thread)
+            }
+        finally:
+            tuned.get_table().delete()
+
+    print(f"{threads} threads x {requests_per_thread} get_item calls against {endpoint_url or 'moto in-process'}")
+    for label, throughput in results.items():
+        print(f"{label:>36}: {throughput:8.1f} requests/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark converting DynamoDB pages between attribute values and Python values.
+
+Compares boto3's TypeSerializer/TypeDeserializer, applied per attribute the way the
+resource layer does it, against the batch helpers in app.utils.helpers, for flat tea
+items and for items with nested lists, maps and sets.
+
+Usage: python -m scripts.benchmarks.bench_dynamodb_types [items_per_page] [iterations]
+"""
+import sys
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from app.utils.helpers import transform_dicts_to_dynamodb_items, transform_dynamodb_items_to_dicts
+
+
+def build_items(count, nested):
+    """Build count tea items, optionally with nested attributes"""
+    items = []
+    for i in range(count):
+        item = {'user_id': 'bench', 'tea_id': f'tea-{i}', 'Name': f'Tea {i}', 'Type': 'Green',
+                'SteepTimeSeconds': 120, 'SteepTemperatureFahrenheit': 175, 'SteepCount': i % 7}
+        if nested:
+            item.update({
+                'Rating': Decimal('4.5'),
+                'Caffeinated': True,
+                'Tags': {'green', 'japanese', 'spring'},
+                'Steeps': [{'seconds': 60 + j * 15, 'temperature': 175} for j in range(3)],
+                'Origin': {'country': 'Japan', 'region': 'Shizuoka', 'altitude': 300}
+            })
+        items.append(item)
+    return items
+
+
+def time_call(function, argument, iterations):
+    """Get the mean time in microseconds of function(argument)"""
+    function(argument)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+
+    def boto3_serialize(items):
+        return [{key: serializer.serialize(value) for key, value in item.items()} for item in items]
+
+    def boto3_deserialize(items):
+        return [{key: deserializer.deserialize(value) for key, value in item.items()} for item in items]
+
+    print(f"{count} items per page, mean of {iterations} iterations")
+    for label, nested in (('flat', False), ('nested', True)):
+        items = build_items(count, nested)
+        dynamodb_items = boto3_serialize(items)
+        assert transform_dicts_to_dynamodb_items(items) == dynamodb_items
+        assert transform_dynamodb_items_to_dicts(dynamodb_items) == boto3_deserialize(dynamodb_items)
+        for direction, boto3_function, helper, argument in (
+                ('serialize', boto3_serialize, transform_dicts_to_dynamodb_items, items),
+                ('deserialize', boto3_deserialize, transform_dynamodb_items_to_dicts, dynamodb_items)):
+            baseline = time_call(boto3_function, argument, iterations)
+            optimized = time_call(helper, argument, iterations)
+            print(f"{label:>6} {direction:>11}: boto3 {baseline:9.1f} us, helpers {optimized:9.1f} us "
+                  f"({baseline / optimized:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
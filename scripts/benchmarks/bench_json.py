@@ -0,0 +1,85 @@
+"""
+Benchmark encoding a tea list response.
+
+Compares the previous path (jsonify over Tea.to_dict() with Flask's stdlib encoder)
+against jsonify over Tea rows with the stdlib and orjson providers, and over the dicts
+the SQL tea backend builds from result rows, with and without formatting the datetimes.
+
+Usage: python -m scripts.benchmarks.bench_json [teas] [iterations]
+"""
+import sys
+import time
+
+from flask import jsonify
+from flask.json import JSONEncoder
+
+from app import create_app
+from app.extensions import db
+from app.models.tea import Tea
+from app.models.user import User
+from app.services.tea_backends import SqlTeaBackend, row_to_tea
+
+
+def build_app(count):
+    """Create an app with one user owning count teas"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'SECRET_KEY': 'benchmark-secret-key-NOT-FOR-PRODUCTION'
+    })
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add_all([
+            Tea(name=f'Tea {i}', tea_type='Green', steep_time=120, steep_temperature=80,
+                notes='Benchmark tea with a short tasting note', user_id=user.id, steep_count=i % 7)
+            for i in range(count)
+        ])
+        db.session.commit()
+    return app
+
+
+def time_encoding(teas, build_body, iterations):
+    """Get the mean time in microseconds to build a response body"""
+    build_body(teas)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build_body(teas)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    app = build_app(count)
+
+    with app.test_request_context():
+        teas = Tea.query.all()
+        results = {}
+
+        app_encoder, app.json_encoder = app.json_encoder, JSONEncoder
+        results['previous (to_dict + stdlib)'] = time_encoding(
+            teas, lambda rows: jsonify([tea.to_dict() for tea in rows]).get_data(), iterations)
+        app.json_encoder = app_encoder
+
+        app.config['JSON_PROVIDER'] = 'stdlib'
+        results['Tea rows + stdlib'] = time_encoding(teas, lambda rows: jsonify(rows).get_data(), iterations)
+
+        app.config['JSON_PROVIDER'] = 'orjson'
+        results['Tea rows + orjson'] = time_encoding(teas, lambda rows: jsonify(rows).get_data(), iterations)
+
+        rows = db.session.execute(SqlTeaBackend.select_teas(teas[0].user_id)).all()
+        results['Tea.serialize + orjson'] = time_encoding(
+            rows, lambda rows: jsonify([Tea.serialize(row) for row in rows]).get_data(), iterations)
+        results['row_to_tea + orjson'] = time_encoding(
+            rows, lambda rows: jsonify([row_to_tea(row) for row in rows]).get_data(), iterations)
+
+    baseline = results['previous (to_dict + stdlib)']
+    print(f"{count} teas, {iterations} iterations")
+    for label, elapsed in results.items():
+        print(f"{label:>28}: {elapsed:9.1f} us/response ({baseline / elapsed:4.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark login throughput with inline and process-pool password hashing.
+
+Concurrent clients log in repeatedly while a probe thread times GET /health to show
+how much a login storm slows unrelated requests. Each mode is run against its own
+file-backed SQLite database.
+
+Usage: python -m scripts.benchmarks.bench_login [threads] [logins_per_thread] [pool_size]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app import create_app
+from app.extensions import db
+from app.models.user import User
+
+PASSWORD = 'benchmark-password'
+
+
+def build_app(database_uri, pool_size):
+    """Create an app with a benchmark user"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SECRET_KEY': 'benchmark-secret-key-NOT-FOR-PRODUCTION',
+        'PASSWORD_HASH_POOL_SIZE': pool_size,
+        # Generous queue so the benchmark measures throughput rather than shedding
+        'PASSWORD_HASH_MAX_PENDING': 1024
+    })
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com')
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def run(app, threads, logins_per_thread):
+    """Get logins per second and the median /health latency in ms during the storm"""
+    stop = threading.Event()
+    probe_latencies = []
+
+    def login_worker():
+        for _ in range(logins_per_thread):
+            client = app.test_client()
+            response = client.post('/auth/login', json={'username': 'bench', 'password': PASSWORD})
+            assert response.status_code == 200, response.status_code
+
+    def probe():
+        client = app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get('/health')
+            probe_latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=login_worker) for _ in range(threads)]
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    app.extensions['password_hasher'].shutdown()
+    return threads * logins_per_thread / elapsed, statistics.median(probe_latencies)
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    logins_per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    pool_size = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 1)
+
+    print(f"{threads} threads x {logins_per_thread} logins, pool size {pool_size}, {os.cpu_count()} CPUs")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, size in (('inline', 0), ('process pool', pool_size)):
+            app = build_app(f'sqlite:///{Path(tmp) / f"bench_{size}.db"}', size)
+            throughput, probe_ms = run(app, threads, logins_per_thread)
+            print(f"{label:>13}: {throughput:6.1f} logins/s, median /health latency {probe_ms:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark MemoryTeaDao throughput under threaded workers.
+
+Each thread works for its own user with a mix of 70% item reads, 10% type queries,
+10% steep count increments and 10% create/delete pairs, at increasing thread counts.
+With one lock per user partition, threads only serialize on the GIL, so throughput
+should hold steady as threads are added rather than collapse under lock contention.
+
+Usage: python -m scripts.benchmarks.bench_memory_tea_dao [operations_per_thread] [teas_per_user]
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.dao.memory_tea_dao import MemoryTeaDao
+
+TYPES = ('Green', 'Black', 'Oolong', 'White')
+
+
+def seed(dao, users, teas_per_user):
+    """Create teas for each user and return their ids by user"""
+    tea_ids = {}
+    for user in users:
+        outcomes = dao.batch_create_tea_items(user, [
+            {'Name': f'Tea {i}', 'Type': TYPES[i % len(TYPES)]} for i in range(teas_per_user)])
+        tea_ids[user] = [outcome['item']['tea_id'] for outcome in outcomes]
+    return tea_ids
+
+
+def run(dao, tea_ids, threads, operations_per_thread):
+    """Get the operations per second achieved by threads working concurrently"""
+    barrier = threading.Barrier(threads)
+
+    def worker(number):
+        user = f'user-{number}'
+        ids = tea_ids[user]
+        barrier.wait()
+        for i in range(operations_per_thread):
+            tea_id = ids[i % len(ids)]
+            kind = i % 10
+            if kind < 7:
+                dao.get_tea_item(user, tea_id)
+            elif kind == 7:
+                dao.query_by_type(user, TYPES[i % len(TYPES)], page_size=20)
+            elif kind == 8:
+                dao.increment_steep_count(user, tea_id)
+            else:
+                created = dao.create_tea_item(user, {'Name': 'Scratch', 'Type': 'Green'})
+                dao.delete_tea_item(user, created['tea_id'])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return threads * operations_per_thread / (time.perf_counter() - start)
+
+
+def main():
+    operations_per_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    teas_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"{operations_per_thread} operations per thread, {teas_per_user} teas per user")
+    for threads in (1, 2, 4, 8, 16):
+        dao = MemoryTeaDao()
+        tea_ids = seed(dao, [f'user-{number}' for number in range(threads)], teas_per_user)
+        throughput = run(dao, tea_ids, threads, operations_per_thread)
+        print(f"{threads:>3} threads: {throughput:10.0f} operations/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark the cost of MemoryTeaDao durability and the time it takes to recover.
+
+Measures write throughput without a journal, with batched fsync and with an fsync per
+write, then the recovery time from the journal alone and from a snapshot.
+
+Usage: python -m scripts.benchmarks.bench_tea_journal [writes] [data_dir]
+"""
+import shutil
+import sys
+import tempfile
+import time
+
+from app.dao.memory_tea_dao import MemoryTeaDao
+from app.dao.tea_journal import TeaJournal
+
+USERS = 50
+
+
+def write(dao, writes):
+    """Get the writes per second of creating teas and steeping them"""
+    tea_ids = []
+    start = time.perf_counter()
+    for i in range(writes):
+        user = f'user-{i % USERS}'
+        if i % 2 == 0:
+            tea_ids.append((user, dao.create_tea_item(user, {'Name': f'Tea {i}', 'Type': 'Green'})['tea_id']))
+        else:
+            dao.increment_steep_count(*tea_ids[-1])
+    return writes / (time.perf_counter() - start)
+
+
+def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp(prefix='tea-journal-')
+
+    try:
+        throughput = {'memory only': write(MemoryTeaDao(), writes)}
+        for label, interval_ms, count in (('journal, fsync every 50 ms', 50, writes),
+                                          ('journal, fsync every write', 0, min(writes, 2000))):
+            shutil.rmtree(data_dir, ignore_errors=True)
+            dao = MemoryTeaDao(journal=TeaJournal(data_dir, fsync_interval_ms=interval_ms,
+                                                  snapshot_every=writes * 10))
+            throughput[label] = write(dao, count)
+            dao.close()
+
+        shutil.rmtree(data_dir, ignore_errors=True)
+        dao = MemoryTeaDao(journal=TeaJournal(data_dir, snapshot_every=writes * 10))
+        write(dao, writes)
+        dao.close()
+        journal_recovery = MemoryTeaDao(journal=TeaJournal(data_dir)).journal
+        journal_recovery.close()
+
+        dao = MemoryTeaDao(journal=TeaJournal(data_dir, snapshot_every=writes * 10))
+        dao.snapshot()
+        dao.close()
+        snapshot_recovery = MemoryTeaDao(journal=TeaJournal(data_dir)).journal
+        snapshot_recovery.close()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"{writes} writes across {USERS} users")
+    for label, value in throughput.items():
+        print(f"{label:>28}: {value:10.0f} writes/s")
+    for label, journal in (('recovery from journal', journal_recovery),
+                           ('recovery from snapshot', snapshot_recovery)):
+        recovery = journal.recovery
+        print(f"{label:>28}: {recovery['seconds'] * 1000:10.1f} ms "
+              f"({recovery['snapshot_items']} snapshot items, {recovery['journal_entries']} journal entries)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark the per-request cost of loading the logged-in user.
+
+Runs authenticated GET /auth/profile requests against a file-backed SQLite database,
+once with the user identity cache disabled and once with it enabled.
+
+Usage: python -m scripts.benchmarks.bench_user_loader [requests]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app import create_app
+from app.extensions import db
+from app.models.user import User
+
+
+def build_client(database_uri, cache_enabled):
+    """Create an app and a test client logged in as a benchmark user"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SECRET_KEY': 'benchmark-secret-key-NOT-FOR-PRODUCTION',
+        'USER_CACHE_ENABLED': cache_enabled
+    })
+    with app.app_context():
+        user = User.query.filter_by(username='bench').first()
+        if user is None:
+            user = User(username='bench', email='bench@example.com')
+            db.session.add(user)
+            db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def time_requests(client, count):
+    """Get the mean latency in microseconds of count profile requests"""
+    client.get('/auth/profile')  # warm up
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get('/auth/profile')
+        assert response.status_code == 200
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = f'sqlite:///{Path(tmp) / "bench.db"}'
+        uncached = time_requests(build_client(database_uri, cache_enabled=False), count)
+        cached = time_requests(build_client(database_uri, cache_enabled=True), count)
+
+    print(f"requests per run:     {count}")
+    print(f"user loader uncached: {uncached:8.1f} us/request")
+    print(f"user loader cached:   {cached:8.1f} us/request")
+    print(f"saved per request:    {uncached - cached:8.1f} us ({(uncached - cached) / uncached:.0%})")
+
+
+if __name__ == '__main__':
+    main()
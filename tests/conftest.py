@@ -1,5 +1,7 @@
 """Pytest configuration file."""
+from contextlib import contextmanager
 import pytest
+from sqlalchemy import event
 from app import create_app
 from app.extensions import db
 
@@ -35,3 +37,32 @@ def test_db(test_app):  # pylint: disable=redefined-outer-name
         yield db
         db.session.remove()
         db.drop_all()
+
+
+class QueryCounter:
+    """Records the SQL statements sent to the test database."""
+    def __init__(self):
+        self.statements = []
+
+    def record(self, conn, cursor, statement, *args):  # pylint: disable=unused-argument
+        """before_cursor_execute listener."""
+        self.statements.append(statement)
+
+    @contextmanager
+    def expect(self, count):
+        """Assert that the block sends exactly count statements."""
+        start = len(self.statements)
+        yield
+        ran = self.statements[start:]
+        assert len(ran) == count, f"Expected {count} queries, ran {len(ran)}:\n" + "\n".join(ran)
+
+@pytest.fixture
+def query_counter(test_app):  # pylint: disable=redefined-outer-name
+    """Count the SQL statements tests send, to pin the query cost of each endpoint."""
+    # No app context is held open, so each request starts from an empty session and g as in production
+    with test_app.app_context():
+        engine = db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter.record)
+    yield counter
+    event.remove(engine, 'before_cursor_execute', counter.record)
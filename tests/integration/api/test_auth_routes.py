@@ -159,3 +159,58 @@ def test_profile(auth_client):
     assert json_data['username'] == data['username']
     assert json_data['email'] == data['email']
     assert 'created_at' in json_data
+
+def test_logout_invalidates_cached_user(test_app, auth_client):
+    """Test that logging out drops the cached user identity"""
+    data = {
+        'username': 'testuser',
+        'email': 'test@example.com',
+        'password': 'password123'
+    }
+    auth_client.post('/auth/register', json=data)
+    auth_client.post('/auth/login', json=data)
+
+    user_cache = test_app.extensions['user_cache']
+    user = User.query.filter_by(username=data['username']).first()
+    assert user_cache.get_or_load(user.id).username == data['username']
+    assert user_cache.stats()['size'] == 1
+    auth_client.post('/auth/logout')
+    assert user_cache.stats()['size'] == 0
+
+def test_login_rehashes_outdated_password(test_app, auth_client):
+    """Test that logging in upgrades a hash made with old cost parameters"""
+    hasher = test_app.extensions['password_hasher']
+    hasher.method = 'pbkdf2:sha256:1000'
+    data = {
+        'username': 'testuser',
+        'email': 'test@example.com',
+        'password': 'password123'
+    }
+    auth_client.post('/auth/register', json=data)
+    old_hash = User.query.filter_by(username='testuser').first().password_hash
+    assert old_hash.startswith('pbkdf2:sha256:1000$')
+
+    hasher.method = 'pbkdf2:sha256:2000'
+    response = auth_client.post('/auth/login', json=data)
+    assert response.status_code == 200
+    user = User.query.filter_by(username='testuser').first()
+    assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+    assert user.check_password(data['password'])
+
+def test_register_hasher_saturated(test_app, auth_client):
+    """Test that a full hashing queue answers 503 with Retry-After"""
+    hasher = test_app.extensions['password_hasher']
+    hasher.pool_size = 1
+    hasher.max_pending = 1
+    hasher.retry_after = 2
+    hasher._configure_slots()
+    hasher._slots.acquire()
+
+    response = auth_client.post('/auth/register', json={
+        'username': 'testuser',
+        'email': 'test@example.com',
+        'password': 'password123'
+    })
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
+    assert User.query.filter_by(username='testuser').first() is None
@@ -0,0 +1,135 @@
+"""Tests for the request metrics and the /metrics endpoint"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from prometheus_client import CollectorRegistry, multiprocess
+from prometheus_client.parser import text_string_to_metric_families
+from app import create_app
+from app.dao.cached_tea_dao import CachedTeaDao
+from app.extensions import db
+from app.dao.memory_tea_dao import MemoryTeaDao
+from app.services.tea_backends import ItemTeaBackend
+from app.services.tea_service import TeaService
+from tests.conftest import get_test_config
+
+@pytest.fixture
+def test_app():
+    """Create an application with metrics switched on."""
+    return create_app(dict(get_test_config(), METRICS_ENABLED=True))
+
+def scrape(client):
+    """Fetch /metrics and index the samples by name and labels"""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.get_data(as_text=True))
+        for sample in family.samples
+    }
+
+def labels(**kwargs):
+    """Build the sorted label tuple scrape() keys samples by"""
+    return tuple(sorted(kwargs.items()))
+
+def test_requests_are_counted_by_route(test_client, test_db):  # pylint: disable=unused-argument
+    """Test that requests are labelled by route template and status"""
+    test_client.get('/health')
+    test_client.get('/health')
+    test_client.get('/no-such-page')
+    samples = scrape(test_client)
+
+    health = labels(method='GET', endpoint='/health')
+    assert samples[('http_requests_total', health + (('status', '200'),))] == 2
+    assert samples[('http_request_duration_seconds_count', health)] == 2
+    assert samples[('http_requests_in_progress', health)] == 0
+    assert samples[('http_requests_total', labels(method='GET', endpoint='unmatched', status='404'))] == 1
+    # Scrapes are not instrumented themselves
+    assert not any(dict(key).get('endpoint') == '/metrics' for _, key in samples)
+
+def test_database_time_is_recorded(test_client, test_db):  # pylint: disable=unused-argument
+    """Test that SQL run by a request is attributed to its route"""
+    test_client.post('/auth/register', json={
+        'username': 'testuser', 'email': 'test@example.com', 'password': 'password123'
+    })
+    test_client.get('/health')
+    samples = scrape(test_client)
+
+    register = labels(method='POST', endpoint='/auth/register')
+    assert samples[('http_request_db_seconds_count', register)] == 1
+    assert samples[('http_request_db_seconds_sum', register)] > 0
+    assert samples[('http_request_db_seconds_sum', labels(method='GET', endpoint='/health'))] == 0
+
+def test_metrics_disabled():
+    """Test that the unauthenticated endpoint is not served unless metrics are switched on"""
+    app = create_app(get_test_config())
+    assert app.test_client().get('/metrics').status_code == 404
+
+def test_cache_hits_and_misses():
+    """Test that the caches' own hit and miss counts are exported by cache"""
+    app = create_app(dict(get_test_config(), METRICS_ENABLED=True, TEA_CACHE_BACKEND='memory'))
+    tea_dao = CachedTeaDao(MemoryTeaDao())
+    app.extensions['tea_service'] = TeaService(ItemTeaBackend(tea_dao, name='memory'))
+    client = app.test_client()
+    with app.app_context():
+        db.create_all()
+        client.post('/auth/register', json={
+            'username': 'testuser', 'email': 'test@example.com', 'password': 'password123'
+        })
+        client.post('/auth/login', json={'username': 'testuser', 'password': 'password123'})
+        tea = client.post('/teas', json={
+            'name': 'Sencha', 'type': 'green', 'steep_time': 90, 'steep_temperature': 75
+        }).get_json()
+        for _ in range(2):
+            client.get('/teas')
+            client.get(f"/teas/{tea['id']}")
+        samples = scrape(client)
+        db.session.remove()
+        db.drop_all()
+
+    assert samples[('cache_hits_total', labels(cache='tea_collections'))] == 1
+    assert samples[('cache_misses_total', labels(cache='tea_collections'))] == 1
+    assert samples[('cache_hits_total', labels(cache='tea_dao_items'))] == tea_dao.stats()['items']['hits'] == 2
+
+def test_server_timing_header(test_client, test_db):  # pylint: disable=unused-argument
+    """Test that responses report their SQL statement count and time"""
+    assert test_client.get('/health').headers['Server-Timing'] == 'db;dur=0.00;desc="0 queries"'
+    response = test_client.post('/auth/login', json={'username': 'nobody', 'password': 'password123'})
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert response.headers['Server-Timing'].endswith(';desc="1 query"')
+
+def test_query_budget_warning(test_app, test_client, test_db, caplog):  # pylint: disable=unused-argument
+    """Test that a route running more statements than its budget is logged"""
+    test_app.extensions['query_budget'].budgets['auth.register'] = 2
+    test_client.post('/auth/login', json={'username': 'nobody', 'password': 'password123'})
+    assert not any(record.levelname == 'WARNING' for record in caplog.records)
+
+    test_client.post('/auth/register', json={
+        'username': 'testuser', 'email': 'test@example.com', 'password': 'password123'
+    })
+    warnings = [record.getMessage() for record in caplog.records if record.levelname == 'WARNING']
+    assert warnings == ['POST /auth/register ran 3 queries, over the budget of 2 for auth.register']
+
+ROOT = Path(__file__).resolve().parents[3]
+WORKERS = 2
+WORKER = """
+from app import create_app
+from tests.conftest import get_test_config
+client = create_app(dict(get_test_config(), METRICS_ENABLED=True)).test_client()
+for _ in range(3):
+    client.get('/health')
+"""
+
+def test_multiprocess_aggregation(tmp_path):
+    """Test that samples written by separate worker processes are summed"""
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    for _ in range(WORKERS):
+        subprocess.run([sys.executable, '-c', WORKER], env=env, cwd=ROOT, check=True)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(tmp_path))
+    value = registry.get_sample_value('http_requests_total',
+                                      {'method': 'GET', 'endpoint': '/health', 'status': '200'})
+    assert value == 3 * WORKERS
@@ -0,0 +1,72 @@
+"""Tests pinning the number of SQL statements each tea and auth endpoint runs"""
+import json
+import pytest
+
+TEA = {'name': 'Sencha', 'type': 'green', 'steep_time': 90, 'steep_temperature': 75}
+USER = {'username': 'testuser', 'email': 'test@example.com', 'password': 'password123'}
+
+@pytest.fixture
+def logged_in(test_client, query_counter):  # pylint: disable=unused-argument
+    """Register and log in a user, with their identity already in the user cache"""
+    test_client.post('/auth/register', json=USER)
+    test_client.post('/auth/login', json={'username': USER['username'], 'password': USER['password']})
+    test_client.get('/auth/profile')
+    return test_client
+
+@pytest.fixture
+def tea_id(logged_in):  # pylint: disable=redefined-outer-name
+    """Create a tea and return its id"""
+    return json.loads(logged_in.post('/teas', json=TEA).data)['id']
+
+def test_auth_query_counts(test_client, query_counter):
+    """Test that registration checks both unique columns and the user loader is cached"""
+    with query_counter.expect(3):
+        assert test_client.post('/auth/register', json=USER).status_code == 201
+    with query_counter.expect(1):
+        assert test_client.post('/auth/login', json={
+            'username': USER['username'], 'password': USER['password']
+        }).status_code == 200
+    with query_counter.expect(1):
+        assert test_client.get('/auth/profile').status_code == 200
+    # The user loader is served from the identity cache from then on
+    with query_counter.expect(0):
+        assert test_client.get('/auth/profile').status_code == 200
+    with query_counter.expect(0):
+        assert test_client.post('/auth/logout').status_code == 200
+
+def test_tea_read_query_counts(logged_in, tea_id, query_counter):  # pylint: disable=redefined-outer-name
+    """Test that reads run one query, plus the version check for paged and conditional reads"""
+    with query_counter.expect(1):
+        assert logged_in.get('/teas').status_code == 200
+    with query_counter.expect(2):
+        assert logged_in.get('/teas?limit=10').status_code == 200
+    with query_counter.expect(1):
+        assert logged_in.get(f'/teas/{tea_id}').status_code == 200
+    with query_counter.expect(1):
+        assert logged_in.get('/teas/99999').status_code == 404
+    with query_counter.expect(1):
+        assert logged_in.get('/teas/export').status_code == 200
+    with query_counter.expect(2):
+        assert logged_in.get('/teas/changes').status_code == 200
+
+def test_tea_write_query_counts(logged_in, tea_id, query_counter):  # pylint: disable=redefined-outer-name
+    """Test the statements behind each tea write"""
+    # Duplicate check, insert, and reading the row back after the commit expired it
+    with query_counter.expect(3):
+        assert logged_in.post('/teas', json=dict(TEA, name='Gyokuro')).status_code == 201
+    with query_counter.expect(1):
+        assert logged_in.post('/teas', json=TEA).status_code == 400
+    with query_counter.expect(3):
+        assert logged_in.put(f'/teas/{tea_id}', json={'notes': 'Grassy'}).status_code == 200
+    # SQLite has no UPDATE ... RETURNING here, so the row is read back
+    with query_counter.expect(2):
+        assert logged_in.post(f'/teas/{tea_id}/steep').status_code == 200
+    with query_counter.expect(2):
+        assert logged_in.delete(f'/teas/{tea_id}/steep').status_code == 200
+    # One duplicate check, one executemany insert and one read back, whatever the batch size
+    with query_counter.expect(3):
+        assert logged_in.post('/teas/batch', json=[
+            dict(TEA, name=f'Tea {i}') for i in range(5)
+        ]).status_code == 201
+    with query_counter.expect(3):
+        assert logged_in.delete(f'/teas/{tea_id}').status_code == 204
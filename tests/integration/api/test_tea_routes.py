@@ -1,19 +1,32 @@
 """Tests for tea routes"""
 import json
+from datetime import datetime, timedelta, timezone
+import threading
+import boto3
 import pytest
+from moto import mock_dynamodb
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 from flask import Flask, jsonify
+from app.dao.provisioning import create_tea_table
+from app.dao.tea_dao import UPDATED_AT_INDEX_NAME
 from app.models.tea import Tea
+from app.models.tea_tombstone import TeaTombstone
 from app.models.user import User
 from app.routes.api.tea_routes import create_tea_routes
+from app.services.steep_buffer import SteepCountBuffer
+from app.services.tea_cache import MemoryCacheBackend, RedisCacheBackend, TeaCollectionCache
+from app.services.tea_backends import SqlTeaBackend, TeaExistsError
+from app.services.tea_service import TeaService
 from app.extensions import db, login_manager
+from app.utils.helpers import encode_cursor
 
-@pytest.fixture
-def app():
-    """Create application for testing"""
+def build_app(database_uri='sqlite:///:memory:'):
+    """Build a minimal application serving the tea routes"""
     app = Flask(__name__)
     app.config.update({
         'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'SQLALCHEMY_DATABASE_URI': database_uri,
         'SQLALCHEMY_TRACK_MODIFICATIONS': False,
         'SECRET_KEY': 'TEST-secret-key-NOT-FOR-PRODUCTION'
     })
@@ -38,6 +51,11 @@ def app():
     
     return app
 
+@pytest.fixture
+def app():
+    """Create application for testing"""
+    return build_app()
+
 @pytest.fixture
 def client(app):
     """Create test client"""
@@ -205,3 +223,741 @@ def test_user_cannot_access_others_tea(auth_client, app):
         # Try to access the other user's tea
         response = client.get(f'/api/teas/{tea.id}')
         assert response.status_code == 404
+
+def create_teas(user, count):
+    """Insert count teas for user and return their ids in insertion order"""
+    teas = [
+        Tea(
+            name=f'Tea {i}',
+            tea_type='green',
+            steep_time=180,
+            steep_temperature=80,
+            user_id=user.id
+        )
+        for i in range(count)
+    ]
+    db.session.add_all(teas)
+    db.session.commit()
+    return [tea.id for tea in teas]
+
+def test_get_teas_paginated(auth_client):
+    """Test walking the tea list with keyset cursors"""
+    client, user = auth_client
+    tea_ids = create_teas(user, 5)
+
+    seen = []
+    response = client.get('/api/teas?limit=2')
+    while True:
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['items']) <= 2
+        seen.extend(item['id'] for item in data['items'])
+        if data['next_cursor'] is None:
+            break
+        response = client.get(f"/api/teas?limit=2&cursor={data['next_cursor']}")
+
+    assert seen == tea_ids
+
+def test_get_teas_limit_capped(auth_client, app):
+    """Test that the server caps the page size"""
+    client, user = auth_client
+    app.config['TEA_PAGE_SIZE_MAX'] = 3
+    create_teas(user, 5)
+    response = client.get('/api/teas?limit=100')
+    data = json.loads(response.data)
+    assert len(data['items']) == 3
+    assert data['next_cursor'] is not None
+
+def test_get_teas_paginated_by_config(auth_client, app, sample_tea):
+    """Test that TEA_LIST_PAGINATED makes the paginated shape the default"""
+    client, _ = auth_client
+    app.config['TEA_LIST_PAGINATED'] = True
+    response = client.get('/api/teas')
+    data = json.loads(response.data)
+    assert [item['id'] for item in data['items']] == [sample_tea.id]
+    assert data['next_cursor'] is None
+
+def test_get_teas_invalid_pagination(auth_client):
+    """Test that malformed limit and cursor values are rejected"""
+    client, _ = auth_client
+    assert client.get('/api/teas?limit=0').status_code == 400
+    assert client.get('/api/teas?limit=abc').status_code == 400
+    assert client.get('/api/teas?cursor=not-a-cursor').status_code == 400
+
+def test_export_teas(auth_client, app):
+    """Test streaming the collection as newline-delimited JSON"""
+    client, user = auth_client
+    app.config['TEA_EXPORT_BATCH_SIZE'] = 2
+    tea_ids = create_teas(user, 5)
+
+    response = client.get('/api/teas/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.data.decode('utf-8').splitlines()
+    assert [json.loads(line)['id'] for line in lines] == tea_ids
+
+def test_export_teas_unauthorized(client):
+    """Test that unauthorized users cannot export teas"""
+    response = client.get('/api/teas/export')
+    assert response.status_code == 401
+
+def test_create_teas_batch(auth_client):
+    """Test creating several teas in one request"""
+    client, _ = auth_client
+    teas = [
+        {'name': 'Sencha', 'type': 'green', 'steep_time': 60, 'steep_temperature': 75},
+        {'name': 'Assam', 'type': 'black', 'steep_time': 240, 'steep_temperature': 95, 'notes': 'Malty'}
+    ]
+    response = client.post('/api/teas/batch', json=teas)
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data['created'] == 2
+    assert data['failed'] == 0
+    assert [result['tea']['name'] for result in data['results']] == ['Sencha', 'Assam']
+    assert data['results'][1]['tea']['notes'] == 'Malty'
+    assert Tea.query.count() == 2
+
+def test_create_teas_batch_partial_failure(auth_client, sample_tea):
+    """Test that invalid and duplicate items fail without blocking the rest"""
+    client, _ = auth_client
+    teas = [
+        {'name': 'Test Green Tea', 'type': 'green', 'steep_time': 180, 'steep_temperature': 80},
+        {'name': 'Oolong', 'type': 'oolong', 'steep_time': 120, 'steep_temperature': 90},
+        {'name': 'Oolong', 'type': 'oolong', 'steep_time': 120, 'steep_temperature': 90},
+        {'name': 'No Type', 'steep_time': 120, 'steep_temperature': 90}
+    ]
+    response = client.post('/api/teas/batch', json=teas)
+    assert response.status_code == 207
+    data = json.loads(response.data)
+    assert data['created'] == 1
+    assert data['failed'] == 3
+    statuses = [result['status'] for result in data['results']]
+    assert statuses == ['error', 'created', 'error', 'error']
+    assert 'already exists' in data['results'][0]['error']
+    assert 'already exists' in data['results'][2]['error']
+    assert 'type' in data['results'][3]['error']
+
+def test_create_teas_batch_concurrent_insert(auth_client, sample_tea, monkeypatch):  # pylint: disable=unused-argument
+    """Test that a name taken after the duplicate check fails only its own item"""
+    client, _ = auth_client
+    # As if another request created the sample tea between the check and the insert
+    monkeypatch.setattr(TeaService, 'get_existing_names', lambda self, user_id, names: set())
+    response = client.post('/api/teas/batch', json=[
+        {'name': 'Oolong', 'type': 'oolong', 'steep_time': 120, 'steep_temperature': 90},
+        {'name': 'Test Green Tea', 'type': 'green', 'steep_time': 180, 'steep_temperature': 80},
+        {'name': 'Assam', 'type': 'black', 'steep_time': 240, 'steep_temperature': 95}
+    ])
+    assert response.status_code == 207
+    data = json.loads(response.data)
+    assert [result['status'] for result in data['results']] == ['created', 'error', 'created']
+    assert data['results'][1]['error'] == 'Tea with this name already exists'
+    assert [result['tea']['name'] for result in data['results'] if 'tea' in result] == ['Oolong', 'Assam']
+    assert Tea.query.count() == 3
+
+def test_sql_create_teas_conflicts_per_row(auth_client, sample_tea):  # pylint: disable=unused-argument
+    """Test that the row-by-row fallback reports each row and re-raises other integrity errors"""
+    _, user = auth_client
+    tea = {'type': 'green', 'steep_time': 60, 'steep_temperature': 75}
+    results = SqlTeaBackend().create_teas(user.id, [
+        dict(tea, name='Oolong'), dict(tea, name='Test Green Tea'), dict(tea, name='Oolong')])
+    assert results[0]['name'] == 'Oolong'
+    assert isinstance(results[1], TeaExistsError) and isinstance(results[2], TeaExistsError)
+
+    with pytest.raises(IntegrityError):
+        SqlTeaBackend().create_teas(user.id, [dict(tea, name='Test Green Tea'), dict(tea, name='No type', type=None)])
+    assert Tea.query.count() == 2
+
+def test_create_teas_batch_invalid(auth_client, app):
+    """Test rejecting non-array payloads and oversized batches"""
+    client, _ = auth_client
+    tea = {'name': 'Sencha', 'type': 'green', 'steep_time': 60, 'steep_temperature': 75}
+    assert client.post('/api/teas/batch', json=tea).status_code == 400
+
+    app.config['TEA_BATCH_MAX_SIZE'] = 1
+    response = client.post('/api/teas/batch', json=[tea, dict(tea, name='Gyokuro')])
+    assert response.status_code == 400
+    assert Tea.query.count() == 0
+
+def test_steep_count_missing_tea(auth_client):
+    """Test that steep endpoints return 404 for unknown teas"""
+    client, _ = auth_client
+    assert client.post('/api/teas/999/steep').status_code == 404
+    assert client.delete('/api/teas/999/steep').status_code == 404
+
+@pytest.mark.parametrize('tea_id', ['abc', '\u00b2', '\u0663', '-1'])
+def test_invalid_tea_id(auth_client, tea_id):
+    """Test that IDs which are not whole numbers name no tea"""
+    client, _ = auth_client
+    assert client.get(f'/api/teas/{tea_id}').status_code == 404
+    assert client.put(f'/api/teas/{tea_id}', json={'notes': 'x'}).status_code == 404
+    assert client.delete(f'/api/teas/{tea_id}').status_code == 404
+    assert client.post(f'/api/teas/{tea_id}/steep').status_code == 404
+    assert client.delete(f'/api/teas/{tea_id}/steep').status_code == 404
+
+def test_concurrent_steep_increments(tmp_path):
+    """Test that parallel steep increments are all applied"""
+    threads_count = 8
+    steeps_per_thread = 25
+    app = build_app(f'sqlite:///{tmp_path / "teas.db"}')
+    with app.app_context():
+        db.create_all()
+        user = User(username='steeper', email='steeper@example.com')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        tea = Tea(name='Busy Tea', tea_type='green', steep_time=60, steep_temperature=80, user_id=user.id)
+        db.session.add(tea)
+        db.session.commit()
+        user_id, tea_id = user.id, tea.id
+
+    statuses = []
+
+    def steep():
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(user_id)
+                sess['_fresh'] = True
+            for _ in range(steeps_per_thread):
+                statuses.append(client.post(f'/api/teas/{tea_id}/steep').status_code)
+
+    threads = [threading.Thread(target=steep) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [200] * (threads_count * steeps_per_thread)
+    with app.app_context():
+        assert db.session.get(Tea, tea_id).steep_count == threads_count * steeps_per_thread
+        db.drop_all()
+
+@pytest.fixture
+def steep_buffer(app):
+    """Enable write-behind steep counts with a flush interval the tests never reach"""
+    app.config['STEEP_FLUSH_INTERVAL_MS'] = 60000
+    app.config['STEEP_FLUSH_MAX_PENDING'] = 1000
+    buffer = SteepCountBuffer(app)
+    yield buffer
+    buffer.close()
+
+def stored_steep_count(tea_id):
+    """Read the steep count as committed in the database"""
+    return db.session.execute(
+        db.select(Tea.steep_count).where(Tea.id == tea_id)
+    ).scalar_one()
+
+def flush_buffer(steep_buffer):
+    """Flush buffered steeps, then expire the session the test requests share so they see the new counts"""
+    flushed = steep_buffer.flush()
+    db.session.expire_all()
+    return flushed
+
+def test_write_behind_steep_count(auth_client, sample_tea, steep_buffer):
+    """Test that buffered increments are visible before they are flushed"""
+    client, _ = auth_client
+    for expected in range(1, 4):
+        response = client.post(f'/api/teas/{sample_tea.id}/steep')
+        assert response.status_code == 200
+        assert json.loads(response.data)['steep_count'] == expected
+
+    assert stored_steep_count(sample_tea.id) == 0
+    assert json.loads(client.get(f'/api/teas/{sample_tea.id}').data)['steep_count'] == 3
+    assert json.loads(client.get('/api/teas').data)[0]['steep_count'] == 3
+
+    assert flush_buffer(steep_buffer) == 1
+    assert stored_steep_count(sample_tea.id) == 3
+    assert json.loads(client.get(f'/api/teas/{sample_tea.id}').data)['steep_count'] == 3
+
+def test_write_behind_flush_at_max_pending(auth_client, sample_tea, steep_buffer):
+    """Test that reaching max pending increments triggers a flush"""
+    client, _ = auth_client
+    steep_buffer.max_pending = 2
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    assert stored_steep_count(sample_tea.id) == 0
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    assert stored_steep_count(sample_tea.id) == 2
+    assert steep_buffer.pending_for_user(sample_tea.user_id) == {}
+
+def test_write_behind_clear_discards_pending(auth_client, sample_tea, steep_buffer):
+    """Test that clearing the steep count drops unflushed increments"""
+    client, _ = auth_client
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    response = client.delete(f'/api/teas/{sample_tea.id}/steep')
+    assert json.loads(response.data)['steep_count'] == 0
+
+    flush_buffer(steep_buffer)
+    assert stored_steep_count(sample_tea.id) == 0
+
+def test_write_behind_close_flushes(auth_client, sample_tea, steep_buffer):
+    """Test that shutting the buffer down writes out pending increments"""
+    client, _ = auth_client
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    steep_buffer.close()
+    assert stored_steep_count(sample_tea.id) == 1
+
+def test_write_behind_read_during_flush(auth_client, sample_tea, steep_buffer):
+    """Test that a read as a flush commits does not count the flushed increments twice"""
+    client, _ = auth_client
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    pending = []
+    reader = threading.Thread(target=lambda: pending.append(steep_buffer.pending_for_user(sample_tea.user_id)))
+
+    def on_commit(conn):  # pylint: disable=unused-argument
+        if reader.ident is None:
+            reader.start()
+            reader.join(0.1)
+
+    event.listen(db.engine, 'commit', on_commit)
+    flush_buffer(steep_buffer)
+    event.remove(db.engine, 'commit', on_commit)
+    reader.join()
+    assert stored_steep_count(sample_tea.id) + pending[0].get(sample_tea.id, 0) == 1
+
+def test_get_teas_etag(auth_client, sample_tea):
+    """Test conditional GET of the tea list"""
+    client, _ = auth_client
+    response = client.get('/api/teas')
+    etag = response.headers['ETag']
+
+    response = client.get('/api/teas', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    response = client.get('/api/teas', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_get_teas_etag_changes_on_delete(auth_client, sample_tea):
+    """Test that removing a tea changes the collection ETag"""
+    client, user = auth_client
+    create_teas(user, 1)
+    etag = client.get('/api/teas').headers['ETag']
+    client.delete(f'/api/teas/{sample_tea.id}')
+    response = client.get('/api/teas', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(json.loads(response.data)) == 1
+
+def test_get_teas_paginated_etag(auth_client, sample_tea):
+    """Test that each page carries its own ETag"""
+    client, _ = auth_client
+    etag = client.get('/api/teas?limit=1').headers['ETag']
+    assert etag != client.get('/api/teas').headers['ETag']
+    response = client.get('/api/teas?limit=1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+def test_get_tea_etag(auth_client, sample_tea):
+    """Test conditional GET of a single tea"""
+    client, _ = auth_client
+    etag = client.get(f'/api/teas/{sample_tea.id}').headers['ETag']
+    response = client.get(f'/api/teas/{sample_tea.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    client.put(f'/api/teas/{sample_tea.id}', json={'notes': 'Changed'})
+    response = client.get(f'/api/teas/{sample_tea.id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert json.loads(response.data)['notes'] == 'Changed'
+
+@pytest.fixture(params=['memory', 'redis'])
+def tea_cache(request, app):
+    """Enable the tea collection cache with an in-process or a fake Redis backend"""
+    if request.param == 'memory':
+        backend = MemoryCacheBackend()
+    else:
+        fakeredis = pytest.importorskip('fakeredis')
+        backend = RedisCacheBackend(fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+    return TeaCollectionCache(app, backend=backend)
+
+def test_get_teas_cached(auth_client, sample_tea, tea_cache):
+    """Test that repeated list reads are served from the cache"""
+    client, _ = auth_client
+    first = client.get('/api/teas')
+    second = client.get('/api/teas')
+    assert json.loads(first.data) == json.loads(second.data)
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert tea_cache.stats() == {'hits': 1, 'misses': 1}
+
+    response = client.get('/api/teas', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+    assert tea_cache.stats() == {'hits': 2, 'misses': 1}
+
+def test_tea_cache_invalidated_by_writes(auth_client, sample_tea, tea_cache):
+    """Test that every write endpoint drops the cached collection"""
+    client, _ = auth_client
+    tea_data = {'name': 'Assam', 'type': 'black', 'steep_time': 240, 'steep_temperature': 95}
+    writes = [
+        lambda: client.post('/api/teas', json=tea_data),
+        lambda: client.post('/api/teas/batch', json=[dict(tea_data, name='Ceylon')]),
+        lambda: client.put(f'/api/teas/{sample_tea.id}', json={'notes': 'Updated'}),
+        lambda: client.post(f'/api/teas/{sample_tea.id}/steep'),
+        lambda: client.delete(f'/api/teas/{sample_tea.id}/steep'),
+        lambda: client.delete(f'/api/teas/{sample_tea.id}')
+    ]
+    for write in writes:
+        before = json.loads(client.get('/api/teas').data)
+        assert write().status_code < 300
+        after = json.loads(client.get('/api/teas').data)
+        assert after != before
+    assert tea_cache.stats() == {'hits': 5, 'misses': 7}
+
+def test_tea_cache_fill_racing_invalidation(tea_cache):
+    """Test that a collection read before an invalidation is not cached after it"""
+    version = tea_cache.version(1)
+    tea_cache.invalidate(1)
+    tea_cache.set(1, {'count': 0, 'last_updated_at': None, 'teas': []}, version)
+    assert tea_cache.get(1) is None
+
+    tea_cache.set(1, {'count': 0, 'last_updated_at': None, 'teas': []}, tea_cache.version(1))
+    assert tea_cache.get(1) == {'count': 0, 'last_updated_at': None, 'teas': []}
+
+def test_tea_cache_fill_racing_other_invalidation(tea_cache):
+    """Test that invalidating one user's collection does not drop another user's fill"""
+    version = tea_cache.version(1)
+    tea_cache.invalidate(2)
+    tea_cache.set(1, {'count': 0, 'last_updated_at': None, 'teas': []}, version)
+    assert tea_cache.get(1) == {'count': 0, 'last_updated_at': None, 'teas': []}
+
+def test_tea_cache_redis_unavailable(auth_client, sample_tea, app, caplog):
+    """Test that reads and writes succeed, uncached, while Redis cannot be reached"""
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    tea_cache = TeaCollectionCache(app, backend=RedisCacheBackend(fakeredis.FakeRedis(server=server)))
+    server.connected = False
+    client, _ = auth_client
+
+    response = client.get('/api/teas')
+    assert response.status_code == 200
+    assert [tea['name'] for tea in json.loads(response.data)] == ['Test Green Tea']
+    assert client.put(f'/api/teas/{sample_tea.id}', json={'notes': 'Updated'}).status_code == 200
+    assert json.loads(client.get('/api/teas').data)[0]['notes'] == 'Updated'
+    assert tea_cache.stats() == {'hits': 0, 'misses': 2}
+    assert any('invalidation failed' in record.getMessage() for record in caplog.records)
+
+def test_tea_cache_invalidated_by_steep_flush(auth_client, sample_tea, tea_cache, steep_buffer):
+    """Test that flushing buffered steeps drops the affected cached collections"""
+    client, _ = auth_client
+    steep_buffer.add_flush_listener(tea_cache.invalidate_many)
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    assert json.loads(client.get('/api/teas').data)[0]['steep_count'] == 1
+    flush_buffer(steep_buffer)
+    assert json.loads(client.get('/api/teas').data)[0]['steep_count'] == 1
+    assert tea_cache.stats() == {'hits': 0, 'misses': 2}
+
+def capture_statements():
+    """Record the SQL sent to the test database"""
+    statements = []
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, *args):  # pylint: disable=unused-argument
+        statements.append(statement)
+
+    return statements
+
+def test_get_teas_sparse_fields(auth_client, sample_tea):
+    """Test that a fieldset trims both the response and the query"""
+    client, _ = auth_client
+    db.session.expire_all()
+    statements = capture_statements()
+    response = client.get('/api/teas?fields=name,id,steep_count,type')
+    assert response.status_code == 200
+    assert json.loads(response.data) == [
+        {'id': sample_tea.id, 'name': 'Test Green Tea', 'type': 'green', 'steep_count': 0}
+    ]
+    selects = [statement for statement in statements if 'FROM teas' in statement]
+    assert selects and not any('teas.notes' in statement for statement in selects)
+
+def test_get_teas_sparse_fields_paginated(auth_client):
+    """Test that fieldsets apply to each keyset page"""
+    client, user = auth_client
+    tea_ids = create_teas(user, 3)
+    data = json.loads(client.get('/api/teas?fields=id&limit=2').data)
+    assert data['items'] == [{'id': tea_id} for tea_id in tea_ids[:2]]
+    assert data['next_cursor'] is not None
+
+def test_get_tea_sparse_fields(auth_client, sample_tea):
+    """Test a fieldset on a single tea, including its ETag"""
+    client, _ = auth_client
+    response = client.get(f'/api/teas/{sample_tea.id}?fields=name,created_at')
+    assert json.loads(response.data) == {'name': 'Test Green Tea', 'created_at': sample_tea.created_at.isoformat()}
+    assert response.headers['ETag'] != client.get(f'/api/teas/{sample_tea.id}').headers['ETag']
+    response = client.get(f'/api/teas/{sample_tea.id}?fields=name,created_at',
+                          headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+def test_get_teas_unknown_fields(auth_client, sample_tea):
+    """Test that unknown or empty fieldsets are rejected"""
+    client, _ = auth_client
+    response = client.get('/api/teas?fields=name,user_id,secret')
+    assert response.status_code == 400
+    assert json.loads(response.data)['error'] == 'Unknown fields: secret, user_id'
+    assert client.get('/api/teas?fields=').status_code == 400
+    assert client.get(f'/api/teas/{sample_tea.id}?fields=colour').status_code == 400
+
+def test_sparse_fields_include_pending_steeps(auth_client, sample_tea, steep_buffer):
+    """Test that buffered steeps are folded into trimmed teas"""
+    client, _ = auth_client
+    client.post(f'/api/teas/{sample_tea.id}/steep')
+    assert json.loads(client.get('/api/teas?fields=steep_count').data) == [{'steep_count': 1}]
+    assert json.loads(client.get(f'/api/teas/{sample_tea.id}?fields=steep_count').data) == {'steep_count': 1}
+
+def test_sparse_fields_bypass_cache(auth_client, sample_tea, tea_cache):
+    """Test that only the full shape is cached"""
+    client, _ = auth_client
+    client.get('/api/teas?fields=id,name')
+    client.get('/api/teas?fields=id,name')
+    assert tea_cache.stats() == {'hits': 0, 'misses': 0}
+    client.get('/api/teas')
+    assert json.loads(client.get('/api/teas').data)[0]['notes'] == 'Test notes'
+    assert tea_cache.stats() == {'hits': 1, 'misses': 1}
+
+def get_changes(client, token=None):
+    """Fetch the tea changes since a sync token"""
+    url = '/api/teas/changes' if token is None else f'/api/teas/changes?since={token}'
+    response = client.get(url)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+def test_get_tea_changes_full_sync(auth_client, sample_tea):
+    """Test that a sync without a token returns the whole collection"""
+    client, _ = auth_client
+    data = get_changes(client)
+    assert data['full_sync'] is True
+    assert [tea['id'] for tea in data['teas']] == [sample_tea.id]
+    assert data['deleted'] == []
+    assert data['sync_token']
+
+def test_get_tea_changes_since_token(auth_client, app, sample_tea):
+    """Test that a token yields only the teas changed or deleted after it"""
+    client, user = auth_client
+    app.config['TEA_SYNC_SAFETY_WINDOW_SECONDS'] = 0
+    other_id = create_teas(user, 1)[0]
+    token = get_changes(client)['sync_token']
+
+    data = get_changes(client, token)
+    assert data['full_sync'] is False
+    assert data['teas'] == [] and data['deleted'] == []
+
+    client.put(f'/api/teas/{sample_tea.id}', json={'notes': 'Changed'})
+    client.delete(f'/api/teas/{other_id}')
+    data = get_changes(client, token)
+    assert [(tea['id'], tea['notes']) for tea in data['teas']] == [(sample_tea.id, 'Changed')]
+    assert [tombstone['id'] for tombstone in data['deleted']] == [other_id]
+
+    data = get_changes(client, data['sync_token'])
+    assert data['teas'] == [] and data['deleted'] == []
+
+def test_get_tea_changes_full_sync_skips_old_tombstones(auth_client, app, sample_tea):
+    """Test that deletions from before a full sync are not replayed afterwards"""
+    client, _ = auth_client
+    app.config['TEA_SYNC_SAFETY_WINDOW_SECONDS'] = 0
+    client.delete(f'/api/teas/{sample_tea.id}')
+    token = get_changes(client)['sync_token']
+    assert get_changes(client, token)['deleted'] == []
+
+def test_get_tea_changes_same_timestamp(auth_client):
+    """Test that teas sharing an updated_at are neither skipped nor repeated"""
+    client, user = auth_client
+    timestamp = datetime(2024, 1, 1)
+    first = Tea(name='First', tea_type='green', steep_time=60, steep_temperature=80, user_id=user.id,
+                created_at=timestamp, updated_at=timestamp)
+    db.session.add(first)
+    db.session.commit()
+    token = get_changes(client)['sync_token']
+
+    second = Tea(name='Second', tea_type='green', steep_time=60, steep_temperature=80, user_id=user.id,
+                 created_at=timestamp, updated_at=timestamp)
+    db.session.add(second)
+    db.session.commit()
+    assert [tea['name'] for tea in get_changes(client, token)['teas']] == ['Second']
+
+def test_get_tea_changes_late_commit(auth_client):
+    """Test that a tea stamped before the last sync but committed after it is still delivered"""
+    client, user = auth_client
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    first = Tea(name='First', tea_type='green', steep_time=60, steep_temperature=80, user_id=user.id,
+                created_at=now, updated_at=now)
+    db.session.add(first)
+    db.session.commit()
+    token = get_changes(client)['sync_token']
+
+    late = Tea(name='Late', tea_type='green', steep_time=60, steep_temperature=80, user_id=user.id,
+               created_at=now - timedelta(seconds=5), updated_at=now - timedelta(seconds=5))
+    db.session.add(late)
+    db.session.commit()
+    # Teas inside the safety window are sent again
+    data = get_changes(client, token)
+    assert [tea['name'] for tea in data['teas']] == ['Late', 'First']
+    assert [tea['name'] for tea in get_changes(client, data['sync_token'])['teas']] == ['Late', 'First']
+
+def test_get_tea_changes_expired_token(auth_client, app, sample_tea):
+    """Test that a token older than the tombstone retention forces a full sync"""
+    client, _ = auth_client
+    token = get_changes(client)['sync_token']
+    app.config['TEA_TOMBSTONE_RETENTION_DAYS'] = 0
+    data = get_changes(client, token)
+    assert data['full_sync'] is True
+    assert [tea['id'] for tea in data['teas']] == [sample_tea.id]
+
+def test_get_tea_changes_invalid_token(auth_client):
+    """Test that malformed sync tokens are rejected"""
+    client, _ = auth_client
+    assert client.get('/api/teas/changes?since=not-a-token').status_code == 400
+    assert client.get(f"/api/teas/changes?since={encode_cursor({'at': 'yesterday'})}").status_code == 400
+
+def test_delete_tea_records_tombstone(auth_client, sample_tea):
+    """Test that deleting a tea leaves a tombstone for its owner"""
+    client, user = auth_client
+    client.delete(f'/api/teas/{sample_tea.id}')
+    tombstones = TeaTombstone.query.all()
+    assert [(tombstone.tea_id, tombstone.user_id) for tombstone in tombstones] == [(sample_tea.id, user.id)]
+
+def create_mock_tea_table(app, monkeypatch):
+    """Point the dynamodb backend at a new table, inside mock_dynamodb()"""
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SECURITY_TOKEN", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    app.config.update({'AWS_REGION': 'us-east-1', 'DYNAMODB_TABLE_NAME': 'Teas', 'DYNAMODB_ENDPOINT': None})
+    create_tea_table(boto3.resource('dynamodb', region_name='us-east-1'), 'Teas')
+
+@pytest.fixture(params=['memory', 'dynamodb'])
+def item_backend(request, app, monkeypatch):
+    """Store teas in a MemoryTeaDao, then in a mocked DynamoDB table, instead of the database"""
+    app.config['TEA_BACKEND'] = request.param
+    if request.param == 'memory':
+        yield
+        return
+    with mock_dynamodb():
+        create_mock_tea_table(app, monkeypatch)
+        yield
+
+def test_item_backend_crud(auth_client, item_backend):
+    """Test that the tea routes behave the same over the item backends"""
+    client, _ = auth_client
+    response = client.post('/api/teas', json={
+        'name': 'Sencha', 'type': 'green', 'steep_time': 90, 'steep_temperature': 75, 'notes': 'Grassy'
+    })
+    assert response.status_code == 201
+    tea = json.loads(response.data)
+    assert (tea['steep_time'], tea['steep_temperature'], tea['notes']) == (90, 75, 'Grassy')
+    assert Tea.query.count() == 0
+
+    assert client.post('/api/teas', json={
+        'name': 'Sencha', 'type': 'green', 'steep_time': 90, 'steep_temperature': 75
+    }).status_code == 400
+    assert json.loads(client.get(f"/api/teas/{tea['id']}").data) == tea
+    assert [item['id'] for item in json.loads(client.get('/api/teas').data)] == [tea['id']]
+
+    assert json.loads(client.post(f"/api/teas/{tea['id']}/steep").data)['steep_count'] == 1
+    updated = json.loads(client.put(f"/api/teas/{tea['id']}", json={'steep_time': 120}).data)
+    assert (updated['steep_time'], updated['steep_count']) == (120, 1)
+    assert updated['updated_at'] >= tea['updated_at']
+
+    assert client.delete(f"/api/teas/{tea['id']}").status_code == 204
+    assert client.get(f"/api/teas/{tea['id']}").status_code == 404
+    assert client.get('/api/teas/not-a-tea').status_code == 404
+
+def test_item_backend_write_after_delete(auth_client, item_backend, app, monkeypatch):  # pylint: disable=unused-argument
+    """Test that a tea deleted between the read and the write is not recreated as a partial item"""
+    client, _ = auth_client
+    tea = json.loads(client.post('/api/teas', json={
+        'name': 'Sencha', 'type': 'green', 'steep_time': 90, 'steep_temperature': 75
+    }).data)
+    tea_dao = app.extensions['tea_service'].backend.tea_dao
+    get_tea_item = tea_dao.get_tea_item
+
+    def get_then_delete(user_id, tea_id, *args, **kwargs):
+        item = get_tea_item(user_id, tea_id, *args, **kwargs)
+        tea_dao.delete_tea_item(user_id, tea_id)
+        return item
+
+    monkeypatch.setattr(tea_dao, 'get_tea_item', get_then_delete)
+    assert client.put(f"/api/teas/{tea['id']}", json={'notes': 'Grassy'}).status_code == 404
+    assert client.delete(f"/api/teas/{tea['id']}/steep").status_code == 404
+    monkeypatch.setattr(tea_dao, 'get_tea_item', get_tea_item)
+    assert client.get(f"/api/teas/{tea['id']}").status_code == 404
+    assert json.loads(client.get('/api/teas').data) == []
+
+def test_item_backend_paginated(auth_client, item_backend):
+    """Test keyset pages and batches over the item backends"""
+    client, _ = auth_client
+    response = client.post('/api/teas/batch', json=[
+        {'name': f'Tea {i}', 'type': 'green', 'steep_time': 60, 'steep_temperature': 80} for i in range(5)
+    ] + [{'name': 'Tea 0', 'type': 'green', 'steep_time': 60, 'steep_temperature': 80}])
+    assert response.status_code == 207
+    assert json.loads(response.data)['created'] == 5
+
+    names, cursor = [], None
+    while True:
+        url = '/api/teas?limit=2' if cursor is None else f'/api/teas?limit=2&cursor={cursor}'
+        page = json.loads(client.get(url).data)
+        names.extend(tea['name'] for tea in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(names) == [f'Tea {i}' for i in range(5)]
+
+def test_item_backend_changes_not_supported(auth_client, item_backend):
+    """Test that the change feed is reported as unsupported without tombstones"""
+    client, _ = auth_client
+    assert client.get('/api/teas/changes').status_code == 501
+
+def test_dynamodb_backend_reads_pages_not_partitions(auth_client, app, monkeypatch):
+    """Test that pages and version checks query only what they need, and name checks use the DAO cache"""
+    client, _ = auth_client
+    app.config.update({'TEA_BACKEND': 'dynamodb', 'TEA_DAO_CACHE_ENABLED': True})
+    with mock_dynamodb():
+        create_mock_tea_table(app, monkeypatch)
+        client.get('/api/teas')
+        queries = []
+        app.extensions['tea_service'].backend.tea_dao.dynamodb.meta.client.meta.events.register(
+            'provide-client-params.dynamodb.Query', lambda **kwargs: queries.append(kwargs['params']))
+
+        assert client.post('/api/teas/batch', json=[
+            {'name': name, 'type': 'green', 'steep_time': 90, 'steep_temperature': 75}
+            for name in ('Sencha', 'Gyokuro', 'Bancha')
+        ]).status_code == 201
+        assert not queries
+
+        # The version is a COUNT query plus the newest UpdatedAt index entry, and the page
+        # asks for one tea more than its limit
+        page = json.loads(client.get('/api/teas?limit=2').data)
+        assert [(query.get('Select'), query.get('IndexName'), query.get('Limit')) for query in queries] == [
+            ('COUNT', None, None), (None, UPDATED_AT_INDEX_NAME, 1), (None, None, 3)]
+        queries.clear()
+        last = json.loads(client.get(f"/api/teas?limit=2&cursor={page['next_cursor']}").data)
+        assert len(last['items']) == 1 and last['next_cursor'] is None
+        assert queries[-1]['ExclusiveStartKey']['tea_id'] == page['items'][-1]['id']
+
+        # With the partition cached, the version check runs no query
+        client.get('/api/teas')
+        queries.clear()
+        etag = client.get('/api/teas?limit=2').headers['ETag']
+        assert client.get('/api/teas?limit=2', headers={'If-None-Match': etag}).status_code == 304
+        assert len(queries) == 1
+
+def test_dynamodb_steep_round_trips(auth_client, app, monkeypatch):
+    """Test that a steep is one conditional write returning the item, with UpdatedAt moved on by the write"""
+    client, _ = auth_client
+    app.config.update({'TEA_BACKEND': 'dynamodb', 'TEA_DAO_CACHE_ENABLED': True})
+    with mock_dynamodb():
+        create_mock_tea_table(app, monkeypatch)
+        tea = json.loads(client.post('/api/teas', json={
+            'name': 'Sencha', 'type': 'green', 'steep_time': 90, 'steep_temperature': 75
+        }).data)
+        # Warm the DAO cache, which must not answer the steep responses
+        client.get(f"/api/teas/{tea['id']}")
+        calls = []
+        app.extensions['tea_service'].backend.tea_dao.dynamodb.meta.client.meta.events.register(
+            'provide-client-params.dynamodb', lambda event_name, **kwargs: calls.append(event_name.split('.')[-1]))
+
+        steeped = json.loads(client.post(f"/api/teas/{tea['id']}/steep").data)
+        assert calls == ['UpdateItem']
+        assert steeped['steep_count'] == 1
+        assert steeped['updated_at'] > tea['updated_at']
+
+        calls.clear()
+        cleared = json.loads(client.delete(f"/api/teas/{tea['id']}/steep").data)
+        assert calls == ['UpdateItem']
+        assert cleared['steep_count'] == 0
+        assert cleared['updated_at'] > steeped['updated_at']
@@ -0,0 +1,46 @@
+"""Tests for the password hasher"""
+import pytest
+from app.auth.password_hasher import PasswordHasher, HasherSaturatedError
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+class TestPasswordHasher:
+    """Test cases for PasswordHasher"""
+
+    def test_hash_and_verify(self):
+        """Test hashing inline with configured cost parameters"""
+        hasher = PasswordHasher(method=FAST_METHOD, salt_length=8)
+        pwhash = hasher.hash('password123')
+        assert pwhash.startswith('pbkdf2:sha256:1000$')
+        assert hasher.verify(pwhash, 'password123')
+        assert not hasher.verify(pwhash, 'wrong')
+
+    def test_needs_rehash(self):
+        """Test detecting hashes made with other cost parameters"""
+        hasher = PasswordHasher(method=FAST_METHOD, salt_length=8)
+        pwhash = hasher.hash('password123')
+        assert not hasher.needs_rehash(pwhash)
+        assert PasswordHasher(method='pbkdf2:sha256:2000', salt_length=8).needs_rehash(pwhash)
+        assert PasswordHasher(method=FAST_METHOD, salt_length=16).needs_rehash(pwhash)
+
+    def test_needs_rehash_with_default_iterations(self):
+        """Test that werkzeug's default iteration count matches an unqualified method"""
+        hasher = PasswordHasher(method='pbkdf2:sha256', salt_length=8)
+        assert not hasher.needs_rehash(hasher.hash('password123'))
+
+    def test_process_pool(self):
+        """Test hashing and verifying in a process pool"""
+        hasher = PasswordHasher(method=FAST_METHOD, pool_size=1)
+        try:
+            pwhash = hasher.hash('password123')
+            assert hasher.verify(pwhash, 'password123')
+        finally:
+            hasher.shutdown()
+
+    def test_saturated(self):
+        """Test rejecting work once max_pending jobs are queued"""
+        hasher = PasswordHasher(method=FAST_METHOD, pool_size=1, max_pending=1, retry_after=5)
+        hasher._slots.acquire()
+        with pytest.raises(HasherSaturatedError) as excinfo:
+            hasher.hash('password123')
+        assert excinfo.value.retry_after == 5
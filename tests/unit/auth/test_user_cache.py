@@ -0,0 +1,82 @@
+"""Tests for the user identity cache"""
+import pytest
+from flask import Flask
+from app.auth.user_cache import UserCache, UserIdentity
+from app.models.user import User
+from app.extensions import db
+
+@pytest.fixture
+def app():
+    """Create application with a user cache"""
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'USER_CACHE_MAX_ENTRIES': 2
+    })
+    db.init_app(app)
+    UserCache(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def user(app):
+    """Create a user"""
+    user = User(username='testuser', email='test@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+class TestUserCache:
+    """Test cases for UserCache"""
+
+    def test_get_or_load(self, app, user):
+        """Test that identities are loaded once and then served from the cache"""
+        user_cache = app.extensions['user_cache']
+        identity = user_cache.get_or_load(user.id)
+        assert isinstance(identity, UserIdentity)
+        assert identity.get_id() == str(user.id)
+        assert identity.username == 'testuser'
+        assert identity.email == 'test@example.com'
+        assert identity.is_active
+        assert identity.is_authenticated
+        assert user_cache.get_or_load(user.id) is identity
+        assert user_cache.stats()['hits'] == 1
+
+    def test_get_or_load_missing_user(self, app):
+        """Test that unknown ids load as None and are not cached"""
+        user_cache = app.extensions['user_cache']
+        assert user_cache.get_or_load(999) is None
+        assert user_cache.stats()['size'] == 0
+
+    def test_bounded(self, app):
+        """Test that the cache evicts beyond its configured size"""
+        users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(3)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_cache = app.extensions['user_cache']
+        for user in users:
+            user_cache.get_or_load(user.id)
+        assert user_cache.stats()['size'] == 2
+        assert user_cache.stats()['evictions'] == 1
+
+    def test_invalidated_on_update(self, app, user):
+        """Test that changing a user drops the cached identity"""
+        user_cache = app.extensions['user_cache']
+        user_cache.get_or_load(user.id)
+        user.email = 'changed@example.com'
+        db.session.commit()
+        assert user_cache.get_or_load(user.id).email == 'changed@example.com'
+
+    def test_invalidated_on_delete(self, app, user):
+        """Test that deleting a user drops the cached identity"""
+        user_cache = app.extensions['user_cache']
+        user_id = user.id
+        user_cache.get_or_load(user_id)
+        db.session.delete(user)
+        db.session.commit()
+        assert user_cache.get_or_load(user_id) is None
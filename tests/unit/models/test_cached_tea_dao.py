@@ -0,0 +1,136 @@
+"""Tests for CachedTeaDao"""
+import pytest
+from moto import mock_dynamodb
+from app.dao.cached_tea_dao import CachedTeaDao, create_tea_dao
+from app.dao.provisioning import create_tea_table
+from app.dao.tea_dao import TeaDao
+from app.services.tea_service import TeaService
+
+@pytest.fixture(autouse=True)
+def aws_credentials(monkeypatch):
+    """Mocked AWS Credentials for moto."""
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SECURITY_TOKEN", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+@pytest.fixture
+def tea_dao():
+    """Return a TeaDao over a mocked table."""
+    with mock_dynamodb():
+        dao = TeaDao(region_name="us-east-1", table_name="Tea")
+        create_tea_table(dao.dynamodb, "Tea")
+        yield dao
+
+@pytest.fixture
+def cached_dao(tea_dao):
+    """Return a CachedTeaDao that counts the reads reaching DynamoDB."""
+    cached = CachedTeaDao(tea_dao)
+    cached.reads = []
+    for operation in ('GetItem', 'Query'):
+        tea_dao.dynamodb.meta.client.meta.events.register(
+            f'provide-client-params.dynamodb.{operation}',
+            lambda operation=operation, **kwargs: cached.reads.append(operation))
+    return cached
+
+def test_get_tea_item_read_through(cached_dao):
+    """Test that repeated item reads are served from the cache"""
+    created = cached_dao.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black'})
+    for _ in range(3):
+        assert cached_dao.get_tea_item("test_user", created['tea_id'])['Name'] == 'Earl Grey'
+    assert cached_dao.reads == []
+    assert cached_dao.get_tea_item("test_user", "missing") is None
+    assert cached_dao.get_tea_item("test_user", "missing") is None
+    assert cached_dao.reads == ['GetItem', 'GetItem']
+    assert cached_dao.stats()['items']['hits'] == 3
+
+def test_get_all_tea_items_read_through(cached_dao):
+    """Test that a user's list is read once until it is invalidated"""
+    cached_dao.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black'})
+    first = cached_dao.get_all_tea_items("test_user")
+    first[0]['Name'] = 'Mutated by caller'
+    assert cached_dao.get_all_tea_items("test_user")[0]['Name'] == 'Earl Grey'
+    assert cached_dao.reads == ['Query']
+    assert cached_dao.stats()['queries'] == {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1}
+
+    cached_dao.get_all_tea_items("test_user", consistent_read=True)
+    cached_dao.get_all_tea_items("test_user", attributes=['Name'])
+    assert cached_dao.reads == ['Query', 'Query', 'Query']
+
+@pytest.mark.parametrize('write', [
+    lambda dao, tea_id: dao.update_tea_item("test_user", tea_id, {'Type': 'Oolong'}),
+    lambda dao, tea_id: dao.increment_steep_count("test_user", tea_id),
+    lambda dao, tea_id: dao.increment_steep_counts("test_user", [tea_id, tea_id]),
+    lambda dao, tea_id: dao.clear_steep_count("test_user", tea_id),
+    lambda dao, tea_id: dao.delete_tea_item("test_user", tea_id),
+    lambda dao, tea_id: dao.batch_delete_tea_items("test_user", [tea_id]),
+    lambda dao, tea_id: dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'}),
+    lambda dao, tea_id: dao.batch_create_tea_items("test_user", [{'Name': 'Sencha', 'Type': 'Green'}])
+])
+def test_writes_invalidate(cached_dao, tea_dao, write):
+    """Test that every write leaves the cache agreeing with DynamoDB"""
+    created = cached_dao.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black', 'SteepCount': 1})
+    cached_dao.get_tea_item("test_user", created['tea_id'])
+    cached_dao.get_all_tea_items("test_user")
+    write(cached_dao, created['tea_id'])
+    assert cached_dao.get_tea_item("test_user", created['tea_id']) == tea_dao.get_tea_item("test_user",
+                                                                                           created['tea_id'])
+    assert cached_dao.get_all_tea_items("test_user") == tea_dao.get_all_tea_items("test_user")
+
+def test_failed_transaction_invalidates(cached_dao):
+    """Test that a steep session that fails still drops the affected entries"""
+    created = cached_dao.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black'})
+    cached_dao.get_all_tea_items("test_user")
+    with pytest.raises(KeyError):
+        cached_dao.increment_steep_counts("test_user", [created['tea_id'], 'missing'])
+    cached_dao.get_all_tea_items("test_user")
+    assert cached_dao.stats()['queries']['misses'] == 2
+
+def test_read_racing_write_is_not_cached(cached_dao, tea_dao, monkeypatch):
+    """Test that a read which overlaps a write does not cache what it read before the write"""
+    created = cached_dao.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black'})
+    cached_dao.items.clear()
+    read = tea_dao.get_tea_item
+
+    def read_then_write(user_id, tea_id):
+        item = read(user_id, tea_id)
+        cached_dao.update_tea_item(user_id, tea_id, {'Type': 'Oolong'})
+        return item
+
+    monkeypatch.setattr(tea_dao, 'get_tea_item', read_then_write)
+    assert cached_dao.get_tea_item("test_user", created['tea_id'])['Type'] == 'Black'
+    monkeypatch.setattr(tea_dao, 'get_tea_item', read)
+    assert cached_dao.get_tea_item("test_user", created['tea_id'])['Type'] == 'Oolong'
+
+def test_read_racing_other_users_write_is_cached(cached_dao, tea_dao, monkeypatch):
+    """Test that a write only drops reads of the same user's teas that it overlaps"""
+    created = cached_dao.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black'})
+    cached_dao.items.clear()
+    read = tea_dao.get_tea_item
+
+    def read_then_write(user_id, tea_id):
+        item = read(user_id, tea_id)
+        cached_dao.create_tea_item("other_user", {'Name': 'Sencha', 'Type': 'Green'})
+        return item
+
+    monkeypatch.setattr(tea_dao, 'get_tea_item', read_then_write)
+    cached_dao.get_tea_item("test_user", created['tea_id'])
+    cached_dao.reads.clear()
+    assert cached_dao.get_tea_item("test_user", created['tea_id'])['Type'] == 'Black'
+    assert not cached_dao.reads
+
+def test_uncached_methods_pass_through(cached_dao):
+    """Test that other DAO methods reach the wrapped DAO"""
+    cached_dao.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black'})
+    items, _ = cached_dao.query_by_type("test_user", 'Black')
+    assert [item['Name'] for item in items] == ['Earl Grey']
+    assert cached_dao.get_table().name == 'Tea'
+
+def test_create_tea_dao_from_config():
+    """Test that the cache is switched on by configuration"""
+    with mock_dynamodb():
+        config = {'AWS_REGION': 'us-east-1', 'DYNAMODB_TABLE_NAME': 'Tea'}
+        assert isinstance(create_tea_dao(config), TeaDao)
+        service = TeaService.from_config(dict(config, TEA_BACKEND='dynamodb', TEA_DAO_CACHE_ENABLED=True,
+                                              TEA_DAO_CACHE_TTL_SECONDS=5))
+        assert isinstance(service.backend.tea_dao, CachedTeaDao)
+        assert service.backend.tea_dao.items.ttl == 5
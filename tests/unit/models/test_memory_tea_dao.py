@@ -0,0 +1,219 @@
+"""Tests for MemoryTeaDao"""
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from moto import mock_dynamodb
+from app.dao.memory_tea_dao import MemoryTeaDao
+from app.dao.provisioning import create_tea_table
+from app.dao.tea_dao import TeaDao
+
+@pytest.fixture(autouse=True)
+def aws_credentials(monkeypatch):
+    """Mocked AWS Credentials for moto."""
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SECURITY_TOKEN", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+@pytest.fixture(params=['memory', 'dynamodb'])
+def any_dao(request):
+    """Return a MemoryTeaDao and a TeaDao over a mocked table, to check they behave alike."""
+    if request.param == 'memory':
+        yield MemoryTeaDao()
+        return
+    with mock_dynamodb():
+        dao = TeaDao(region_name="us-east-1", table_name="Tea")
+        create_tea_table(dao.dynamodb, "Tea")
+        yield dao
+
+@pytest.fixture
+def memory_dao():
+    """Return an empty MemoryTeaDao."""
+    return MemoryTeaDao()
+
+def check_indexes(dao):
+    """Assert that every partition's indexes agree with its items"""
+    for partition in dao.partitions.values():
+        assert partition.tea_ids == sorted(partition.items)
+        by_type = {}
+        by_steep_count = {}
+        for tea_id in partition.tea_ids:
+            item = partition.items[tea_id]
+            by_type.setdefault(item['Type'], []).append(tea_id)
+            by_steep_count.setdefault(item['SteepCount'], set()).add(tea_id)
+        assert partition.by_type == by_type
+        assert partition.by_steep_count == by_steep_count
+
+def test_create_get_and_list(any_dao):
+    """Test that items are listed in tea ID order, paginated and projected, per user"""
+    created = [any_dao.create_tea_item("test_user", {'Name': f'Tea {i}', 'Type': 'Green'}) for i in range(5)]
+    any_dao.create_tea_item("other_user", {'Name': 'Other', 'Type': 'Green'})
+
+    assert any_dao.get_tea_item("test_user", created[0]['tea_id']) == created[0]
+    assert any_dao.get_tea_item("test_user", "missing") is None
+    assert any_dao.get_tea_item("other_user", created[0]['tea_id']) is None
+
+    expected = sorted(created, key=lambda item: item['tea_id'])
+    assert any_dao.get_all_tea_items("test_user") == expected
+    assert any_dao.get_all_tea_items("test_user", page_size=2) == expected
+    assert any_dao.get_all_tea_items("test_user", attributes=['Name']) == [
+        {'Name': item['Name']} for item in expected]
+    assert any_dao.get_all_tea_items("nobody") == []
+
+def test_query_by_type_pages(any_dao):
+    """Test paging through one type of a user's teas"""
+    for i in range(5):
+        any_dao.create_tea_item("test_user", {'Name': f'Green {i}', 'Type': 'Green'})
+    any_dao.create_tea_item("test_user", {'Name': 'Assam', 'Type': 'Black'})
+
+    names = []
+    start_key = None
+    while True:
+        items, start_key = any_dao.query_by_type("test_user", 'Green', page_size=2, start_key=start_key)
+        names.extend(item['Name'] for item in items)
+        if start_key is None:
+            break
+    assert sorted(names) == [f'Green {i}' for i in range(5)]
+
+def test_collection_version_and_start_after(any_dao):
+    """Test the collection version and iterating from a tea ID"""
+    assert any_dao.collection_version("test_user") == (0, None)
+    tea_ids = sorted(
+        any_dao.create_tea_item("test_user", {'Name': f'Tea {i}', 'Type': 'Green',
+                                              'UpdatedAt': f'2024-01-0{i + 1}T00:00:00+00:00'})['tea_id']
+        for i in range(3))
+    any_dao.create_tea_item("other_user", {'Name': 'Later', 'Type': 'Green', 'UpdatedAt': '2025-01-01T00:00:00+00:00'})
+    assert any_dao.collection_version("test_user") == (3, '2024-01-03T00:00:00+00:00')
+    items = any_dao.iter_tea_items("test_user", page_size=1, start_after=tea_ids[0])
+    assert [item['tea_id'] for item in items] == tea_ids[1:]
+
+def test_update_increment_and_clear(any_dao):
+    """Test changing attributes and steep counts"""
+    created = any_dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})
+    tea_id = created['tea_id']
+    any_dao.update_tea_item("test_user", tea_id, {'Name': 'Gyokuro', 'Type': 'Green', 'Origin': 'ignored'})
+    any_dao.increment_steep_count("test_user", tea_id)
+    assert any_dao.increment_steep_counts("test_user", [tea_id, tea_id]) == {tea_id: 2}
+    item = any_dao.get_tea_item("test_user", tea_id)
+    assert item['Name'] == 'Gyokuro'
+    assert item['SteepCount'] == 3
+    assert 'Origin' not in item
+
+    any_dao.clear_steep_count("test_user", tea_id)
+    assert any_dao.get_tea_item("test_user", tea_id)['SteepCount'] == 0
+
+def test_steep_counts_set_updated_at(any_dao):
+    """Test that the steep count writes move UpdatedAt on in the same update"""
+    tea_id = any_dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})['tea_id']
+    any_dao.increment_steep_counts("test_user", [tea_id], updated_at='2024-01-01T00:00:00+00:00')
+    item = any_dao.get_tea_item("test_user", tea_id)
+    assert (item['SteepCount'], item['UpdatedAt']) == (1, '2024-01-01T00:00:00+00:00')
+
+    any_dao.clear_steep_count("test_user", tea_id, updated_at='2024-01-02T00:00:00+00:00')
+    item = any_dao.get_tea_item("test_user", tea_id)
+    assert (item['SteepCount'], item['UpdatedAt']) == (0, '2024-01-02T00:00:00+00:00')
+
+def test_single_steep_writes_return_item(any_dao):
+    """Test that the single tea steep writes return the item they left"""
+    tea_id = any_dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})['tea_id']
+    item = any_dao.increment_steep_count("test_user", tea_id, updated_at='2024-01-01T00:00:00+00:00')
+    assert (item['Name'], item['SteepCount'], item['UpdatedAt']) == ('Sencha', 1, '2024-01-01T00:00:00+00:00')
+    assert any_dao.clear_steep_count("test_user", tea_id)['SteepCount'] == 0
+
+def test_increment_steep_counts_missing_tea(any_dao):
+    """Test that a session naming a missing tea changes nothing"""
+    created = any_dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})
+    with pytest.raises(KeyError, match='missing'):
+        any_dao.increment_steep_counts("test_user", [created['tea_id'], 'missing'])
+    assert any_dao.get_tea_item("test_user", created['tea_id'])['SteepCount'] == 0
+
+def test_batch_operations(any_dao):
+    """Test batch create, get and delete outcomes"""
+    outcomes = any_dao.batch_create_tea_items("test_user", [
+        {'Name': 'Sencha', 'Type': 'Green'}, {'Name': 'No type'}, {'Name': 'Assam', 'Type': 'Black'}])
+    assert [outcome['status'] for outcome in outcomes] == ['created', 'failed', 'created']
+    tea_ids = [outcomes[0]['item']['tea_id'], outcomes[2]['item']['tea_id']]
+
+    outcomes = any_dao.batch_get_tea_items("test_user", [*tea_ids, 'missing'], attributes=['Name'])
+    assert [outcome['status'] for outcome in outcomes] == ['found', 'found', 'not_found']
+    assert outcomes[0]['item'] == {'tea_id': tea_ids[0], 'Name': 'Sencha'}
+
+    outcomes = any_dao.batch_delete_tea_items("test_user", [tea_ids[0], tea_ids[0], 'missing'])
+    assert outcomes == [{'tea_id': tea_ids[0], 'status': 'deleted'}, {'tea_id': 'missing', 'status': 'deleted'}]
+    any_dao.delete_tea_item("test_user", 'missing')
+    assert [item['tea_id'] for item in any_dao.get_all_tea_items("test_user")] == [tea_ids[1]]
+
+def test_missing_tea_raises(any_dao):
+    """Test that writes to a missing tea raise instead of creating a partial item"""
+    with pytest.raises(KeyError):
+        any_dao.update_tea_item("test_user", "missing", {'Name': 'Sencha'})
+    any_dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})
+    with pytest.raises(KeyError):
+        any_dao.increment_steep_count("test_user", "missing")
+    with pytest.raises(KeyError):
+        any_dao.clear_steep_count("test_user", "missing")
+    assert len(any_dao.get_all_tea_items("test_user")) == 1
+
+def test_results_are_copies(memory_dao):
+    """Test that mutating returned items does not change stored items"""
+    created = memory_dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})
+    created['Name'] = 'Changed'
+    memory_dao.get_tea_item("test_user", created['tea_id'])['Type'] = 'Changed'
+    memory_dao.get_all_tea_items("test_user")[0]['SteepCount'] = 99
+    assert memory_dao.get_tea_item("test_user", created['tea_id'])['Name'] == 'Sencha'
+    check_indexes(memory_dao)
+
+def test_type_and_steep_count_indexes(memory_dao):
+    """Test that the indexes follow updates, increments and deletes"""
+    sencha = memory_dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})['tea_id']
+    assam = memory_dao.create_tea_item("test_user", {'Name': 'Assam', 'Type': 'Black'})['tea_id']
+    oolong = memory_dao.create_tea_item("test_user", {'Name': 'Tieguanyin', 'Type': 'Green'})['tea_id']
+    memory_dao.update_tea_item("test_user", oolong, {'Type': 'Oolong'})
+    memory_dao.increment_steep_counts("test_user", [assam, assam, sencha])
+
+    assert [item['Name'] for item in memory_dao.query_by_type("test_user", 'Green')[0]] == ['Sencha']
+    assert [item['Name'] for item in memory_dao.query_by_type("test_user", 'Oolong')[0]] == ['Tieguanyin']
+    assert [item['Name'] for item in memory_dao.query_by_steep_count("test_user")] == ['Assam', 'Sencha']
+    assert [item['Name'] for item in memory_dao.query_by_steep_count("test_user", limit=1)] == ['Assam']
+    assert len(memory_dao.query_by_steep_count("test_user", min_steep_count=0)) == 3
+
+    memory_dao.delete_tea_item("test_user", assam)
+    assert memory_dao.query_by_type("test_user", 'Black') == ([], None)
+    check_indexes(memory_dao)
+
+def test_concurrent_writers(memory_dao):
+    """Stress test threads creating, steeping, retyping and deleting teas for shared users"""
+    threads = 8
+    rounds = 200
+    users = ['user-0', 'user-1']
+    shared = {user: [memory_dao.create_tea_item(user, {'Name': f'Shared {i}', 'Type': 'Green'})['tea_id']
+                     for i in range(4)] for user in users}
+    barrier = threading.Barrier(threads)
+
+    def worker(number):
+        user = users[number % len(users)]
+        barrier.wait()
+        for i in range(rounds):
+            memory_dao.increment_steep_count(user, shared[user][i % 4])
+            memory_dao.increment_steep_counts(user, shared[user])
+            memory_dao.update_tea_item(user, shared[user][i % 4], {'Type': ('Green', 'Black')[i % 2]})
+            created = memory_dao.create_tea_item(user, {'Name': f'Scratch {number} {i}', 'Type': 'White'})
+            memory_dao.get_all_tea_items(user, page_size=3)
+            memory_dao.query_by_type(user, 'White')
+            memory_dao.delete_tea_item(user, created['tea_id'])
+
+    # Switch threads far more often than the default 5 ms to provoke interleavings
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(worker, range(threads)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    workers_per_user = threads // len(users)
+    for user in users:
+        counts = [memory_dao.get_tea_item(user, tea_id)['SteepCount'] for tea_id in shared[user]]
+        assert counts == [workers_per_user * (rounds // 4 + rounds)] * 4
+        assert len(memory_dao.get_all_tea_items(user)) == 4
+    check_indexes(memory_dao)
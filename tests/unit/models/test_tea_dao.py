@@ -1,8 +1,14 @@
 """Tests for TeaDao"""
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pytest
+from flask import Config
 from moto import mock_dynamodb
-from app.dao.tea_dao import TeaDao
+from app.config.database import Config as DBConfig
+from app.dao import tea_dao as tea_dao_module
+from app.dao.provisioning import create_tea_table, load_table_properties
+from app.dao.tea_dao import TeaDao, TYPE_INDEX_NAME, UPDATED_AT_INDEX_NAME
 
 @pytest.fixture(scope="function", autouse=True)
 def aws_credentials():
@@ -29,19 +35,7 @@ def dynamodb():
 @pytest.fixture(scope="function")
 def tea_table_setup(dynamodb):
     """Create the DynamoDB table for testing."""
-    table = dynamodb.create_table(
-        TableName="Tea",
-        KeySchema=[
-            {"AttributeName": "user_id", "KeyType": "HASH"},
-            {"AttributeName": "tea_id", "KeyType": "RANGE"}
-        ],
-        AttributeDefinitions=[
-            {"AttributeName": "user_id", "AttributeType": "S"},
-            {"AttributeName": "tea_id", "AttributeType": "S"}
-        ],
-        BillingMode="PAY_PER_REQUEST"
-    )
-    table.meta.client.get_waiter("table_exists").wait(TableName="Tea")
+    table = create_tea_table(dynamodb, "Tea")
     yield table
     table.delete()
 
@@ -50,6 +44,34 @@ def tea_table(tea_table_setup):
     """Return TeaDao instance with mocked table."""
     return TeaDao(region_name="us-east-1", table_name="Tea")
 
+def count_calls(tea_table, operation):
+    """Record the parameters of each call to a DynamoDB operation"""
+    calls = []
+    tea_table.dynamodb.meta.client.meta.events.register(
+        f'provide-client-params.dynamodb.{operation}', lambda **kwargs: calls.append(kwargs['params']))
+    return calls
+
+def fail_first_attempts(tea_table, method_name, unprocessed_key, failures):
+    """Make a batch method report half of each request as unprocessed for the first calls"""
+    method = getattr(tea_table.dynamodb, method_name)
+    remaining = [failures]
+
+    def flaky(RequestItems):  # pylint: disable=invalid-name
+        if remaining[0] == 0:
+            return method(RequestItems=RequestItems)
+        remaining[0] -= 1
+        request = RequestItems['Tea']
+        if unprocessed_key == 'UnprocessedKeys':
+            keys = request['Keys']
+            response = method(RequestItems={'Tea': dict(request, Keys=keys[:len(keys) // 2])})
+            response[unprocessed_key] = {'Tea': dict(request, Keys=keys[len(keys) // 2:])}
+        else:
+            response = method(RequestItems={'Tea': request[:len(request) // 2]})
+            response[unprocessed_key] = {'Tea': request[len(request) // 2:]}
+        return response
+
+    setattr(tea_table.dynamodb, method_name, flaky)
+
 @pytest.mark.usefixtures("aws_credentials")
 class TestTeaDao:
     """Test cases for Tea model"""
@@ -59,6 +81,67 @@ class TestTeaDao:
         table = tea_table.get_table()
         assert table.name == "Tea"
 
+    def test_get_table_reuses_handle(self, tea_table):
+        """Test that every thread gets the same cached Table handle"""
+        barrier = threading.Barrier(8)
+
+        def get_table():
+            barrier.wait()
+            return tea_table.get_table()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tables = list(executor.map(lambda _: get_table(), range(8)))
+        assert all(table is tables[0] for table in tables)
+        assert tea_table.get_table() is tables[0]
+
+    def test_from_config(self, tea_table_setup):
+        """Test that the client is tuned from the database settings"""
+        dao = TeaDao.from_config({
+            'AWS_REGION': 'us-east-1',
+            'DYNAMODB_TABLE_NAME': 'Tea',
+            'DYNAMODB_MAX_POOL_CONNECTIONS': 20,
+            'DYNAMODB_CONNECT_TIMEOUT': 2,
+            'DATABASE_TIMEOUT': 7,
+            'DATABASE_MAX_RETRIES': 4
+        })
+        client_config = dao.dynamodb.meta.client.meta.config
+        assert client_config.max_pool_connections == 20
+        assert client_config.connect_timeout == 2
+        assert client_config.read_timeout == 7
+        assert client_config.retries == {'total_max_attempts': 5, 'mode': 'adaptive'}
+        assert dao.get_table().name == 'Tea'
+
+    def test_from_config_class(self, dynamodb):
+        """Test that the application's config class carries the DynamoDB settings to the DAO"""
+        config = Config(os.getcwd())
+        config.from_object('config.DevelopmentConfig')
+        create_tea_table(dynamodb, config['DYNAMODB_TABLE_NAME'])
+        dao = TeaDao.from_config(config)
+        client_config = dao.dynamodb.meta.client.meta.config
+        assert client_config.max_pool_connections == DBConfig.DYNAMODB_MAX_POOL_CONNECTIONS
+        assert client_config.connect_timeout == DBConfig.DYNAMODB_CONNECT_TIMEOUT
+        assert client_config.read_timeout == DBConfig.DATABASE_TIMEOUT
+        assert client_config.retries == {'total_max_attempts': DBConfig.DATABASE_MAX_RETRIES + 1, 'mode': 'adaptive'}
+        assert dao.get_table().name == 'Teas'
+        dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})
+        assert [item['Name'] for item in dao.get_all_tea_items("test_user")] == ['Sencha']
+
+    def test_default_client_config(self, tea_table):
+        """Test that a DAO built without a config still gets the tuned defaults"""
+        client_config = tea_table.dynamodb.meta.client.meta.config
+        assert client_config.max_pool_connections == tea_dao_module.DEFAULT_MAX_POOL_CONNECTIONS
+        assert client_config.retries['mode'] == 'adaptive'
+
+    def test_shared_across_threads(self, tea_table):
+        """Test concurrent writes and reads through one shared DAO"""
+        def create(i):
+            return tea_table.create_tea_item(f"user_{i % 4}", {'Name': f'Tea {i}', 'Type': 'Green'})['tea_id']
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            tea_ids = list(executor.map(create, range(64)))
+        assert len(set(tea_ids)) == 64
+        assert sum(len(tea_table.get_all_tea_items(f"user_{i}")) for i in range(4)) == 64
+
     def test_get_all_tea_items(self, tea_table):
         """Test getting all tea items"""
         user_id = "test_user"
@@ -75,6 +158,88 @@ class TestTeaDao:
         assert any(item['Name'] == 'Earl Grey' for item in items)
         assert any(item['Name'] == 'Green Tea' for item in items)
 
+    def test_iter_tea_items_follows_pages(self, tea_table):
+        """Test that iteration continues past each page"""
+        user_id = "test_user"
+        names = {f'Tea {i}' for i in range(7)}
+        for name in names:
+            tea_table.create_tea_item(user_id, {'Name': name, 'Type': 'Green'})
+        tea_table.create_tea_item("other_user", {'Name': 'Other', 'Type': 'Green'})
+
+        queries = []
+        tea_table.dynamodb.meta.client.meta.events.register(
+            'provide-client-params.dynamodb.Query', lambda **kwargs: queries.append(kwargs['params']))
+        items = list(tea_table.iter_tea_items(user_id, page_size=3))
+        assert {item['Name'] for item in items} == names
+        assert len(queries) == 3
+        assert all(query['Limit'] == 3 for query in queries)
+        assert 'ExclusiveStartKey' in queries[-1]
+
+    def test_get_all_tea_items_beyond_one_megabyte(self, tea_table):
+        """Test that collections larger than a DynamoDB page are not truncated"""
+        user_id = "test_user"
+        table = tea_table.get_table()
+        notes = 'x' * 100_000
+        for i in range(15):
+            table.put_item(Item={'user_id': user_id, 'tea_id': f'{i:02}', 'Name': f'Tea {i}', 'Notes': notes})
+        assert len(table.query(KeyConditionExpression='user_id = :user_id',
+                               ExpressionAttributeValues={':user_id': user_id})['Items']) < 15
+        assert len(tea_table.get_all_tea_items(user_id)) == 15
+
+    def test_iter_tea_items_projection(self, tea_table):
+        """Test that only the requested attributes are returned"""
+        user_id = "test_user"
+        tea_table.create_tea_item(user_id, {'Name': 'Earl Grey', 'Type': 'Black', 'SteepTimeMinutes': 3})
+        items = list(tea_table.iter_tea_items(user_id, attributes=['tea_id', 'Name', 'Type']))
+        assert len(items) == 1
+        assert set(items[0]) == {'tea_id', 'Name', 'Type'}
+
+    def test_iter_tea_items_consistent_read(self, tea_table):
+        """Test that the consistent read option reaches the query"""
+        tea_table.create_tea_item("test_user", {'Name': 'Earl Grey', 'Type': 'Black'})
+        queries = []
+        tea_table.dynamodb.meta.client.meta.events.register(
+            'provide-client-params.dynamodb.Query', lambda **kwargs: queries.append(kwargs['params']))
+        assert len(tea_table.get_all_tea_items("test_user", consistent_read=True)) == 1
+        assert queries[0]['ConsistentRead'] is True
+
+    def test_table_template_matches_dao(self, tea_table):
+        """Test that the provisioned table is keyed the way TeaDao reads and writes it"""
+        table = tea_table.get_table()
+        assert [key['AttributeName'] for key in table.key_schema] == ['user_id', 'tea_id']
+        indexes = {index['IndexName']: index for index in table.global_secondary_indexes}
+        assert [key['AttributeName'] for key in indexes[TYPE_INDEX_NAME]['KeySchema']] == ['user_id', 'Type']
+        assert [key['AttributeName'] for key in indexes[UPDATED_AT_INDEX_NAME]['KeySchema']] == ['user_id', 'UpdatedAt']
+        assert load_table_properties()['BillingMode'] == 'PROVISIONED'
+
+    def test_query_by_type(self, tea_table):
+        """Test paging through one user's teas of a type on the type index"""
+        queries = count_calls(tea_table, 'Query')
+        for i in range(5):
+            tea_table.create_tea_item("test_user", {'Name': f'Green {i}', 'Type': 'Green'})
+        tea_table.create_tea_item("test_user", {'Name': 'Assam', 'Type': 'Black'})
+        tea_table.create_tea_item("other_user", {'Name': 'Sencha', 'Type': 'Green'})
+
+        names = []
+        items, next_key = tea_table.query_by_type("test_user", 'Green', page_size=2)
+        names.extend(item['Name'] for item in items)
+        while next_key is not None:
+            items, next_key = tea_table.query_by_type("test_user", 'Green', page_size=2, start_key=next_key)
+            names.extend(item['Name'] for item in items)
+        assert sorted(names) == [f'Green {i}' for i in range(5)]
+        assert all(query['IndexName'] == TYPE_INDEX_NAME for query in queries)
+
+        items, next_key = tea_table.query_by_type("test_user", 'Black')
+        assert [item['Name'] for item in items] == ['Assam'] and next_key is None
+
+    def test_query_by_type_index_is_sparse(self, tea_table):
+        """Test that items without a Type stay out of the type index"""
+        tea_table.get_table().put_item(Item={'user_id': "test_user", 'tea_id': 'untyped', 'Name': 'Mystery'})
+        tea_table.create_tea_item("test_user", {'Name': 'Assam', 'Type': 'Black'})
+        assert len(tea_table.get_all_tea_items("test_user")) == 2
+        items, _ = tea_table.query_by_type("test_user", 'Black')
+        assert [item['Name'] for item in items] == ['Assam']
+
     def test_create_tea_item(self, tea_table):
         """Test creating a tea item"""
         user_id = "test_user"
@@ -106,6 +271,81 @@ class TestTeaDao:
         assert result['user_id'] == user_id
         assert 'tea_id' in result
 
+    def test_batch_create_tea_items(self, tea_table):
+        """Test creating more teas than fit in one batch write"""
+        calls = count_calls(tea_table, 'BatchWriteItem')
+        tea_items = [{'Name': f'Tea {i}', 'Type': 'Green'} for i in range(60)]
+        tea_items.insert(10, {'Name': 'No Type'})
+        outcomes = tea_table.batch_create_tea_items("test_user", tea_items)
+
+        assert [outcome['index'] for outcome in outcomes] == list(range(61))
+        assert outcomes[10] == {'index': 10, 'status': 'failed', 'error': "Missing required field: 'Type'"}
+        created = [outcome for outcome in outcomes if outcome['status'] == 'created']
+        assert len(created) == 60
+        assert [len(call['RequestItems']['Tea']) for call in calls] == [25, 25, 10]
+        assert len(tea_table.get_all_tea_items("test_user")) == 60
+
+    def test_batch_create_retries_unprocessed(self, tea_table, monkeypatch):
+        """Test that unprocessed items are retried after a jittered backoff"""
+        delays = []
+        monkeypatch.setattr(tea_dao_module.time, 'sleep', delays.append)
+        fail_first_attempts(tea_table, 'batch_write_item', 'UnprocessedItems', 2)
+        outcomes = tea_table.batch_create_tea_items("test_user", [{'Name': f'Tea {i}', 'Type': 'Green'}
+                                                                  for i in range(8)])
+        assert all(outcome['status'] == 'created' for outcome in outcomes)
+        assert len(tea_table.get_all_tea_items("test_user")) == 8
+        assert len(delays) == 2
+        assert 0 <= delays[0] <= tea_dao_module.BATCH_BACKOFF_BASE_SECONDS * 2
+        assert 0 <= delays[1] <= tea_dao_module.BATCH_BACKOFF_BASE_SECONDS * 4
+
+    def test_batch_create_reports_exhausted_retries(self, tea_table, monkeypatch):
+        """Test that items still unprocessed after the last attempt are reported as failed"""
+        monkeypatch.setattr(tea_dao_module.time, 'sleep', lambda delay: None)
+        fail_first_attempts(tea_table, 'batch_write_item', 'UnprocessedItems', tea_dao_module.BATCH_MAX_ATTEMPTS)
+        outcomes = tea_table.batch_create_tea_items("test_user", [{'Name': f'Tea {i}', 'Type': 'Green'}
+                                                                  for i in range(32)])
+        failed = [outcome for outcome in outcomes if outcome['status'] == 'failed']
+        assert failed and all(outcome['error'] == 'Unprocessed after retries' for outcome in failed)
+        stored = {item['tea_id'] for item in tea_table.get_all_tea_items("test_user")}
+        assert stored == {outcome['item']['tea_id'] for outcome in outcomes if outcome['status'] == 'created'}
+        assert len(stored) + len(failed) == 32
+
+    def test_batch_get_tea_items(self, tea_table):
+        """Test getting more teas than fit in one batch get, in request order"""
+        calls = count_calls(tea_table, 'BatchGetItem')
+        outcomes = tea_table.batch_create_tea_items("test_user", [{'Name': f'Tea {i}', 'Type': 'Green'}
+                                                                  for i in range(120)])
+        tea_ids = [outcome['item']['tea_id'] for outcome in outcomes]
+        requested = ['missing'] + tea_ids[::-1] + [tea_ids[0]]
+        results = tea_table.batch_get_tea_items("test_user", requested)
+
+        assert results[0] == {'tea_id': 'missing', 'status': 'not_found'}
+        assert [result['tea_id'] for result in results[1:]] == tea_ids[::-1]
+        assert all(result['item']['Name'] == f'Tea {119 - i}' for i, result in enumerate(results[1:]))
+        assert [len(call['RequestItems']['Tea']['Keys']) for call in calls] == [100, 21]
+
+    def test_batch_get_projection_and_retries(self, tea_table, monkeypatch):
+        """Test projected batch gets and retried unprocessed keys"""
+        monkeypatch.setattr(tea_dao_module.time, 'sleep', lambda delay: None)
+        outcomes = tea_table.batch_create_tea_items("test_user", [{'Name': f'Tea {i}', 'Type': 'Green'}
+                                                                  for i in range(6)])
+        tea_ids = [outcome['item']['tea_id'] for outcome in outcomes]
+        fail_first_attempts(tea_table, 'batch_get_item', 'UnprocessedKeys', 1)
+        results = tea_table.batch_get_tea_items("test_user", tea_ids, attributes=['Name', 'Type'],
+                                                consistent_read=True)
+        assert all(result['status'] == 'found' for result in results)
+        assert all(set(result['item']) == {'tea_id', 'Name', 'Type'} for result in results)
+
+    def test_batch_delete_tea_items(self, tea_table):
+        """Test deleting more teas than fit in one batch write"""
+        outcomes = tea_table.batch_create_tea_items("test_user", [{'Name': f'Tea {i}', 'Type': 'Green'}
+                                                                  for i in range(30)])
+        tea_ids = [outcome['item']['tea_id'] for outcome in outcomes]
+        results = tea_table.batch_delete_tea_items("test_user", tea_ids[:27] + [tea_ids[0]])
+        assert results == [{'tea_id': tea_id, 'status': 'deleted'} for tea_id in tea_ids[:27]]
+        remaining = {item['tea_id'] for item in tea_table.get_all_tea_items("test_user")}
+        assert remaining == set(tea_ids[27:])
+
     def test_get_tea_item(self, tea_table):
         """Test getting a tea item"""
         user_id = "test_user"
@@ -186,6 +426,39 @@ class TestTeaDao:
         updated = tea_table.get_tea_item(user_id, tea_id)
         assert updated['SteepCount'] == 1
 
+    def test_increment_steep_counts(self, tea_table):
+        """Test incrementing several teas, one of them twice, in one transaction"""
+        user_id = "test_user"
+        calls = count_calls(tea_table, 'TransactWriteItems')
+        first = tea_table.create_tea_item(user_id, {'Name': 'Earl Grey', 'Type': 'Black', 'SteepCount': 2})
+        second = tea_table.create_tea_item(user_id, {'Name': 'Sencha', 'Type': 'Green'})
+
+        result = tea_table.increment_steep_counts(user_id, [first['tea_id'], second['tea_id'], first['tea_id']])
+        assert result == {first['tea_id']: 2, second['tea_id']: 1}
+        assert len(calls) == 1
+        assert tea_table.get_tea_item(user_id, first['tea_id'])['SteepCount'] == 4
+        assert tea_table.get_tea_item(user_id, second['tea_id'])['SteepCount'] == 1
+
+    def test_increment_steep_counts_missing_tea(self, tea_table):
+        """Test that a missing tea cancels the whole transaction"""
+        user_id = "test_user"
+        created = tea_table.create_tea_item(user_id, {'Name': 'Earl Grey', 'Type': 'Black'})
+        with pytest.raises(KeyError, match='missing'):
+            tea_table.increment_steep_counts(user_id, [created['tea_id'], 'missing'])
+        assert tea_table.get_tea_item(user_id, created['tea_id'])['SteepCount'] == 0
+        assert tea_table.get_tea_item(user_id, 'missing') is None
+
+    def test_increment_steep_counts_beyond_transaction_limit(self, tea_table):
+        """Test that large sessions are split into transactions of 100 teas"""
+        user_id = "test_user"
+        calls = count_calls(tea_table, 'TransactWriteItems')
+        outcomes = tea_table.batch_create_tea_items(user_id, [{'Name': f'Tea {i}', 'Type': 'Green'}
+                                                              for i in range(130)])
+        tea_ids = [outcome['item']['tea_id'] for outcome in outcomes]
+        tea_table.increment_steep_counts(user_id, tea_ids)
+        assert [len(call['TransactItems']) for call in calls] == [100, 30]
+        assert all(item['SteepCount'] == 1 for item in tea_table.get_all_tea_items(user_id))
+
     def test_clear_steep_count(self, tea_table):
         """Test clearing steep count"""
         user_id = "test_user"
@@ -0,0 +1,169 @@
+"""Tests for the teas and tea_tombstones indexes and the schema migrations"""
+import os
+from datetime import datetime
+import pytest
+from flask import Flask
+from flask_migrate import Migrate, upgrade, downgrade
+from sqlalchemy import func, inspect, text, tuple_
+from sqlalchemy.exc import IntegrityError
+from app.models.tea import Tea
+from app.models.tea_tombstone import TeaTombstone
+from app.models.user import User
+from app.extensions import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'migrations')
+
+# The teas table as created by db.create_all() before the per-user indexes
+LEGACY_SCHEMA = [
+    'CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, PRIMARY KEY (id))',
+    '''CREATE TABLE teas (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        type VARCHAR(50) NOT NULL,
+        steep_time INTEGER NOT NULL,
+        steep_temperature INTEGER NOT NULL,
+        steep_count INTEGER,
+        notes TEXT,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL,
+        user_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )'''
+]
+
+def build_app(database_uri):
+    """Create application for testing"""
+    app = Flask(__name__)
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False
+    })
+    db.init_app(app)
+    Migrate(app, db, directory=MIGRATIONS_DIR)
+    return app
+
+@pytest.fixture
+def app():
+    """Create application with the current schema"""
+    app = build_app('sqlite:///:memory:')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def query_plan(query):
+    """Get SQLite's plan for a query as a single string"""
+    statement = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+def test_list_query_uses_user_index(app):
+    """Test that listing a user's teas does not scan the table"""
+    plan = query_plan(Tea.query.filter_by(user_id=1))
+    assert 'USING INDEX ix_teas_user_id' in plan
+    assert 'SCAN' not in plan
+
+def test_paginated_list_query_uses_user_index(app):
+    """Test that a keyset page seeks on the user index"""
+    plan = query_plan(Tea.query.filter_by(user_id=1).filter(Tea.id > 10).order_by(Tea.id).limit(51))
+    assert 'INDEX ix_teas_user_id' in plan
+    assert 'SCAN' not in plan
+
+def test_duplicate_check_uses_user_name_index(app):
+    """Test that duplicate name checks are index lookups"""
+    plan = query_plan(Tea.query.filter_by(name='Sencha', user_id=1))
+    assert 'USING INDEX ix_teas_user_id_name' in plan
+
+    plan = query_plan(Tea.query.with_entities(Tea.name).filter(
+        Tea.user_id == 1, Tea.name.in_(['Sencha', 'Assam'])))
+    assert 'USING COVERING INDEX ix_teas_user_id_name' in plan
+
+def test_collection_version_query_uses_covering_index(app):
+    """Test that the collection version is computed from the updated_at index alone"""
+    plan = query_plan(db.session.query(func.count(Tea.id), func.max(Tea.updated_at)).filter(Tea.user_id == 1))
+    assert 'USING COVERING INDEX ix_teas_user_id_updated_at' in plan
+
+def test_changes_queries_use_updated_at_indexes(app):
+    """Test that the delta sync queries seek on the (user_id, timestamp) indexes"""
+    since = (datetime(2024, 1, 1), 5)
+    plan = query_plan(Tea.query.filter(Tea.user_id == 1, tuple_(Tea.updated_at, Tea.id) > since)
+                      .order_by(Tea.updated_at, Tea.id))
+    assert 'USING INDEX ix_teas_user_id_updated_at' in plan
+    assert 'TEMP B-TREE' not in plan
+
+    plan = query_plan(TeaTombstone.query.filter(
+        TeaTombstone.user_id == 1, tuple_(TeaTombstone.deleted_at, TeaTombstone.id) > since
+    ).order_by(TeaTombstone.deleted_at, TeaTombstone.id))
+    assert 'USING INDEX ix_tea_tombstones_user_id_deleted_at' in plan
+    assert 'TEMP B-TREE' not in plan
+
+def test_tea_names_unique_per_user(app):
+    """Test that different users may reuse a tea name but one user may not"""
+    users = [User(username=f'user{i}', email=f'user{i}@example.com') for i in range(2)]
+    db.session.add_all(users)
+    db.session.commit()
+    for user in users:
+        db.session.add(Tea(name='Sencha', tea_type='green', steep_time=60, steep_temperature=75, user_id=user.id))
+    db.session.commit()
+
+    db.session.add(Tea(name='Sencha', tea_type='green', steep_time=60, steep_temperature=75, user_id=users[0].id))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+def test_migration_replaces_global_unique_name(tmp_path):
+    """Test upgrading and downgrading a database created with the legacy schema"""
+    app = build_app(f'sqlite:///{tmp_path / "legacy.db"}')
+    with app.app_context():
+        for statement in LEGACY_SCHEMA:
+            db.session.execute(text(statement))
+        db.session.commit()
+
+        upgrade(directory=MIGRATIONS_DIR)
+        inspector = inspect(db.engine)
+        indexes = {index['name']: index for index in inspector.get_indexes('teas')}
+        assert indexes['ix_teas_user_id_name']['column_names'] == ['user_id', 'name']
+        assert indexes['ix_teas_user_id_name']['unique']
+        assert indexes['ix_teas_user_id_updated_at']['column_names'] == ['user_id', 'updated_at']
+        assert not inspector.get_unique_constraints('teas')
+        assert [index['column_names'] for index in inspector.get_indexes('tea_tombstones')] == [
+            ['user_id', 'deleted_at']]
+
+        downgrade(directory=MIGRATIONS_DIR, revision='base')
+        inspector = inspect(db.engine)
+        assert not inspector.has_table('tea_tombstones')
+        assert not inspector.get_indexes('teas')
+        assert [c['column_names'] for c in inspector.get_unique_constraints('teas')] == [['name']]
+
+def test_migration_skips_existing_indexes(tmp_path):
+    """Test upgrading a database that db.create_all() already built with the new schema"""
+    app = build_app(f'sqlite:///{tmp_path / "current.db"}')
+    with app.app_context():
+        db.create_all()
+        upgrade(directory=MIGRATIONS_DIR)
+        inspector = inspect(db.engine)
+        index_names = {index['name'] for index in inspector.get_indexes('teas')}
+        assert index_names == {'ix_teas_user_id_name', 'ix_teas_user_id_updated_at'}
+        index_names = {index['name'] for index in inspector.get_indexes('tea_tombstones')}
+        assert index_names == {'ix_tea_tombstones_user_id_deleted_at'}
+
+def test_migration_widens_password_hash(tmp_path):
+    """Test that the password hash column is widened for longer hash methods and salts"""
+    app = build_app(f'sqlite:///{tmp_path / "users.db"}')
+    with app.app_context():
+        db.session.execute(text('CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, '
+                                'password_hash VARCHAR(128), PRIMARY KEY (id))'))
+        db.session.execute(text(LEGACY_SCHEMA[1]))
+        db.session.commit()
+
+        upgrade(directory=MIGRATIONS_DIR)
+        columns = {column['name']: column for column in inspect(db.engine).get_columns('users')}
+        assert columns['password_hash']['type'].length == 255
+
+        downgrade(directory=MIGRATIONS_DIR, revision='8b2e4f6a1c3d')
+        columns = {column['name']: column for column in inspect(db.engine).get_columns('users')}
+        assert columns['password_hash']['type'].length == 128
@@ -0,0 +1,138 @@
+"""Tests for TeaJournal and durable MemoryTeaDao"""
+import os
+import time
+from decimal import Decimal
+import pytest
+from app.dao.memory_tea_dao import MemoryTeaDao
+from app.dao.tea_journal import TeaJournal
+
+@pytest.fixture
+def open_dao(tmp_path):
+    """Return a function opening a durable MemoryTeaDao over one directory, closing them afterwards."""
+    daos = []
+
+    def open_dao(**kwargs):
+        dao = MemoryTeaDao(journal=TeaJournal(str(tmp_path), **kwargs))
+        daos.append(dao)
+        return dao
+
+    yield open_dao
+    for dao in daos:
+        dao.close()
+
+def segments(directory):
+    """List the journal segment file names"""
+    return sorted(name for name in os.listdir(directory) if name.startswith('journal-'))
+
+def test_changes_survive_restart(open_dao):
+    """Test that every kind of write is recovered by the next DAO"""
+    dao = open_dao()
+    sencha = dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})['tea_id']
+    outcomes = dao.batch_create_tea_items("test_user", [{'Name': 'Assam', 'Type': 'Black'},
+                                                        {'Name': 'Bai Mudan', 'Type': 'White'}])
+    assam, bai_mudan = (outcome['item']['tea_id'] for outcome in outcomes)
+    dao.update_tea_item("test_user", sencha, {'Type': 'Oolong'})
+    dao.increment_steep_counts("test_user", [sencha, sencha, assam])
+    dao.increment_steep_count("test_user", assam)
+    dao.clear_steep_count("test_user", sencha)
+    dao.delete_tea_item("test_user", bai_mudan)
+    dao.batch_delete_tea_items("test_user", ['missing'])
+    dao.create_tea_item("other_user", {'Name': 'Gyokuro', 'Type': 'Green'})
+    expected = {user_id: dao.get_all_tea_items(user_id) for user_id in ("test_user", "other_user")}
+    dao.close()
+
+    recovered = open_dao()
+    assert {user_id: recovered.get_all_tea_items(user_id) for user_id in expected} == expected
+    assert recovered.query_by_type("test_user", 'Oolong')[0][0]['tea_id'] == sencha
+    assert [item['tea_id'] for item in recovered.query_by_steep_count("test_user")] == [assam]
+    assert recovered.journal.recovery['snapshot_items'] == 0
+    assert recovered.journal.recovery['journal_entries'] == 10
+    assert recovered.journal.recovery['seconds'] >= 0
+
+def test_snapshot_replaces_journal(open_dao, tmp_path):
+    """Test that recovery loads the snapshot and replays only the entries after it"""
+    dao = open_dao()
+    tea_ids = [dao.create_tea_item("test_user", {'Name': f'Tea {i}', 'Type': 'Green'})['tea_id']
+               for i in range(5)]
+    dao.snapshot()
+    assert segments(tmp_path) == ['journal-00000000000000000006.jsonl']
+    dao.increment_steep_count("test_user", tea_ids[0])
+    dao.delete_tea_item("test_user", tea_ids[1])
+    dao.close()
+
+    recovered = open_dao()
+    assert recovered.journal.recovery['snapshot_items'] == 5
+    assert recovered.journal.recovery['journal_entries'] == 2
+    items = recovered.get_all_tea_items("test_user")
+    assert len(items) == 4
+    assert recovered.get_tea_item("test_user", tea_ids[0])['SteepCount'] == 1
+
+    # Writes after recovery continue the numbering in a new segment
+    recovered.create_tea_item("test_user", {'Name': 'Assam', 'Type': 'Black'})
+    recovered.close()
+    assert open_dao().journal.recovery['journal_entries'] == 3
+
+def test_decimals_survive_restart(open_dao):
+    """Test that fractional numbers come back as the same Decimals from the snapshot and the journal"""
+    dao = open_dao()
+    dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green', 'SteepTimeMinutes': Decimal('1.5')})
+    dao.snapshot()
+    dao.create_tea_item("test_user", {'Name': 'Assam', 'Type': 'Black', 'SteepTimeMinutes': Decimal('3.35'),
+                                      'SteepTemperatureFahrenheit': Decimal('212')})
+    expected = dao.get_all_tea_items("test_user")
+    dao.close()
+
+    recovered = open_dao()
+    assert recovered.journal.recovery['snapshot_items'] == 1
+    assert recovered.journal.recovery['journal_entries'] == 1
+    items = recovered.get_all_tea_items("test_user")
+    assert items == expected
+    assert sorted(item['SteepTimeMinutes'] for item in items) == [Decimal('1.5'), Decimal('3.35')]
+    assert all(isinstance(item['SteepTimeMinutes'], Decimal) for item in items)
+
+def test_snapshot_is_taken_when_due(open_dao, tmp_path):
+    """Test that the background thread snapshots after snapshot_every entries"""
+    dao = open_dao(fsync_interval_ms=10, snapshot_every=3)
+    for i in range(3):
+        dao.create_tea_item("test_user", {'Name': f'Tea {i}', 'Type': 'Green'})
+    deadline = time.monotonic() + 5
+    while not os.path.exists(tmp_path / 'snapshot.json') and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dao.close()
+
+    recovered = open_dao()
+    assert recovered.journal.recovery['snapshot_items'] == 3
+    assert recovered.journal.recovery['journal_entries'] == 0
+
+def test_partial_entry_is_truncated(open_dao, tmp_path):
+    """Test recovering a journal whose last entry was cut off by a crash"""
+    dao = open_dao(fsync_interval_ms=0)
+    created = dao.create_tea_item("test_user", {'Name': 'Sencha', 'Type': 'Green'})
+    dao.increment_steep_count("test_user", created['tea_id'])
+    dao.close()
+    segment = tmp_path / segments(tmp_path)[0]
+    with open(segment, 'ab') as journal_file:
+        journal_file.write(b'{"op": "put", "user_id": "test_us')
+
+    recovered = open_dao()
+    assert recovered.journal.recovery['journal_entries'] == 2
+    assert recovered.get_tea_item("test_user", created['tea_id'])['SteepCount'] == 1
+    assert segment.read_bytes().endswith(b'\n')
+    recovered.increment_steep_count("test_user", created['tea_id'])
+    recovered.close()
+    assert open_dao().get_tea_item("test_user", created['tea_id'])['SteepCount'] == 2
+
+def test_from_config(tmp_path):
+    """Test that a data directory makes the DAO durable"""
+    assert MemoryTeaDao.from_config({}).journal is None
+    dao = MemoryTeaDao.from_config({'TEA_MEMORY_DATA_DIR': str(tmp_path), 'TEA_MEMORY_SNAPSHOT_EVERY': 5})
+    assert dao.journal.snapshot_every == 5
+    dao.close()
+
+def test_directory_is_locked(tmp_path):
+    """Test that a second journal cannot open a directory until the first is closed"""
+    journal = TeaJournal(str(tmp_path))
+    with pytest.raises(RuntimeError, match='in use by another process'):
+        TeaJournal(str(tmp_path))
+    journal.close()
+    TeaJournal(str(tmp_path)).close()
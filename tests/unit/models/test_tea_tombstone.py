@@ -0,0 +1,41 @@
+"""Tests for TeaTombstone model and its compaction command"""
+from datetime import datetime, timedelta, timezone
+from app.cli import compact_tombstones_command
+from app.models.tea_tombstone import TeaTombstone
+from app.models.user import User
+from app.extensions import db
+
+def add_tombstones(ages_in_days):
+    """Insert one tombstone per age for a new user"""
+    user = User(username='syncuser', email='sync@example.com')
+    db.session.add(user)
+    db.session.commit()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.session.add_all([
+        TeaTombstone(tea_id=tea_id, user_id=user.id, deleted_at=now - timedelta(days=age))
+        for tea_id, age in enumerate(ages_in_days, start=1)
+    ])
+    db.session.commit()
+
+def test_to_dict(test_db):  # pylint: disable=unused-argument
+    """Test that a tombstone serializes to the deleted tea's id"""
+    tombstone = TeaTombstone(tea_id=7, user_id=1, deleted_at=datetime(2024, 1, 2, 3, 4, 5))
+    assert tombstone.to_dict() == {'id': 7, 'deleted_at': '2024-01-02T03:04:05'}
+
+def test_compact(test_db):  # pylint: disable=unused-argument
+    """Test that only tombstones past the retention period are removed"""
+    add_tombstones([1, 10, 40, 90])
+    assert TeaTombstone.compact(30) == 2
+    assert sorted(tombstone.tea_id for tombstone in TeaTombstone.query.all()) == [1, 2]
+
+def test_compact_command(test_app, test_db):  # pylint: disable=unused-argument
+    """Test the CLI command with the configured and an explicit retention"""
+    add_tombstones([1, 10, 40])
+    test_app.config['TEA_TOMBSTONE_RETENTION_DAYS'] = 30
+    runner = test_app.test_cli_runner()
+
+    result = runner.invoke(compact_tombstones_command)
+    assert 'Removed 1 tombstones older than 30 days.' in result.output
+    result = runner.invoke(compact_tombstones_command, ['--days', '5'])
+    assert 'Removed 1 tombstones older than 5 days.' in result.output
+    assert [tombstone.tea_id for tombstone in TeaTombstone.query.all()] == [1]
@@ -0,0 +1,55 @@
+from app.utils.cache import KeyVersions, LRUCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_lru_cache_get_set():
+    cache = LRUCache(max_entries=2, ttl=10)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('b', 'default') == 'default'
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 0, 'size': 1}
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_lru_cache_expires_entries():
+    clock = FakeClock()
+    cache = LRUCache(max_entries=2, ttl=10, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=30)
+    clock.now = 10
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert len(cache) == 1
+
+def test_lru_cache_delete_and_clear():
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.delete('a')
+    cache.delete('missing')
+    assert cache.get('a') is None
+    cache.clear()
+    assert len(cache) == 0
+
+def test_key_versions_bump_only_their_key():
+    versions = KeyVersions()
+    before = versions.get('other_user')
+    versions.bump('test_user')
+    versions.bump('test_user')
+    assert versions.get('test_user') == 2
+    assert versions.get('other_user') == before
@@ -1,5 +1,7 @@
 from datetime import datetime
+from decimal import Decimal
 import pytest
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
 
 from app.utils import helpers
 
@@ -33,3 +35,80 @@ def test_transform_dict_to_dynamodb_item():
     item = {'id': 1, 'name': 'John Doe', 'email': 'john@example.com'}
     transformed_item = helpers.transform_dict_to_dynamodb_item(item)
     assert transformed_item == {'id': {'N': '1'}, 'name': {'S': 'John Doe'}, 'email': {'S': 'john@example.com'}}
+
+NESTED_ITEM = {
+    'user_id': 'user-1',
+    'SteepCount': 3,
+    'Rating': Decimal('4.25'),
+    'Big': 10 ** 30,
+    'Caffeinated': False,
+    'Notes': None,
+    'Label': b'\x00\x01',
+    'Tags': {'green', 'japanese'},
+    'Temperatures': {70, Decimal('72.5')},
+    'Blobs': {b'a', b'b'},
+    'Steeps': [{'seconds': 60, 'ok': True}, [1, 'two']],
+    'Origin': {'country': 'Japan', 'region': {'name': 'Shizuoka', 'altitude': 300}}
+}
+
+def test_dynamodb_item_matches_boto3():
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+    item = helpers.transform_dict_to_dynamodb_item(NESTED_ITEM)
+    expected = {key: serializer.serialize(value) for key, value in NESTED_ITEM.items()}
+    for key in ('Tags', 'Temperatures', 'Blobs'):
+        tag, = item[key]
+        assert sorted(item[key][tag]) == sorted(expected[key][tag])
+        item[key][tag] = expected[key][tag] = None
+    assert item == expected
+
+    item = {key: serializer.serialize(value) for key, value in NESTED_ITEM.items()}
+    transformed_item = helpers.transform_dynamodb_item_to_dict(item)
+    assert transformed_item == {key: deserializer.deserialize(value) for key, value in item.items()}
+
+def test_dynamodb_item_round_trip():
+    item = helpers.transform_dynamodb_item_to_dict(helpers.transform_dict_to_dynamodb_item(NESTED_ITEM))
+    assert item == NESTED_ITEM
+    assert type(item['SteepCount']) is int
+    assert type(item['Rating']) is Decimal
+
+def test_dynamodb_float_round_trip():
+    value = helpers.deserialize_dynamodb_value(helpers.serialize_dynamodb_value(0.1))
+    assert value == Decimal('0.1')
+    assert float(value) == 0.1
+
+def test_dynamodb_subclasses_serialize_as_base_type():
+    class Count(int):
+        pass
+
+    assert helpers.serialize_dynamodb_value(Count(2)) == {'N': '2'}
+    assert helpers.serialize_dynamodb_value(True) == {'BOOL': True}
+    assert helpers.serialize_dynamodb_value((1, 'a')) == {'L': [{'N': '1'}, {'S': 'a'}]}
+
+def test_dynamodb_rejects_unsupported_values():
+    with pytest.raises(ValueError):
+        helpers.serialize_dynamodb_value(set())
+    with pytest.raises(ValueError):
+        helpers.serialize_dynamodb_value(float('nan'))
+    with pytest.raises(ValueError):
+        helpers.serialize_dynamodb_value(Decimal('Infinity'))
+    with pytest.raises(TypeError):
+        helpers.serialize_dynamodb_value({'a', 1})
+    with pytest.raises(TypeError):
+        helpers.serialize_dynamodb_value(object())
+
+def test_transform_dynamodb_items_batch():
+    items = [{'tea_id': str(i), 'SteepCount': i} for i in range(3)]
+    dynamodb_items = helpers.transform_dicts_to_dynamodb_items(items)
+    assert dynamodb_items[2] == {'tea_id': {'S': '2'}, 'SteepCount': {'N': '2'}}
+    assert helpers.transform_dynamodb_items_to_dicts(dynamodb_items) == items
+
+def test_cursor_round_trip():
+    token = helpers.encode_cursor({'id': 42})
+    assert helpers.decode_cursor(token) == {'id': 42}
+
+def test_decode_cursor_invalid():
+    with pytest.raises(ValueError):
+        helpers.decode_cursor('not-a-cursor')
+    with pytest.raises(ValueError):
+        helpers.decode_cursor(helpers.encode_cursor([1, 2]).rstrip('='))
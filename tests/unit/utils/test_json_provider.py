@@ -0,0 +1,44 @@
+from datetime import date, datetime
+import pytest
+from flask import json
+from app.extensions import db
+from app.models.tea import Tea
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def json_app(request, test_app, test_db):  # pylint: disable=unused-argument
+    test_app.config['JSON_PROVIDER'] = request.param
+    with test_app.test_request_context():
+        yield test_app
+
+def create_tea(microsecond=0):
+    timestamp = datetime(2024, 1, 2, 3, 4, 5, microsecond)
+    tea = Tea(name='Sencha', tea_type='Green', steep_time=60, steep_temperature=80, notes='Grassy',
+              user_id=1, created_at=timestamp, updated_at=timestamp)
+    db.session.add(tea)
+    db.session.commit()
+    return tea
+
+@pytest.mark.parametrize('microsecond', [0, 123456])
+def test_tea_encodes_like_to_dict(json_app, microsecond):  # pylint: disable=unused-argument
+    tea = create_tea(microsecond)
+    assert json.loads(json.dumps([tea])) == [tea.to_dict()]
+    assert json.dumps(tea) == json.dumps(tea.to_dict())
+
+def test_dates_encode_as_iso_8601(json_app):  # pylint: disable=unused-argument
+    value = {'day': date(2024, 1, 2), 'at': datetime(2024, 1, 2, 3, 4, 5)}
+    assert json.loads(json.dumps(value)) == {'day': '2024-01-02', 'at': '2024-01-02T03:04:05'}
+
+def test_keys_are_sorted(json_app):  # pylint: disable=unused-argument
+    assert list(json.loads(json.dumps({'b': 1, 'a': 2}))) == ['a', 'b']
+
+def test_decoder_parses_request_bodies(json_app):
+    client = json_app.test_client()
+    response = client.post('/auth/login', data='{"username": "nobody", "password": "x"}',
+                           content_type='application/json')
+    assert response.status_code == 401
+    response = client.post('/auth/login', data='{not json', content_type='application/json')
+    assert response.status_code == 400
+
+def test_unserializable_value_raises(json_app):  # pylint: disable=unused-argument
+    with pytest.raises(TypeError):
+        json.dumps({'value': object()})